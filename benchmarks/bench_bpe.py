@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_bpe.py
+
+Train a BPE vocabulary on synthetic Zipf-distributed word counts and report training time.
+With --db, the counts go through a temporary database: word_counts is filled, and
+train_from_word_counts reads it and writes the tokens table.
+
+Run from the project root:
+    python -m benchmarks.bench_bpe [--words N] [--vocab-size V] [--db]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from tokenizer.bpe_trainer import BPETrainer, train_from_word_counts
+
+SYLLABLES = [
+    "an", "ber", "ca", "de", "en", "fo", "ga", "hi", "in", "jo", "ka", "le", "mi", "no", "or",
+    "pa", "qu", "ri", "st", "th", "un", "ve", "wa", "xi", "yo", "ze", "tion", "ing", "ed", "ly",
+]
+
+
+def synthetic_word_counts(n_words: int, seed: int = 0) -> list:
+    """Return `n_words` distinct (word, count) pairs with Zipf-like counts."""
+    rng = random.Random(seed)
+    seen = set()
+    counts = []
+    rank = 0
+    while len(counts) < n_words:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 5)))
+        if rng.random() < 0.1:
+            word += str(rng.randint(0, 99))
+        if word in seen:
+            continue
+        seen.add(word)
+        rank += 1
+        counts.append((word, max(1, int(1_000_000 / rank))))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=200_000, help="distinct words")
+    parser.add_argument("--vocab-size", type=int, default=8_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", action="store_true", help="train through a temporary database")
+    args = parser.parse_args()
+
+    counts = synthetic_word_counts(args.words, args.seed)
+    print(f"{len(counts):,} distinct words, {sum(c for _, c in counts):,} occurrences")
+
+    t0 = time.perf_counter()
+    if args.db:
+        from db.database import set_database_path
+        from db.schema import init_all
+        from db.repositories.word_counts_repo import add_counts
+
+        with tempfile.TemporaryDirectory() as tmp:
+            set_database_path(os.path.join(tmp, "bench.db"))
+            init_all(drop_existing=True)
+            add_counts(counts)
+            t0 = time.perf_counter()
+            trainer = train_from_word_counts(args.vocab_size)
+            set_database_path(os.path.join(tmp, "unused.db"))
+    else:
+        trainer = BPETrainer(args.vocab_size)
+        trainer.train(counts)
+    elapsed = time.perf_counter() - t0
+
+    merges = len(trainer.merges)
+    print(f"vocab {len(trainer.pieces):,}  merges {merges:,}  "
+          f"time {elapsed:.2f} s  ({merges / elapsed:,.0f} merges/s)")
+
+
+if __name__ == "__main__":
+    main()
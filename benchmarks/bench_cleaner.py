@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_cleaner.py
+
+Report TextCleaner throughput in lines/second on generated documents, next to the original
+line-by-line implementation. tests/test_cleaner.py checks that both produce the same output.
+
+Run from the project root:
+    python -m benchmarks.bench_cleaner [--lines N] [--seed S]
+"""
+import argparse
+import random
+import time
+
+from file_reader.cleaner import TextCleaner
+from tests.cleaner_reference import reference_clean, generate_text
+
+
+def bench(name: str, fn, n_lines: int, repeat: int = 3) -> float:
+    """Run `fn` `repeat` times and print the best lines/second."""
+    best = min(_timed(fn) for _ in range(repeat))
+    rate = n_lines / best
+    print(f"{name:<12} {best * 1000:9.1f} ms  {rate:14,.0f} lines/s")
+    return rate
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=300_000, help="lines in the benchmark document")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cleaner = TextCleaner()
+
+    text = generate_text(rng, args.lines)
+    clean_text = text.replace("ustar", "").replace(".txt", "")
+    docs = [generate_text(rng, 2_000) for _ in range(args.lines // 2_000)]
+
+    bench("reference", lambda: reference_clean(text), args.lines)
+    bench("clean", lambda: cleaner.clean(text), args.lines)
+    bench("clean/nonoise", lambda: cleaner.clean(clean_text), args.lines)
+    bench("clean_iter", lambda: sum(1 for _ in cleaner.clean_iter(text.splitlines())), args.lines)
+    bench("clean_many", lambda: cleaner.clean_many(docs), len(docs) * 2_000, repeat=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+benchmarks/bench_pipeline.py
+
+End-to-end benchmark over a synthetic corpus (see benchmarks/corpus.py). Each stage runs in a
+fresh process against a temporary database and reports its throughput and peak memory:
+
+    register        load_and_register_archives on the corpus          members/s, archive MB/s
+    rescan          the same call again with nothing changed          archives/s
+    read            FileReader.stream_records over every member       members/s, MB/s
+    read_random     FileReader.read_text on random members            lookups/s
+    extract         TextExtractor.extract_record on every member      records/s, MB/s (characters)
+    extract_stream  the same with stream=True                         records/s, MB/s (characters)
+    clean           TextCleaner.clean on every extracted text         texts/s, MB/s (characters)
+    count           count_corpus into word_counts                     tokens/s
+    upsert          word_counts_repo.add_counts, insert then update   rows/s
+
+Results are printed and, with --output, written as JSON together with the commit, Python
+version and corpus parameters; --compare prints the change against an earlier result file.
+--metrics adds the per-stage breakdown from utils/metrics.py (decompression, JSON parsing,
+cleaning, commits, ...) to each stage, and --profile runs the named metric stages under cProfile.
+
+Run from the project root:
+    python -m benchmarks.bench_pipeline [--archives N] [--members M] [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import CorpusGenerator, FORMATS
+
+STAGES = ["register", "rescan", "read", "read_random", "extract", "extract_stream", "clean", "count", "upsert"]
+
+
+# --------------------- STAGES ---------------------
+# Each stage gets the run context and returns {"seconds", "items", "unit"} plus optional "bytes".
+# Setup that should not be timed happens before the clock starts.
+def _stage_register(ctx: dict) -> dict:
+    from db.schema import init_all
+    from db.repositories.files_repo import count_files
+    from file_reader.loader import load_and_register_archives
+
+    init_all(drop_existing=True)
+    t0 = time.perf_counter()
+    load_and_register_archives(ctx["corpus_dir"], workers=ctx["workers"])
+    seconds = time.perf_counter() - t0
+    return {"seconds": seconds, "items": count_files(), "unit": "members",
+            "bytes": ctx["corpus"]["archive_bytes"]}
+
+
+def _stage_rescan(ctx: dict) -> dict:
+    from file_reader.loader import load_and_register_archives
+
+    t0 = time.perf_counter()
+    summary = load_and_register_archives(ctx["corpus_dir"], workers=ctx["workers"])
+    seconds = time.perf_counter() - t0
+    return {"seconds": seconds, "items": sum(summary.values()), "unit": "archives"}
+
+
+def _stage_read(ctx: dict) -> dict:
+    from db.repositories.files_repo import iter_file_records
+    from file_reader.reader import FileReader
+
+    records = list(iter_file_records())
+    reader = FileReader()
+    t0 = time.perf_counter()
+    items = size = 0
+    for _, data in reader.stream_records(records):
+        items += 1
+        size += len(data)
+    seconds = time.perf_counter() - t0
+    reader.close()
+    return {"seconds": seconds, "items": items, "unit": "members", "bytes": size}
+
+
+def _stage_read_random(ctx: dict) -> dict:
+    from db.repositories.files_repo import iter_file_records
+    from file_reader.reader import FileReader
+
+    records = list(iter_file_records())
+    picks = random.Random(ctx["seed"]).sample(records, min(ctx["lookups"], len(records)))
+    reader = FileReader()
+    t0 = time.perf_counter()
+    size = 0
+    for record in picks:
+        size += len(reader.read_text(record, mark=False))
+    seconds = time.perf_counter() - t0
+    reader.close()
+    return {"seconds": seconds, "items": len(picks), "unit": "lookups", "bytes": size}
+
+
+def _extract_all(stream: bool) -> dict:
+    from db.repositories.files_repo import iter_file_records
+    from file_reader.extractor import TextExtractor
+
+    records = list(iter_file_records())
+    extractor = TextExtractor(stream=stream, dedupe=False)
+    t0 = time.perf_counter()
+    items = size = 0
+    for record in records:
+        _, texts = extractor.extract_record(record, mark=False)
+        items += len(texts)
+        size += sum(len(text) for text in texts if isinstance(text, str))
+    seconds = time.perf_counter() - t0
+    extractor.close()
+    return {"seconds": seconds, "items": items, "unit": "records", "bytes": size}
+
+
+def _stage_extract(ctx: dict) -> dict:
+    return _extract_all(stream=False)
+
+
+def _stage_extract_stream(ctx: dict) -> dict:
+    return _extract_all(stream=True)
+
+
+def _stage_clean(ctx: dict) -> dict:
+    from db.repositories.files_repo import iter_file_records
+    from file_reader.cleaner import TextCleaner
+    from file_reader.extractor import TextExtractor
+
+    extractor = TextExtractor(stream=True, dedupe=False)
+    cleaner = TextCleaner()
+    seconds = 0.0
+    items = size = 0
+    for record in iter_file_records():
+        _, texts = extractor.extract_record(record, mark=False)
+        texts = [text for text in texts if isinstance(text, str)]
+        t0 = time.perf_counter()
+        for text in texts:
+            cleaner.clean(text)
+        seconds += time.perf_counter() - t0
+        items += len(texts)
+        size += sum(map(len, texts))
+    extractor.close()
+    return {"seconds": seconds, "items": items, "unit": "texts", "bytes": size}
+
+
+def _stage_count(ctx: dict) -> dict:
+    from db.repositories.files_repo import unmark_all_files
+    from stats.word_counter import count_corpus
+
+    unmark_all_files()
+    t0 = time.perf_counter()
+    counter = count_corpus(workers=ctx["workers"])
+    seconds = time.perf_counter() - t0
+    return {"seconds": seconds, "items": counter.total_tokens, "unit": "tokens",
+            "rows_written": counter.rows_flushed}
+
+
+def _stage_upsert(ctx: dict) -> dict:
+    from db.repositories.word_counts_repo import add_counts, reset_counts
+
+    rng = random.Random(ctx["seed"])
+    pairs = [(f"w{i:x}{rng.randrange(1 << 20):x}", rng.randint(1, 100)) for i in range(ctx["upsert_rows"])]
+    reset_counts()
+    t0 = time.perf_counter()
+    rows = add_counts(pairs) + add_counts(pairs)
+    seconds = time.perf_counter() - t0
+    return {"seconds": seconds, "items": rows, "unit": "rows"}
+
+
+_STAGE_FUNCS = {name: globals()[f"_stage_{name}"] for name in STAGES}
+
+
+# --------------------- RUNNER ---------------------
+def _stage_process(name: str, ctx: dict, results) -> None:
+    """Child process: run one stage against the benchmark database and report its measurements."""
+    from db.database import set_database_path
+    from utils import metrics
+
+    set_database_path(ctx["db_path"])
+    if ctx["metrics"]:
+        metrics.enable(ctx["profile"])
+    try:
+        result = _STAGE_FUNCS[name](ctx)
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    if ctx["metrics"]:
+        result["metrics"] = metrics.snapshot()
+        if ctx["profile"]:
+            metrics.dump_profiles(os.path.join(ctx["profile_dir"], name))
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    result["peak_rss_children_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    results.put(result)
+
+
+def run_stage(name: str, ctx: dict) -> dict:
+    """Run one stage in a fresh process, so its peak memory is its own, and add rates."""
+    spawn = mp.get_context("spawn")
+    results = spawn.Queue()
+    proc = spawn.Process(target=_stage_process, args=(name, ctx, results))
+    proc.start()
+    result = results.get()
+    proc.join()
+    if "error" in result:
+        return result
+    seconds = max(result["seconds"], 1e-9)
+    result["items_per_s"] = result["items"] / seconds
+    if "bytes" in result:
+        result["mb_per_s"] = result["bytes"] / 1e6 / seconds
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def prepare_corpus(generator: CorpusGenerator, corpus_dir: str) -> dict:
+    """Generate the corpus into `corpus_dir`, or reuse it if it was generated with the same parameters."""
+    manifest_path = os.path.join(corpus_dir, "corpus.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("config") == generator.config():
+            return manifest["summary"]
+        shutil.rmtree(corpus_dir)
+    summary = generator.generate(corpus_dir)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"config": generator.config(), "summary": summary}, f, indent=2)
+    return summary
+
+
+def print_results(report: dict) -> None:
+    print(f"{'stage':<16}{'seconds':>9}{'items':>13}{'rate':>24}{'MB/s':>9}{'peak MB':>9}")
+    for name, result in report["stages"].items():
+        if "error" in result:
+            print(f"{name:<16} failed: {result['error']}")
+            continue
+        mb = f"{result['mb_per_s']:9.1f}" if "mb_per_s" in result else f"{'':>9}"
+        rate = f"{result['items_per_s']:,.0f} {result['unit']}/s"
+        print(f"{name:<16}{result['seconds']:9.2f}{result['items']:13,}{rate:>24}{mb}{result['peak_rss_mb']:9.0f}")
+
+
+def print_metrics(report: dict) -> None:
+    """Print the utils.metrics breakdown of every stage that collected one."""
+    from utils import metrics
+
+    for name, result in report["stages"].items():
+        if result.get("metrics"):
+            print(f"\n{name}:")
+            print(metrics.format_table(result["metrics"]))
+
+
+def print_comparison(base: dict, report: dict) -> None:
+    """Print per-stage rate ratios (new / base); above 1.0 is faster."""
+    print(f"\ncompared with {base['meta'].get('commit')} ({base['meta'].get('timestamp')}):")
+    for name, result in report["stages"].items():
+        old = base["stages"].get(name)
+        if not old or "error" in old or "error" in result or not old["items_per_s"]:
+            continue
+        ratio = result["items_per_s"] / old["items_per_s"]
+        mem = result["peak_rss_mb"] - old["peak_rss_mb"]
+        print(f"{name:<16} {old['items_per_s']:>14,.0f} -> {result['items_per_s']:>14,.0f} "
+              f"{result['unit']}/s  x{ratio:5.2f}  peak {mem:+.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archives", type=int, default=8)
+    parser.add_argument("--members", type=int, default=200, help="members per archive")
+    parser.add_argument("--records", type=int, default=4, help="records per member")
+    parser.add_argument("--text-bytes", type=int, default=2_000, help="average characters per record")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for register and count")
+    parser.add_argument("--lookups", type=int, default=200, help="random reads in read_random")
+    parser.add_argument("--upsert-rows", type=int, default=200_000)
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="comma-separated subset of stages; register always runs first")
+    parser.add_argument("--corpus-dir", help="where to keep the generated corpus (default: a temporary directory)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--metrics", action="store_true", help="collect and print per-stage metrics")
+    parser.add_argument("--profile", default="",
+                        help="comma-separated metric stages to run under cProfile (implies --metrics)")
+    parser.add_argument("--profile-dir", default="bench_profiles", help="where --profile writes .prof files")
+    args = parser.parse_args()
+    profile = [stage for stage in args.profile.split(",") if stage]
+
+    generator = CorpusGenerator(archives=args.archives, members=args.members, records=args.records,
+                                text_bytes=args.text_bytes, formats=args.formats.split(","),
+                                duplicate_rate=args.duplicate_rate, seed=args.seed)
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+        t0 = time.perf_counter()
+        corpus = prepare_corpus(generator, corpus_dir)
+        print(f"corpus: {corpus['archives']} archives, {corpus['members']:,} members, "
+              f"{corpus['payload_bytes'] / 1e6:,.1f} MB payload ({time.perf_counter() - t0:.1f} s)")
+
+        ctx = {"corpus_dir": corpus_dir, "db_path": os.path.join(work_dir, "bench.db"), "corpus": corpus,
+               "workers": args.workers, "seed": args.seed, "lookups": args.lookups,
+               "upsert_rows": args.upsert_rows, "metrics": args.metrics or bool(profile), "profile": profile,
+               "profile_dir": os.path.abspath(args.profile_dir)}
+        report = {
+            "meta": {"commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "cpus": os.cpu_count()},
+            "corpus": {"config": generator.config(), "summary": corpus},
+            "stages": {},
+        }
+        names = args.stages.split(",")
+        # Every other stage reads the database that register fills
+        if "register" not in names:
+            names.insert(0, "register")
+        for name in names:
+            report["stages"][name] = run_stage(name, ctx)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(report)
+    print_metrics(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+benchmarks/corpus.py
+
+Deterministic generator of synthetic corpora shaped like the real data: zip, tar, tar.gz and
+tar.xz archives whose members are JSON arrays or JSON Lines of {"text": ...} records, some of
+them nested as .xz files. The same arguments and seed always produce the same bytes.
+
+Archives are written one member at a time, so memory stays bounded by the largest member and
+the generator scales from a laptop-sized sample to large corpora.
+
+Run from the project root:
+    python -m benchmarks.corpus OUT_DIR [--archives N] [--members M] [--records R] [--text-bytes B]
+"""
+import argparse
+import gzip
+import io
+import json
+import lzma
+import os
+import random
+import tarfile
+import time
+import zipfile
+
+FORMATS = ("zip", "tar", "tar.gz", "tar.xz")
+_TAR_MODES = {"tar": "w", "tar.xz": "w:xz"}
+# Fixed timestamps keep the output byte-identical across runs
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+_SYLLABLES = [
+    "an", "ber", "ca", "de", "en", "fo", "ga", "hi", "in", "jo", "ka", "le", "mi", "no", "or",
+    "pa", "qu", "ri", "st", "th", "un", "ve", "wa", "xi", "yo", "ze", "tion", "ing", "ed", "ly",
+]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> tuple:
+    """Return (words, cumulative Zipf weights) for `size` distinct synthetic words."""
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, size + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+class CorpusGenerator:
+    """
+    Write synthetic archives into a directory.
+
+    - `archives` archives cycle through `formats`;
+    - each holds `members` members of `records` records with about `text_bytes` characters of text;
+    - `jsonl_rate` of members are JSON Lines instead of a JSON array, `nested_xz_rate` are stored
+      as nested .xz files, and `duplicate_rate` repeat an earlier member byte for byte;
+    - texts are lines of Zipf-distributed words from a `vocabulary`-word vocabulary.
+    """
+    def __init__(self, archives: int = 8, members: int = 200, records: int = 4, text_bytes: int = 2_000,
+                 formats=FORMATS, jsonl_rate: float = 0.5, nested_xz_rate: float = 0.2,
+                 duplicate_rate: float = 0.0, vocabulary: int = 20_000, seed: int = 0):
+        self.archives = archives
+        self.members = members
+        self.records = records
+        self.text_bytes = text_bytes
+        self.formats = tuple(formats)
+        self.jsonl_rate = jsonl_rate
+        self.nested_xz_rate = nested_xz_rate
+        self.duplicate_rate = duplicate_rate
+        self.vocabulary = vocabulary
+        self.seed = seed
+
+    def config(self) -> dict:
+        """The generator parameters, for benchmark reports."""
+        return {key: (list(value) if isinstance(value, tuple) else value) for key, value in vars(self).items()}
+
+    def _text(self, rng: random.Random, words: list, cum_weights: list) -> str:
+        """One record's text: lines of 5-20 words until about `text_bytes` characters."""
+        lines = []
+        size = 0
+        target = max(1, int(rng.uniform(0.5, 1.5) * self.text_bytes))
+        while size < target:
+            line = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 20)))
+            lines.append(line)
+            size += len(line) + 1
+        return "\n".join(lines)
+
+    def _member(self, rng: random.Random, words: list, cum_weights: list, index: int) -> tuple:
+        """Return (member_name, stored bytes, uncompressed payload size) for one member."""
+        records = [{"id": f"{index}-{i}", "text": self._text(rng, words, cum_weights)}
+                   for i in range(self.records)]
+        if rng.random() < self.jsonl_rate:
+            name = f"docs/{index:08d}.jsonl"
+            payload = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        else:
+            name = f"docs/{index:08d}.json"
+            payload = json.dumps(records).encode("utf-8")
+        if rng.random() < self.nested_xz_rate:
+            return name + ".xz", lzma.compress(payload, preset=1), len(payload)
+        return name, payload, len(payload)
+
+    def generate(self, out_dir: str) -> dict:
+        """
+        Write the corpus into `out_dir` and return a summary: archive and member counts,
+        bytes on disk and uncompressed payload bytes.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        rng = random.Random(self.seed)
+        words, cum_weights = make_vocabulary(self.vocabulary, rng)
+        summary = {"archives": 0, "members": 0, "records": 0, "archive_bytes": 0, "payload_bytes": 0}
+        # Recent members that later ones may duplicate
+        recent = []
+        index = 0
+        for a in range(self.archives):
+            fmt = self.formats[a % len(self.formats)]
+            path = os.path.join(out_dir, f"corpus-{a:05d}.{fmt}")
+            gz = None
+            if fmt == "zip":
+                archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+                def add(name, data, archive=archive):
+                    archive.writestr(zipfile.ZipInfo(name, _ZIP_DATE), data, compress_type=zipfile.ZIP_DEFLATED)
+            else:
+                if fmt == "tar.gz":
+                    gz = gzip.GzipFile(path, "wb", mtime=0)
+                    archive = tarfile.open(fileobj=gz, mode="w")
+                else:
+                    archive = tarfile.open(path, _TAR_MODES[fmt])
+
+                def add(name, data, archive=archive):
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    info.mtime = 0
+                    archive.addfile(info, io.BytesIO(data))
+            with archive:
+                for _ in range(self.members):
+                    if recent and rng.random() < self.duplicate_rate:
+                        original, data, payload_size = rng.choice(recent)
+                        name = f"docs/{index:08d}" + original[original.index("."):]
+                    else:
+                        name, data, payload_size = self._member(rng, words, cum_weights, index)
+                        recent = (recent + [(name, data, payload_size)])[-64:]
+                    add(name, data)
+                    index += 1
+                    summary["members"] += 1
+                    summary["records"] += self.records
+                    summary["payload_bytes"] += payload_size
+            if gz is not None:
+                gz.close()
+            summary["archives"] += 1
+            summary["archive_bytes"] += os.path.getsize(path)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--archives", type=int, default=8)
+    parser.add_argument("--members", type=int, default=200, help="members per archive")
+    parser.add_argument("--records", type=int, default=4, help="records per member")
+    parser.add_argument("--text-bytes", type=int, default=2_000, help="average characters per record")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated subset of " + ",".join(FORMATS))
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(archives=args.archives, members=args.members, records=args.records,
+                                text_bytes=args.text_bytes, formats=args.formats.split(","),
+                                duplicate_rate=args.duplicate_rate, seed=args.seed)
+    t0 = time.perf_counter()
+    summary = generator.generate(args.out_dir)
+    elapsed = time.perf_counter() - t0
+    print(f"{summary['archives']} archives, {summary['members']:,} members, {summary['records']:,} records, "
+          f"{summary['payload_bytes'] / 1e6:,.1f} MB payload, {summary['archive_bytes'] / 1e6:,.1f} MB on disk "
+          f"in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,87 @@
 # Where to read archives from
 TEXTS_PATH = "storage/text/"
+# Where materialized text shards are written
+SHARDS_PATH = "storage/shards/"
+# Where bulk exports of the corpus (file_reader/export.py) are written
+EXPORT_PATH = "storage/export/"
 # Where to read archives from
 DB_PATH = "storage/db/db_ai_data.db"
 # Which file extensions count as archives
-ARCHIVE_EXTENSION = {".zip", ".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2"}
\ No newline at end of file
+ARCHIVE_EXTENSION = {".zip", ".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2"}
+# Bytes hashed from each end of an archive to detect changes that keep its size and mtime
+ARCHIVE_FINGERPRINT_BYTES = 64 * 1024
+# How many member rows to insert per registration transaction
+REGISTER_BATCH_SIZE = 10000
+# Worker processes used to enumerate archives during registration (None = one per CPU core)
+REGISTER_WORKERS = None
+# How many files a reader claims from the work queue at once
+CLAIM_BATCH_SIZE = 256
+# Most bytes (summed files.file_size) a reader claims at once; a larger single file is claimed alone
+CLAIM_BATCH_BYTES = 256 * 1024 * 1024
+# Files larger than this are extracted through the streaming path instead of being read whole
+STREAM_MEMBER_BYTES = 64 * 1024 * 1024
+# Seconds before an unfinished claim expires and the files can be claimed again
+CLAIM_LEASE_SECONDS = 600
+# SQLite connection tuning, applied once per pooled connection
+DB_JOURNAL_MODE = "WAL"
+DB_SYNCHRONOUS = "NORMAL"
+# Negative values are KiB, positive values are pages
+DB_CACHE_SIZE = -65536
+DB_MMAP_SIZE = 256 * 1024 * 1024
+# Seconds to wait on a locked database before raising
+DB_BUSY_TIMEOUT = 30.0
+# Prepared statements cached per connection
+DB_STATEMENT_CACHE_SIZE = 256
+# Extraction pipeline: worker processes (None = one per CPU core) and result queue bound
+PIPELINE_WORKERS = None
+PIPELINE_QUEUE_SIZE = 64
+# Plan size-balanced batches (file_reader/scheduler.py) before a pipeline run
+PIPELINE_SCHEDULE = True
+# JSON field holding the text of a record; dots walk into nested objects (e.g. "meta.text")
+TEXT_FIELD = "text"
+# Characters read per chunk when streaming a member
+STREAM_CHUNK_SIZE = 1 << 20
+# Worker processes for TextCleaner.clean_many (None = one per CPU core)
+CLEAN_WORKERS = None
+# Word counting: flush in-memory counts to word_counts after this many distinct words or estimated bytes
+WORD_COUNT_FLUSH_ROWS = 200_000
+WORD_COUNT_FLUSH_BYTES = 64 * 1024 * 1024
+# BPE training: target vocabulary size and minimum pair frequency for a merge
+BPE_VOCAB_SIZE = 32_000
+BPE_MIN_FREQUENCY = 2
+# Heavy hitters: words tracked by the in-memory Space-Saving summary (memory is about 200 bytes per word)
+HEAVY_HITTERS_CAPACITY = 10_000
+# Skip members whose bytes match an already-read member (duplicates are linked to the first copy)
+DEDUPE_CONTENT = True
+# Materialized shards: start a new shard file once the current one reaches this many bytes
+SHARD_SIZE = 1 << 30
+# Compressed tars: uncompressed bytes between in-memory gzip decompressor snapshots used for random reads
+SEEK_CHECKPOINT_SPAN = 16 * 1024 * 1024
+# FileReader archive handles: most open at once and estimated memory they may hold (None = no memory limit)
+ARCHIVE_CACHE_HANDLES = 64
+ARCHIVE_CACHE_BYTES = 512 * 1024 * 1024
+# Per-stage timing and throughput metrics (utils/metrics.py); off by default, see metrics.enable()
+METRICS_ENABLED = False
+# Stage names that also run under cProfile while metrics are enabled (e.g. "cleaner.clean")
+METRICS_PROFILE_STAGES = ()
+# Bulk export: start a new output shard once it holds this many (uncompressed) bytes
+EXPORT_SHARD_BYTES = 256 * 1024 * 1024
+# Bulk export shard compression ("gz", "xz" or None) and level; low levels keep the export disk-bound
+EXPORT_COMPRESSION = "gz"
+EXPORT_COMPRESS_LEVEL = 1
+# Worker processes for bulk export (None = one per CPU core)
+EXPORT_WORKERS = None
+# Full-text index (search/indexer.py): worker processes (None = one per CPU core) and input bytes per task
+SEARCH_WORKERS = None
+SEARCH_BATCH_BYTES = 64 * 1024 * 1024
+# Full-text index: write to the index after this many documents or characters are buffered
+SEARCH_FLUSH_DOCS = 2_000
+SEARCH_FLUSH_BYTES = 64 * 1024 * 1024
+# N-gram counting (stats/ngram_counter.py): memory for in-memory counts, shared by all workers, before sorted runs are spilled to disk
+NGRAM_MEMORY_BYTES = 1 << 30
+# N-gram counting: worker processes (None = one per CPU core) and input bytes per task
+NGRAM_WORKERS = None
+NGRAM_BATCH_BYTES = 64 * 1024 * 1024
+# N-gram counting: most runs merged at once, and where runs are spilled (None = the system temp directory)
+NGRAM_MERGE_FANIN = 64
+NGRAM_SPILL_PATH = None
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils import metrics
+from utils.path import DB_ABS_PATH
+from config.settings import (
+    DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE, DB_MMAP_SIZE,
+    DB_BUSY_TIMEOUT, DB_STATEMENT_CACHE_SIZE,
+)
+
+# One connection per thread; a forked child opens its own instead of reusing the parent's
+_local = threading.local()
+_db_path = DB_ABS_PATH
+# Connections inherited across fork are kept referenced so the child never closes the parent's handle
+_inherited = []
+
+# --------------------- CONFIGURATION ---------------------
+def set_database_path(path: str) -> None:
+    """
+    Point the shared connections at another database file (e.g. for benchmarks).
+    The calling thread's connection is closed; other threads reconnect on next use.
+    """
+    global _db_path
+    close_connection()
+    _db_path = path
+
+
+def get_database_path() -> str:
+    """Return the database file the shared connections use."""
+    return _db_path
+
+# --------------------- CONNECTION ---------------------
+def _connect() -> sqlite3.Connection:
+    """Open a tuned connection in autocommit mode; transactions are managed by `transaction()`."""
+    conn = sqlite3.connect(
+        _db_path,
+        timeout=DB_BUSY_TIMEOUT,
+        isolation_level=None,
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+    )
+    conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = {int(DB_CACHE_SIZE)}")
+    conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the calling thread's shared connection, opening it on first use.
+    Do not close it; use `close_connection()` instead.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid() and _local.path == _db_path:
+        return conn
+    if conn is not None and _local.pid != os.getpid():
+        _inherited.append(conn)
+    _local.conn = _connect()
+    _local.pid = os.getpid()
+    _local.path = _db_path
+    _local.depth = 0
+    return _local.conn
+
+
+def close_connection() -> None:
+    """Close the calling thread's shared connection, if it has one."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    if _local.pid == os.getpid():
+        conn.close()
+    else:
+        _inherited.append(conn)
+    _local.conn = None
+
+# --------------------- TRANSACTIONS ---------------------
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    Run a block inside a transaction on the shared connection and yield the connection.
+
+    Transactions nest: only the outermost block issues BEGIN and COMMIT (or ROLLBACK on error),
+    so callers can span many repository calls with a single commit:
+
+        with transaction():
+            for row in rows:
+                files_repo.add_file(*row)
+
+    `immediate=True` takes the write lock at BEGIN; it has no effect on a nested block.
+    """
+    conn = get_connection()
+    if _local.depth == 0:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.execute("ROLLBACK")
+        raise
+    else:
+        _local.depth -= 1
+        if _local.depth == 0:
+            with metrics.stage("db.commit"):
+                conn.execute("COMMIT")
+
+
+def in_transaction() -> bool:
+    """Return True if the calling thread is inside a `transaction()` block."""
+    return getattr(_local, 'conn', None) is not None and _local.pid == os.getpid() and _local.depth > 0
@@ -0,0 +1,117 @@
+from db.database import get_connection, transaction
+
+# --------------------- INSERT / UPDATE ---------------------
+def upsert_archive(path: str, kind: str, size: int, mtime_ns: int, fingerprint: str, member_count: int) -> None:
+    """
+    Record the state of an archive as of its latest enumeration.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO archives(path, kind, size, mtime_ns, fingerprint, member_count)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                kind = excluded.kind,
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                fingerprint = excluded.fingerprint,
+                member_count = excluded.member_count,
+                scanned_at = CURRENT_TIMESTAMP;
+            """,
+            (path, kind, size, mtime_ns, fingerprint, member_count)
+        )
+
+def ensure_archives(paths) -> None:
+    """
+    Give every path in `paths` an archives row, so files can refer to it by id. New rows are
+    placeholders (kind '', size -1) that never match a scanned state, so registration enumerates them.
+    """
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO archives(path, kind, size, mtime_ns, fingerprint)
+            VALUES(?, '', -1, -1, '')
+            """,
+            [(path,) for path in paths]
+        )
+
+def set_checkpoints(path: str, checkpoints) -> None:
+    """
+    Replace the seek checkpoints of an archive with (uncompressed_offset, compressed_offset) pairs.
+    The archive must have an archives row.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM archives WHERE path = ?", (path,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Unknown archive {path}")
+        archive_id = row[0]
+        cur.execute("DELETE FROM archive_checkpoints WHERE archive_id = ?", (archive_id,))
+        cur.executemany(
+            """
+            INSERT OR REPLACE INTO archive_checkpoints(archive_id, uncompressed_offset, compressed_offset)
+            VALUES(?, ?, ?)
+            """,
+            [(archive_id, u, c) for u, c in checkpoints]
+        )
+
+# --------------------- SELECT ---------------------
+def get_archive(path: str) -> tuple:
+    """
+    Return the archive record for `path`, or None if it is unknown.
+    Row: (path, kind, size, mtime_ns, fingerprint, member_count, scanned_at); see `ensure_archives`
+    for rows of archives that were never enumerated.
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT path, kind, size, mtime_ns, fingerprint, member_count, scanned_at
+          FROM archives
+         WHERE path = ?
+        """,
+        (path,)
+    )
+    row = cur.fetchone()
+    return row
+
+
+def get_archive_states() -> dict:
+    """
+    Return {path: (size, mtime_ns, fingerprint)} for every known archive.
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT path, size, mtime_ns, fingerprint FROM archives")
+    states = {row[0]: row[1:] for row in cur.fetchall()}
+    return states
+
+def get_checkpoints(path: str) -> list:
+    """
+    Return the seek checkpoints of an archive as (uncompressed_offset, compressed_offset) pairs,
+    in stream order.
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT c.uncompressed_offset, c.compressed_offset
+          FROM archive_checkpoints c
+          JOIN archives a ON a.id = c.archive_id
+         WHERE a.path = ?
+         ORDER BY c.uncompressed_offset
+        """,
+        (path,)
+    )
+    rows = cur.fetchall()
+    return rows
+
+# --------------------- DELETE ---------------------
+def delete_archive(path: str) -> None:
+    """Remove an archive record and its checkpoints (its files rows are left to the caller)."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM archive_checkpoints WHERE archive_id = (SELECT id FROM archives WHERE path = ?)",
+            (path,)
+        )
+        cur.execute("DELETE FROM archives WHERE path = ?", (path,))
@@ -1,65 +1,116 @@
-import sqlite3
-from utils.path import DB_ABS_PATH
+import sys
+import time
+from collections import namedtuple
 
-# --------------------- CONNECTION ---------------------
-def get_connection():
-    """Return a new SQLite connection to the project database."""
-    return sqlite3.connect(DB_ABS_PATH)
+from config.settings import REGISTER_BATCH_SIZE, CLAIM_BATCH_SIZE, CLAIM_LEASE_SECONDS
+from db.database import get_connection, transaction
+from db.repositories.archives_repo import ensure_archives
+from utils import metrics
+
+# One catalog entry; a plain tuple underneath, so rows still unpack positionally
+FileRecord = namedtuple('FileRecord', 'id archive_path member_path file_name file_size member_offset')
+
+# Columns and joins that rebuild a FileRecord from the normalized catalog
+_RECORD_SELECT = """
+    SELECT f.id, a.path, d.path || f.file_name, f.file_name, f.file_size, f.member_offset
+      FROM files f
+      JOIN archives a ON a.id = f.archive_id
+      JOIN member_dirs d ON d.id = f.dir_id
+"""
+
+_INSERT_SQL = """
+    INSERT OR IGNORE INTO files (archive_id, dir_id, file_name, extension, file_size, member_offset)
+    VALUES ((SELECT id FROM archives WHERE path = ?), (SELECT id FROM member_dirs WHERE path = ?), ?, ?, ?, ?)
+"""
+
+
+def _record(cursor, row) -> FileRecord:
+    """Row factory: archive paths are interned, so records of one archive share a single string."""
+    return FileRecord(row[0], sys.intern(row[1]), *row[2:])
+
+
+def split_member_path(member_path: str) -> tuple:
+    """Split a member path into its directory prefix (ending in '/', or '') and file name."""
+    cut = member_path.rfind('/') + 1
+    return member_path[:cut], member_path[cut:]
+
+
+def _insert_rows(conn, rows) -> None:
+    """Insert (archive_path, member_path, _, extension, file_size, member_offset) rows, interning prefixes."""
+    ensure_archives({row[0] for row in rows})
+    split = [(row[0], *split_member_path(row[1]), row[3], row[4], row[5])
+             for row in rows]
+    conn.executemany("INSERT OR IGNORE INTO member_dirs(path) VALUES (?)", {(row[1],) for row in split})
+    conn.executemany(_INSERT_SQL, split)
 
 # --------------------- INSERT ---------------------
-def add_file(archive_path: str, member_path: str, file_name: str, extension: str, file_size: int) -> None:
+def add_file(archive_path: str, member_path: str, file_name: str, extension: str, file_size: int,
+             member_offset: int = None) -> None:
     """
     Insert a new file record, or ignore if it already exists.
+    `member_offset` is the member's position in the archive (tar data offset, zip header offset).
+    The stored file name is the part of `member_path` after its last '/'.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-         INSERT OR IGNORE INTO files
-           (archive_path, member_path, file_name, extension, file_size)
-         VALUES (?, ?, ?, ?, ?)
-        """,
-        (archive_path, member_path, file_name, extension, file_size)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        _insert_rows(conn, [(archive_path, member_path, file_name, extension, file_size, member_offset)])
+
+def add_files(rows, batch_size: int = REGISTER_BATCH_SIZE) -> int:
+    """
+    Bulk-insert file records, ignoring ones that already exist.
+    `rows` is an iterable of (archive_path, member_path, file_name, extension, file_size, member_offset).
+    Archive paths and member directory prefixes are stored once and referenced by id.
+    Rows are written with executemany, committing once every `batch_size` rows.
+    Returns the number of rows submitted.
+    """
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with metrics.stage("db.files.insert", items=len(batch)), transaction() as conn:
+                _insert_rows(conn, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        with metrics.stage("db.files.insert", items=len(batch)), transaction() as conn:
+            _insert_rows(conn, batch)
+        total += len(batch)
+    return total
 
 # --------------------- SELECT ---------------------
-def get_file_by_id(file_id: int) -> tuple:
+def get_file_by_id(file_id: int) -> FileRecord:
     """
-    Return the file record for a given ID.
-    Row: (id, archive_path, member_path, file_name, extension, file_size, processed, detected_at)
+    Return the FileRecord for a given ID, or None if not found.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, archive_path, member_path, file_name, extension, file_size, processed, detected_at
-          FROM files
-         WHERE id = ?
-        """,
-        (file_id,)
-    )
+    cur = get_connection().cursor()
+    cur.row_factory = _record
+    cur.execute(_RECORD_SELECT + " WHERE f.id = ?", (file_id,))
     row = cur.fetchone()
-    conn.close()
     return row
 
+def get_file_records(file_ids, chunk_size: int = 500) -> list:
+    """
+    Return the FileRecords of the given IDs (missing IDs are skipped), in no particular order.
+    """
+    file_ids = list(file_ids)
+    cur = get_connection().cursor()
+    cur.row_factory = _record
+    rows = []
+    for start in range(0, len(file_ids), chunk_size):
+        chunk = file_ids[start:start + chunk_size]
+        cur.execute(_RECORD_SELECT + f" WHERE f.id IN ({','.join('?' * len(chunk))})", chunk)
+        rows.extend(cur.fetchall())
+    return rows
+
 def get_unprocessed_files() -> list:
     """
-    Return all files that have not yet been processed.
-    Each row is a tuple: (id, archive_path, member_path, file_name, file_size).
+    Return all files that have not yet been processed, as FileRecords.
+    Prefer `iter_file_records` or `claim_files` on large catalogs.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, archive_path, member_path, file_name, file_size
-          FROM files
-         WHERE processed = 0
-        """
-    )
+    cur = get_connection().cursor()
+    cur.row_factory = _record
+    cur.execute(_RECORD_SELECT + " WHERE f.processed = 0")
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
@@ -68,144 +119,501 @@ def get_all_files(limit: int = None) -> list:
     Retrieve all file records, optionally limited in number.
     Rows: (id, archive_path, member_path, file_name, file_size, processed)
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    sql = "SELECT id, archive_path, member_path, file_name, file_size, processed FROM files"
+    cur = get_connection().cursor()
+    sql = """
+        SELECT f.id, a.path, d.path || f.file_name, f.file_name, f.file_size, f.processed
+          FROM files f
+          JOIN archives a ON a.id = f.archive_id
+          JOIN member_dirs d ON d.id = f.dir_id
+        """
     if limit is not None:
         sql += " LIMIT ?"
         cur.execute(sql, (limit,))
     else:
         cur.execute(sql)
-    rows = cur.fetchall()
-    conn.close()
+    rows = [(row[0], sys.intern(row[1]), *row[2:]) for row in cur.fetchall()]
     return rows
 
 
-def count_unprocessed() -> int:
-    """Return the number of unprocessed files."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM files WHERE processed = 0")
+def count_files() -> int:
+    """Return the number of registered files."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM files")
     count, = cur.fetchone()
-    conn.close()
     return count
 
-# --------------------- UPDATE ---------------------
-def mark_file_processed_by_id(file_id: int) -> None:
+
+def get_archive_members(archive_path: str) -> dict:
     """
-    Mark the given file record as processed.
+    Return the registered members of one archive as {member_path: (id, file_size, member_offset)}.
     """
-    conn = get_connection()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute(
         """
-        UPDATE files
-           SET processed = 1
-         WHERE id = ?
+        SELECT d.path || f.file_name, f.id, f.file_size, f.member_offset
+          FROM files f
+          JOIN member_dirs d ON d.id = f.dir_id
+         WHERE f.archive_id = (SELECT id FROM archives WHERE path = ?)
         """,
-        (file_id,)
+        (archive_path,)
     )
-    conn.commit()
-    conn.close()
+    members = {row[0]: row[1:] for row in cur.fetchall()}
+    return members
 
-def unmark_file_processed_by_id(file_id: int) -> None:
+
+def iter_file_records(batch_size: int = 10_000):
     """
-    Mark the given file record as unprocessed.
+    Lazily stream every FileRecord, grouped by archive and in member order within each archive.
+    Rows are fetched `batch_size` at a time, so memory stays flat however large the catalog is.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    cur = get_connection().cursor()
+    cur.row_factory = _record
+    cur.execute(_RECORD_SELECT + " ORDER BY f.archive_id, f.member_offset")
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def count_unprocessed() -> int:
+    """Return the number of unprocessed files."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM files WHERE processed = 0")
+    count, = cur.fetchone()
+    return count
+
+
+def get_pending_archives() -> list:
+    """Return the paths of archives that still have unprocessed files."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT path FROM archives WHERE id IN (SELECT archive_id FROM files WHERE processed = 0)")
+    paths = [row[0] for row in cur.fetchall()]
+    return paths
+
+# --------------------- WORK QUEUE ---------------------
+def _lease(cur, owner: str, expires: float, rows) -> None:
+    cur.executemany(
         """
         UPDATE files
-           SET processed = 0
+           SET lease_owner = ?, lease_expires = ?
          WHERE id = ?
         """,
-        (file_id,)
+        [(owner, expires, row[0]) for row in rows]
     )
-    conn.commit()
-    conn.close()
+
+def claim_files(owner: str, batch_size: int = CLAIM_BATCH_SIZE, lease_seconds: float = CLAIM_LEASE_SECONDS,
+                archive_path: str = None, max_bytes: int = None) -> list:
+    """
+    Atomically reserve up to `batch_size` unprocessed files for `owner`.
+    Files whose lease has expired (e.g. their worker crashed) can be claimed again.
+    `batch_size=None` claims every available file; `archive_path` limits the claim to one archive.
+    `max_bytes` stops the claim before the summed file sizes exceed it (the first file is always
+    claimed). Returns FileRecords.
+    """
+    now = time.time()
+    params = [now]
+    archive_filter = ""
+    if archive_path is not None:
+        archive_filter = "AND f.archive_id = (SELECT id FROM archives WHERE path = ?)"
+        params.append(archive_path)
+    params.append(-1 if batch_size is None else batch_size)
+    # Take the write lock up front so two workers cannot claim the same rows
+    with metrics.stage("db.files.claim") as span, transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.row_factory = _record
+        cur.execute(
+            _RECORD_SELECT + f"""
+             WHERE f.processed = 0
+               AND (f.lease_expires IS NULL OR f.lease_expires < ?)
+               {archive_filter}
+             ORDER BY f.id
+             LIMIT ?
+            """,
+            params
+        )
+        rows = cur.fetchall()
+        if max_bytes is not None:
+            total = 0
+            for i, row in enumerate(rows):
+                total += row.file_size
+                if total > max_bytes and i:
+                    del rows[i:]
+                    break
+        _lease(cur, owner, now + lease_seconds, rows)
+        span.add(items=len(rows))
+    return rows
+
+def claim_batch(owner: str, lease_seconds: float = CLAIM_LEASE_SECONDS) -> list:
+    """
+    Atomically reserve the pending files of the lowest-numbered planned batch (see
+    file_reader/scheduler.py) whose files are not leased. Returns FileRecords in member order,
+    or an empty list once no planned batch is left.
+    """
+    now = time.time()
+    with metrics.stage("db.files.claim_batch") as span, transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT batch_id
+              FROM files
+             WHERE processed = 0 AND batch_id IS NOT NULL
+               AND (lease_expires IS NULL OR lease_expires < ?)
+             ORDER BY batch_id
+             LIMIT 1
+            """,
+            (now,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return []
+        cur.row_factory = _record
+        cur.execute(
+            _RECORD_SELECT + """
+             WHERE f.processed = 0 AND f.batch_id = ?
+               AND (f.lease_expires IS NULL OR f.lease_expires < ?)
+             ORDER BY f.member_offset
+            """,
+            (row[0], now)
+        )
+        rows = cur.fetchall()
+        _lease(cur, owner, now + lease_seconds, rows)
+        span.add(items=len(rows))
+    return rows
+
+def renew_leases(file_ids, lease_seconds: float = CLAIM_LEASE_SECONDS) -> list:
+    """
+    Push back the lease expiry of those given files that are still unprocessed, so they are not
+    claimed again while their results are in flight. Returns the IDs that are still unprocessed.
+    """
+    file_ids = list(file_ids)
+    expires = time.time() + lease_seconds
+    pending = []
+    with transaction() as conn:
+        cur = conn.cursor()
+        for start in range(0, len(file_ids), 500):
+            chunk = file_ids[start:start + 500]
+            cur.execute(f"SELECT id FROM files WHERE processed = 0 AND id IN ({','.join('?' * len(chunk))})", chunk)
+            pending.extend(row[0] for row in cur.fetchall())
+        cur.executemany("UPDATE files SET lease_expires = ? WHERE id = ?", [(expires, file_id) for file_id in pending])
+    return pending
+
+def release_files(file_ids) -> None:
+    """
+    Drop the claims on the given files without marking them processed.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            UPDATE files
+               SET lease_owner = NULL, lease_expires = NULL
+             WHERE id = ?
+            """,
+            [(file_id,) for file_id in file_ids]
+        )
+
+# --------------------- SCHEDULING ---------------------
+def iter_file_sizes(processed: bool = None, archive_pattern: str = None, unique: bool = False,
+                    indexed: bool = None, batch_size: int = 10_000):
+    """
+    Lazily stream (id, archive_id, file_size) for matching files, grouped by archive and in member
+    order within each archive. `processed` selects processed (True) or unprocessed (False) files,
+    `archive_pattern` is an SQLite GLOB on the archive path, `unique` skips files recognised as
+    duplicates of another file's content, and `indexed` selects files in (or not yet in) the
+    full-text index.
+    """
+    conditions = []
+    params = []
+    if processed is not None:
+        conditions.append("processed = ?")
+        params.append(1 if processed else 0)
+    if indexed is not None:
+        conditions.append("indexed = ?")
+        params.append(1 if indexed else 0)
+    if archive_pattern is not None:
+        conditions.append("archive_id IN (SELECT id FROM archives WHERE path GLOB ?)")
+        params.append(archive_pattern)
+    if unique:
+        conditions.append("duplicate_of IS NULL")
+    sql = "SELECT id, archive_id, file_size FROM files"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    cur = get_connection().cursor()
+    cur.execute(sql + " ORDER BY archive_id, member_offset", params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def iter_pending_sizes(batch_size: int = 10_000):
+    """
+    Lazily stream (id, archive_id, file_size) for every unprocessed file, grouped by archive and
+    in member order within each archive.
+    """
+    return iter_file_sizes(processed=False, batch_size=batch_size)
+
+def set_batch_ids(pairs) -> None:
+    """
+    Set batch ids from (batch_id, file_id) pairs in a single transaction.
+    """
+    with transaction() as conn:
+        conn.executemany("UPDATE files SET batch_id = ? WHERE id = ?", pairs)
+
+def renumber_batches(order) -> None:
+    """
+    Renumber batches: `order` lists current batch ids, and the batch at position i gets batch id i.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS batch_order (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+        cur.execute("DELETE FROM batch_order")
+        cur.executemany("INSERT INTO batch_order (old_id, new_id) VALUES (?, ?)",
+                        [(old_id, new_id) for new_id, old_id in enumerate(order)])
+        cur.execute(
+            """
+            UPDATE files
+               SET batch_id = (SELECT new_id FROM batch_order WHERE old_id = files.batch_id)
+             WHERE batch_id IS NOT NULL
+            """
+        )
+        cur.execute("DELETE FROM batch_order")
+
+def clear_batch_ids() -> None:
+    """
+    Forget the current batch plan.
+    """
+    with transaction() as conn:
+        conn.execute("UPDATE files SET batch_id = NULL WHERE batch_id IS NOT NULL")
+
+# --------------------- CONTENT DEDUPLICATION ---------------------
+def link_content(file_id: int, content_hash: str) -> int:
+    """
+    Store the content hash of a file and link it to the first file seen with the same content.
+    Returns the ID of the canonical file: `file_id` itself for new content, otherwise the file
+    it duplicates (whose `duplicate_of` stays NULL). Safe to call again for the same file.
+    """
+    # Take the write lock up front so two readers of identical content agree on one canonical copy
+    with metrics.stage("db.files.link_content", items=1), transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id
+              FROM files
+             WHERE content_hash = ? AND duplicate_of IS NULL AND id != ?
+             ORDER BY id
+             LIMIT 1
+            """,
+            (content_hash, file_id)
+        )
+        row = cur.fetchone()
+        canonical = row[0] if row else None
+        cur.execute(
+            """
+            UPDATE files
+               SET content_hash = ?, duplicate_of = ?
+             WHERE id = ?
+            """,
+            (content_hash, canonical, file_id)
+        )
+    return canonical or file_id
+
+def get_duplicate_ids(file_id: int) -> list:
+    """Return the IDs of files linked to `file_id` as duplicates of its content."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT id FROM files WHERE duplicate_of = ? ORDER BY id", (file_id,))
+    ids = [row[0] for row in cur.fetchall()]
+    return ids
+
+def count_duplicates() -> int:
+    """Return the number of files recognised as duplicates of another file's content."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM files WHERE duplicate_of IS NOT NULL")
+    count, = cur.fetchone()
+    return count
+
+# --------------------- UPDATE ---------------------
+def mark_file_processed_by_id(file_id: int) -> None:
+    """
+    Mark the given file record as processed.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE files
+               SET processed = 1, lease_owner = NULL, lease_expires = NULL
+             WHERE id = ?
+            """,
+            (file_id,)
+        )
+
+def mark_files_processed(file_ids) -> None:
+    """
+    Mark several file records as processed in a single transaction.
+    """
+    file_ids = list(file_ids)
+    with metrics.stage("db.files.mark_processed", items=len(file_ids)), transaction() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            UPDATE files
+               SET processed = 1, lease_owner = NULL, lease_expires = NULL
+             WHERE id = ?
+            """,
+            [(file_id,) for file_id in file_ids]
+        )
+
+def unmark_file_processed_by_id(file_id: int) -> None:
+    """
+    Mark the given file record as unprocessed.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE files
+               SET processed = 0
+             WHERE id = ?
+            """,
+            (file_id,)
+        )
 
 def update_file_by_id(file_id: int, **kwargs) -> None:
     """
     Update arbitrary fields on a file record.
-    Allowed keys: archive_path, member_path, file_name, file_size, processed.
+    Allowed keys: archive_path, member_path, extension, file_size, processed, member_offset.
     """
-    allowed = {"archive_path", "member_path", "file_name", "extension", "file_size", "processed"}
+    allowed = {"extension", "file_size", "processed", "member_offset"}
     set_clause = []
     params = []
     for key, value in kwargs.items():
         if key in allowed:
             set_clause.append(f"{key} = ?")
             params.append(value)
-    if not set_clause:
-        return
-    params.append(file_id)
 
-    conn = get_connection()
-    cur = conn.cursor()
-    sql = f"UPDATE files SET {', '.join(set_clause)} WHERE id = ?"
-    cur.execute(sql, params)
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        if "archive_path" in kwargs:
+            ensure_archives([kwargs["archive_path"]])
+            set_clause.append("archive_id = (SELECT id FROM archives WHERE path = ?)")
+            params.append(kwargs["archive_path"])
+        if "member_path" in kwargs:
+            prefix, file_name = split_member_path(kwargs["member_path"])
+            cur.execute("INSERT OR IGNORE INTO member_dirs(path) VALUES (?)", (prefix,))
+            set_clause.append("dir_id = (SELECT id FROM member_dirs WHERE path = ?), file_name = ?")
+            params.extend((prefix, file_name))
+        if not set_clause:
+            return
+        params.append(file_id)
+        sql = f"UPDATE files SET {', '.join(set_clause)} WHERE id = ?"
+        cur.execute(sql, params)
+
+def update_member_offsets(pairs) -> None:
+    """
+    Set new member offsets from (member_offset, file_id) pairs in a single transaction.
+    """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.executemany("UPDATE files SET member_offset = ? WHERE id = ?", pairs)
 
 def unmark_all_files() -> None:
     """
     Mark all file records as unprocessed.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        UPDATE files
-           SET processed = 0
-        """
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE files
+               SET processed = 0
+            """
+        )
+
+def reset_files(file_ids) -> None:
+    """
+    Forget everything learned from the content of several files, in a single transaction: they
+    become unprocessed, unhashed and unindexed, and their full-text documents are removed.
+    Duplicates of a reset file are re-linked as by `delete_files`.
+    """
+    file_ids = set(file_ids)
+    if not file_ids:
+        return
+    with transaction() as conn:
+        cur = conn.cursor()
+        _relink_duplicates(cur, file_ids)
+        cur.executemany(
+            """
+            UPDATE files
+               SET processed = 0, content_hash = NULL, duplicate_of = NULL, indexed = 0,
+                   lease_owner = NULL, lease_expires = NULL
+             WHERE id = ?
+            """,
+            [(file_id,) for file_id in file_ids]
+        )
+        cur.executemany("DELETE FROM documents_fts WHERE rowid = ?", [(file_id,) for file_id in file_ids])
 
 # --------------------- DELETE ---------------------
+def _relink_duplicates(cur, file_ids: set) -> None:
+    """
+    Re-link the duplicates of `file_ids` (other than those files themselves) to the oldest
+    remaining copy, which becomes canonical.
+    """
+    for file_id in file_ids:
+        cur.execute("SELECT id FROM files WHERE duplicate_of = ? ORDER BY id", (file_id,))
+        survivors = [row[0] for row in cur.fetchall() if row[0] not in file_ids]
+        if not survivors:
+            continue
+        canonical = survivors[0]
+        # The new canonical copy was never indexed on its own
+        cur.execute("UPDATE files SET duplicate_of = NULL, indexed = 0 WHERE id = ?", (canonical,))
+        cur.executemany(
+            "UPDATE files SET duplicate_of = ? WHERE id = ?",
+            [(canonical, dup_id) for dup_id in survivors[1:]]
+        )
+
 def delete_file_by_id(file_id: int) -> None:
     """
-    Delete a file record by its ID.
+    Delete a file record by its ID; its duplicates are re-linked as by `delete_files`.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        DELETE FROM files
-         WHERE id = ?
-        """,
-        (file_id,)
-    )
-    conn.commit()
-    conn.close()
+    delete_files([file_id])
+
+def delete_files(file_ids) -> None:
+    """
+    Delete several file records in a single transaction.
+    Duplicates of a deleted file are re-linked to the oldest remaining copy, which becomes canonical.
+    """
+    file_ids = set(file_ids)
+    if not file_ids:
+        return
+    with transaction() as conn:
+        cur = conn.cursor()
+        _relink_duplicates(cur, file_ids)
+        cur.executemany("DELETE FROM files WHERE id = ?", [(file_id,) for file_id in file_ids])
 
 # --------------------- DELETE ALL ---------------------
 def delete_all_files() -> None:
     """
     Delete all file records from the table.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        DELETE FROM files
-        """
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM files
+            """
+        )
 
 # --------------------- SCHEMA ---------------------
 def drop_table() -> None:
     """
     Drop the `files` table entirely.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        DROP TABLE IF EXISTS files
-        """
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DROP TABLE IF EXISTS files
+            """
+        )
@@ -0,0 +1,68 @@
+from db.database import get_connection, transaction
+
+# --------------------- INSERT / UPDATE ---------------------
+def save_run_metrics(run_id: str, snapshot: dict) -> int:
+    """
+    Store a utils.metrics snapshot as one run_metrics row per stage, replacing rows already
+    stored for the same run and stage. Returns the number of stages written.
+    """
+    rows = [
+        (run_id, stage, s["calls"], s["items"], s["bytes"], s["errors"], s["seconds"], s["max_seconds"],
+         s["p50"], s["p95"], s["p99"])
+        for stage, s in snapshot.items()
+    ]
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO run_metrics
+              (run_id, stage, calls, items, bytes, errors, seconds, max_seconds,
+               p50_seconds, p95_seconds, p99_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows
+        )
+    return len(rows)
+
+# --------------------- SELECT ---------------------
+def get_run_metrics(run_id: str) -> list:
+    """
+    Return the stages of one run, slowest first.
+    Row: (stage, calls, items, bytes, errors, seconds, max_seconds, p50_seconds, p95_seconds, p99_seconds)
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT stage, calls, items, bytes, errors, seconds, max_seconds, p50_seconds, p95_seconds, p99_seconds
+          FROM run_metrics
+         WHERE run_id = ?
+         ORDER BY seconds DESC
+        """,
+        (run_id,)
+    )
+    rows = cur.fetchall()
+    return rows
+
+
+def list_runs() -> list:
+    """
+    Return (run_id, stage count, recorded_at) for every stored run, newest first.
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT run_id, COUNT(*), MAX(recorded_at)
+          FROM run_metrics
+         GROUP BY run_id
+         ORDER BY MAX(recorded_at) DESC
+        """
+    )
+    rows = cur.fetchall()
+    return rows
+
+# --------------------- DELETE ---------------------
+def delete_run(run_id: str) -> None:
+    """
+    Delete the stored metrics of one run.
+    """
+    with transaction() as conn:
+        conn.execute("DELETE FROM run_metrics WHERE run_id = ?", (run_id,))
@@ -0,0 +1,94 @@
+from db.database import get_connection, transaction
+from db.schema import NGRAM_COUNTS_COUNT_INDEX_DDL
+from utils import metrics
+
+# --------------------- INSERT / UPDATE ---------------------
+def replace_ngram_counts(n: int, counts, batch_size: int = 50_000) -> int:
+    """
+    Replace the stored counts of `n`-grams with (ngram, count) pairs from `counts`, an iterable
+    consumed lazily. Everything happens in one transaction, so readers see either the old counts
+    or the new ones. Pairs sorted by ngram are inserted in primary-key order, which keeps the
+    b-tree writes sequential. Returns the number of rows written.
+    """
+    sql = "INSERT INTO ngram_counts (n, ngram, count) VALUES (?, ?, ?)"
+    total = 0
+    with transaction() as conn:
+        conn.execute("DELETE FROM ngram_counts WHERE n = ?", (n,))
+        batch = []
+        for ngram, count in counts:
+            batch.append((n, ngram, count))
+            if len(batch) >= batch_size:
+                with metrics.stage("db.ngram_counts.insert", items=len(batch)):
+                    conn.executemany(sql, batch)
+                total += len(batch)
+                batch.clear()
+        if batch:
+            with metrics.stage("db.ngram_counts.insert", items=len(batch)):
+                conn.executemany(sql, batch)
+            total += len(batch)
+    return total
+
+def drop_count_index() -> None:
+    """Drop idx_ngram_counts_count ahead of a bulk load; `create_count_index` restores it."""
+    with transaction() as conn:
+        conn.execute("DROP INDEX IF EXISTS idx_ngram_counts_count")
+
+def create_count_index() -> None:
+    """(Re)create idx_ngram_counts_count, sorting the whole table once."""
+    with metrics.stage("db.ngram_counts.index"), transaction() as conn:
+        conn.execute(NGRAM_COUNTS_COUNT_INDEX_DDL)
+
+# --------------------- SELECT ---------------------
+def get_ngram_count(words) -> int:
+    """
+    Return the count of an n-gram given as a sequence of words, or 0 if not present.
+    """
+    words = list(words)
+    cur = get_connection().cursor()
+    cur.execute(
+        "SELECT count FROM ngram_counts WHERE n = ? AND ngram = ?",
+        (len(words), " ".join(words))
+    )
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def top_n_ngrams(n: int, k: int) -> list:
+    """
+    Return the `k` most frequent `n`-grams as a list of (ngram, count); ties are ordered by ngram.
+    Reads the first `k` entries of idx_ngram_counts_count for this `n`.
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        "SELECT ngram, count FROM ngram_counts WHERE n = ? ORDER BY count DESC, ngram LIMIT ?",
+        (n, k)
+    )
+    results = cur.fetchall()
+    return results
+
+def iter_ngram_counts(n: int, min_count: int = 1, batch_size: int = 10_000):
+    """
+    Stream (ngram, count) pairs of `n`-grams with count >= `min_count`, in ngram order.
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT ngram, count FROM ngram_counts WHERE n = ? AND count >= ? ORDER BY ngram", (n, min_count))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def count_distinct_ngrams(n: int) -> int:
+    """Return the number of distinct `n`-grams stored."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM ngram_counts WHERE n = ?", (n,))
+    count, = cur.fetchone()
+    return count
+
+# --------------------- DELETE / RESET ---------------------
+def delete_ngram_counts(n: int = None) -> None:
+    """Remove the stored counts of `n`-grams, or of every n."""
+    with transaction() as conn:
+        if n is None:
+            conn.execute("DELETE FROM ngram_counts")
+        else:
+            conn.execute("DELETE FROM ngram_counts WHERE n = ?", (n,))
@@ -0,0 +1,105 @@
+from db.database import get_connection, transaction
+from utils import metrics
+
+# --------------------- INSERT / UPDATE ---------------------
+def add_documents(rows, file_ids=()) -> int:
+    """
+    Store (file_id, text) rows in the full-text index, replacing earlier text of the same files,
+    and flag those files and `file_ids` (e.g. files without text) as indexed, in one transaction.
+    Returns the number of documents written.
+    """
+    rows = list(rows)
+    flagged = [(row[0],) for row in rows]
+    flagged.extend((file_id,) for file_id in file_ids)
+    with metrics.stage("db.search.insert", items=len(rows)), transaction() as conn:
+        cur = conn.cursor()
+        # FTS5 has no UPSERT; replacing an existing rowid needs the old row deleted first
+        cur.executemany("DELETE FROM documents_fts WHERE rowid = ?", [(row[0],) for row in rows])
+        cur.executemany("INSERT INTO documents_fts (rowid, text) VALUES (?, ?)", rows)
+        cur.executemany("UPDATE files SET indexed = 1 WHERE id = ?", flagged)
+    return len(rows)
+
+def optimize_index() -> None:
+    """
+    Merge the index's segments into one. Worth running after a large bulk build; queries then
+    read a single b-tree per term.
+    """
+    with transaction() as conn:
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+# --------------------- SELECT ---------------------
+def quote_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query matching documents that contain every word, treating
+    operators and punctuation in `text` literally.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+def search(query: str, limit: int = 20, offset: int = 0, snippet_tokens: int = 16) -> list:
+    """
+    Return the best `limit` matches of an FTS5 query (words, "phrases", prefix*, AND/OR/NOT,
+    NEAR(...)), ranked by bm25, as (file_id, snippet, score); lower scores rank higher.
+    Snippets show up to `snippet_tokens` tokens around the hits, with hits wrapped in [ ].
+    Use `quote_query` for untrusted text.
+    """
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT rowid, snippet(documents_fts, 0, '[', ']', '...', ?), rank
+          FROM documents_fts
+         WHERE documents_fts MATCH ?
+         ORDER BY rank
+         LIMIT ? OFFSET ?
+        """,
+        (snippet_tokens, query, limit, offset)
+    )
+    rows = cur.fetchall()
+    return rows
+
+
+def search_ids(query: str, limit: int = None) -> list:
+    """
+    Return the IDs of files matching an FTS5 query, in file ID order. Skips ranking, so it is
+    the cheaper call when every match is wanted.
+    """
+    cur = get_connection().cursor()
+    sql = "SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rowid"
+    if limit is not None:
+        cur.execute(sql + " LIMIT ?", (query, limit))
+    else:
+        cur.execute(sql, (query,))
+    ids = [row[0] for row in cur.fetchall()]
+    return ids
+
+
+def count_matches(query: str) -> int:
+    """Return the number of files matching an FTS5 query."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM documents_fts WHERE documents_fts MATCH ?", (query,))
+    count, = cur.fetchone()
+    return count
+
+
+def get_document(file_id: int) -> str:
+    """Return the indexed text of a file, or None if it is not in the index."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT text FROM documents_fts WHERE rowid = ?", (file_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def count_indexed() -> int:
+    """Return the number of files flagged as indexed (including files without text)."""
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM files WHERE indexed = 1")
+    count, = cur.fetchone()
+    return count
+
+# --------------------- DELETE / RESET ---------------------
+def clear_index() -> None:
+    """Empty the full-text index and flag every file as not indexed."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM documents_fts")
+        cur.execute("UPDATE files SET indexed = 0 WHERE indexed = 1")
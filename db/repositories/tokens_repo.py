@@ -1,34 +1,35 @@
-import sqlite3
-from utils.path import DB_ABS_PATH
-
-# --------------------- CONNECTION ---------------------
-def _get_conn():
-    return sqlite3.connect(DB_ABS_PATH)
+from db.database import get_connection, transaction
 
 # --------------------- INSERT ---------------------
 def add_token(piece: str, token_id: int) -> None:
     """
     Insert a new token piece with its ID, or ignore if it exists.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR IGNORE INTO tokens(piece, id) VALUES(?, ?)",
-        (piece, token_id)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT OR IGNORE INTO tokens(piece, id) VALUES(?, ?)",
+            (piece, token_id)
+        )
+
+def add_tokens(pairs) -> int:
+    """
+    Insert many (piece, id) pairs in a single transaction, ignoring existing pieces.
+    Returns the number of pairs submitted.
+    """
+    pairs = list(pairs)
+    with transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO tokens(piece, id) VALUES(?, ?)", pairs)
+    return len(pairs)
 
 # --------------------- SELECT ---------------------
 def get_token_id(piece: str) -> int:
     """
     Return the ID for a given piece, or None if not found.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT id FROM tokens WHERE piece = ?", (piece,))
     row = cur.fetchone()
-    conn.close()
     return row[0] if row else None
 
 
@@ -36,11 +37,9 @@ def get_piece(token_id: int) -> str:
     """
     Return the piece for a given ID, or None if not found.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT piece FROM tokens WHERE id = ?", (token_id,))
     row = cur.fetchone()
-    conn.close()
     return row[0] if row else None
 
 
@@ -48,27 +47,29 @@ def all_tokens() -> list:
     """
     Return all tokens as a list of (piece, id).
     """
-    conn = _get_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT piece, id FROM tokens ORDER BY id")
     results = cur.fetchall()
-    conn.close()
     return results
 
+def token_stats() -> tuple:
+    """
+    Return (count, max_id) for the tokens table; a cheap signature for detecting changes.
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT COUNT(*), MAX(id) FROM tokens")
+    return cur.fetchone()
+
 # --------------------- DELETE / RESET ---------------------
 def delete_token(piece: str) -> None:
     """Remove a token piece from the table."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tokens WHERE piece = ?", (piece,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM tokens WHERE piece = ?", (piece,))
 
 
 def reset_tokens() -> None:
     """Delete all tokens."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tokens")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM tokens")
@@ -1,72 +1,106 @@
-import sqlite3
-from utils.path import DB_ABS_PATH
-
-# --------------------- CONNECTION ---------------------
-def _get_conn():
-    return sqlite3.connect(DB_ABS_PATH)
+from db.database import get_connection, transaction
+from utils import metrics
 
 # --------------------- INSERT / UPDATE ---------------------
 def increment_word(word: str, amount: int = 1) -> None:
     """
     Insert or increment the count for a given word by `amount`.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO word_counts(word, count)
+            VALUES(?, ?)
+            ON CONFLICT(word) DO UPDATE SET count = count + ?;
+            """,
+            (word, amount, amount)
+        )
+
+def add_counts(counts, batch_size: int = 50_000) -> int:
+    """
+    Bulk-upsert word counts: add each (word, amount) pair from `counts` (a mapping or an
+    iterable of pairs) to the stored totals. Rows are written with executemany in
+    transactions of `batch_size` rows. Returns the number of rows written.
+    """
+    if hasattr(counts, 'items'):
+        counts = counts.items()
+    sql = """
         INSERT INTO word_counts(word, count)
         VALUES(?, ?)
-        ON CONFLICT(word) DO UPDATE SET count = count + ?;
-        """,
-        (word, amount, amount)
-    )
-    conn.commit()
-    conn.close()
+        ON CONFLICT(word) DO UPDATE SET count = count + excluded.count;
+        """
+    total = 0
+    batch = []
+    for pair in counts:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            with metrics.stage("db.word_counts.upsert", items=len(batch)), transaction() as conn:
+                conn.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        with metrics.stage("db.word_counts.upsert", items=len(batch)), transaction() as conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+    return total
 
 # --------------------- SELECT ---------------------
 def get_count(word: str) -> int:
     """
     Return the count for a given word, or 0 if not present.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute(
         "SELECT count FROM word_counts WHERE word = ?",
         (word,)
     )
     row = cur.fetchone()
-    conn.close()
     return row[0] if row else 0
 
 
 def top_n_words(n: int) -> list:
     """
-    Return the top `n` words by frequency as a list of (word, count).
+    Return the top `n` words by frequency as a list of (word, count); ties are ordered by word.
+    Reads the first `n` entries of idx_word_counts_count, so the cost does not grow with the table.
     """
-    conn = _get_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute(
-        "SELECT word, count FROM word_counts ORDER BY count DESC LIMIT ?",
+        "SELECT word, count FROM word_counts ORDER BY count DESC, word LIMIT ?",
         (n,)
     )
     results = cur.fetchall()
-    conn.close()
     return results
 
+def iter_counts(min_count: int = 1, batch_size: int = 10_000):
+    """
+    Stream (word, count) pairs with count >= `min_count` without loading the table into memory.
+    """
+    cur = get_connection().cursor()
+    cur.execute("SELECT word, count FROM word_counts WHERE count >= ?", (min_count,))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
 # --------------------- DELETE / RESET ---------------------
 def reset_counts() -> None:
     """Reset all word counts to zero (keeps keys)."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE word_counts SET count = 0;")
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE word_counts SET count = 0;")
+
+
+def clear_counts() -> None:
+    """Remove every word count."""
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM word_counts;")
 
 
 def delete_word(word: str) -> None:
     """Remove a word from the table."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM word_counts WHERE word = ?", (word,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM word_counts WHERE word = ?", (word,))
@@ -1,20 +1,71 @@
-import sqlite3
-from utils.path import DB_ABS_PATH
+from db.database import get_database_path, transaction
 
 # --------------------- DDL STATEMENTS ---------------------
+# Member paths are stored as an interned directory prefix (member_dirs.path, ending in '/' or empty)
+# plus file_name; the archive path is stored once in `archives`
 FILES_TABLE_DDL = """
 CREATE TABLE IF NOT EXISTS files (
     id           INTEGER PRIMARY KEY AUTOINCREMENT,
-    archive_path TEXT    NOT NULL,
-    member_path  TEXT    NOT NULL,
+    archive_id   INTEGER NOT NULL REFERENCES archives (id),
+    dir_id       INTEGER NOT NULL REFERENCES member_dirs (id),
     file_name    TEXT    NOT NULL,
     extension    TEXT    NOT NULL,
     file_size    INTEGER NOT NULL,
     processed    BOOLEAN NOT NULL DEFAULT 0,
-    detected_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    member_offset INTEGER,
+    lease_owner  TEXT,
+    lease_expires REAL,
+    content_hash TEXT,
+    duplicate_of INTEGER REFERENCES files (id),
+    batch_id     INTEGER,
+    indexed      BOOLEAN NOT NULL DEFAULT 0,
+    detected_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (archive_id, dir_id, file_name)
 );
 """
 
+MEMBER_DIRS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS member_dirs (
+    id   INTEGER PRIMARY KEY,
+    path TEXT    NOT NULL UNIQUE
+);
+"""
+
+# Archives registered by add_file(s) before they were enumerated have kind '' and size -1
+ARCHIVES_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS archives (
+    id           INTEGER PRIMARY KEY,
+    path         TEXT    NOT NULL UNIQUE,
+    kind         TEXT    NOT NULL,
+    size         INTEGER NOT NULL,
+    mtime_ns     INTEGER NOT NULL,
+    fingerprint  TEXT    NOT NULL,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    scanned_at   TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Restart points in a compressed tar's uncompressed stream (gzip members, xz blocks)
+ARCHIVE_CHECKPOINTS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS archive_checkpoints (
+    archive_id          INTEGER NOT NULL,
+    uncompressed_offset INTEGER NOT NULL,
+    compressed_offset   INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, uncompressed_offset)
+) WITHOUT ROWID;
+"""
+
+# The catalog with full paths, for ad-hoc queries
+FILES_VIEW_DDL = """
+CREATE VIEW IF NOT EXISTS files_view AS
+SELECT f.id, a.path AS archive_path, d.path || f.file_name AS member_path, f.file_name, f.extension,
+       f.file_size, f.processed, f.member_offset, f.lease_owner, f.lease_expires, f.content_hash,
+       f.duplicate_of, f.detected_at
+  FROM files f
+  JOIN archives a ON a.id = f.archive_id
+  JOIN member_dirs d ON d.id = f.dir_id;
+"""
+
 WORD_COUNTS_TABLE_DDL = """
 CREATE TABLE IF NOT EXISTS word_counts (
     word  TEXT PRIMARY KEY,
@@ -22,6 +73,51 @@ CREATE TABLE IF NOT EXISTS word_counts (
 );
 """
 
+# N-gram counts (stats/ngram_counter.py); `ngram` is the n words joined by single spaces
+NGRAM_COUNTS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS ngram_counts (
+    n     INTEGER NOT NULL,
+    ngram TEXT    NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (n, ngram)
+) WITHOUT ROWID;
+"""
+
+# Per-stage totals of one instrumented run (see utils/metrics.py)
+RUN_METRICS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id      TEXT    NOT NULL,
+    stage       TEXT    NOT NULL,
+    calls       INTEGER NOT NULL,
+    items       INTEGER NOT NULL,
+    bytes       INTEGER NOT NULL,
+    errors      INTEGER NOT NULL,
+    seconds     REAL    NOT NULL,
+    max_seconds REAL    NOT NULL,
+    p50_seconds REAL    NOT NULL,
+    p95_seconds REAL    NOT NULL,
+    p99_seconds REAL    NOT NULL,
+    recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, stage)
+) WITHOUT ROWID;
+"""
+
+# Full-text index over cleaned texts, one row per file with rowid = files.id (see search/indexer.py)
+DOCUMENTS_FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Deleted (or re-registered) files leave the full-text index with their row
+FILES_DELETE_SEARCH_TRIGGER_DDL = """
+CREATE TRIGGER IF NOT EXISTS files_delete_search AFTER DELETE ON files
+BEGIN
+    DELETE FROM documents_fts WHERE rowid = old.id;
+END;
+"""
+
 TOKENS_TABLE_DDL = """
 CREATE TABLE IF NOT EXISTS tokens (
     piece TEXT PRIMARY KEY,
@@ -29,27 +125,207 @@ CREATE TABLE IF NOT EXISTS tokens (
 );
 """
 
+# Work-queue lookups (claims, count_unprocessed) only touch unprocessed rows
+FILES_UNPROCESSED_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_files_unprocessed
+    ON files (id) WHERE processed = 0;
+"""
+
+# Scheduled claims take the lowest pending batch_id (see file_reader/scheduler.py)
+FILES_BATCH_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_files_batch
+    ON files (batch_id, member_offset) WHERE processed = 0;
+"""
+
+# The indexing stage only touches files not yet in the full-text index
+FILES_UNINDEXED_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_files_unindexed
+    ON files (id) WHERE indexed = 0;
+"""
+
+# Canonical copies by content; duplicates are linked through duplicate_of
+FILES_CONTENT_HASH_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_files_content_hash
+    ON files (content_hash) WHERE duplicate_of IS NULL;
+"""
+
+# Re-linking duplicates when their canonical file is deleted
+FILES_DUPLICATE_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_files_duplicate_of
+    ON files (duplicate_of) WHERE duplicate_of IS NOT NULL;
+"""
+
+# Top-N queries walk this index instead of sorting word_counts; `word` makes it covering
+WORD_COUNTS_COUNT_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_word_counts_count
+    ON word_counts (count DESC, word);
+"""
+
+# Top-N n-gram queries walk this index instead of sorting ngram_counts
+NGRAM_COUNTS_COUNT_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_ngram_counts_count
+    ON ngram_counts (n, count DESC, ngram);
+"""
+
+# Columns added after the first release, as (table, column, declaration)
+ADDED_COLUMNS = [
+    ("files", "lease_owner", "TEXT"),
+    ("files", "lease_expires", "REAL"),
+    ("files", "member_offset", "INTEGER"),
+    ("files", "content_hash", "TEXT"),
+    ("files", "duplicate_of", "INTEGER REFERENCES files (id)"),
+    ("files", "batch_id", "INTEGER"),
+    ("files", "indexed", "BOOLEAN NOT NULL DEFAULT 0"),
+]
+
+# --------------------- MIGRATIONS ---------------------
+def add_missing_columns(cur) -> None:
+    """
+    Add columns from ADDED_COLUMNS that are missing in an existing database.
+    """
+    for table, column, decl in ADDED_COLUMNS:
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cur.fetchall()}
+        if column not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _columns(cur, table: str) -> set:
+    cur.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cur.fetchall()}
+
+
+def migrate_catalog(cur) -> None:
+    """
+    Convert a database with the flat `files` layout (archive_path and member_path on every row)
+    to the normalized catalog: archives get an integer id, member paths are split into an interned
+    directory prefix and a file name, and checkpoints refer to archives by id.
+
+    File IDs, processed flags, leases, offsets and content links are kept. Archives that only
+    appear in `files` get a placeholder `archives` row (size -1); the next registration run
+    re-enumerates them and, since a placeholder says nothing about earlier content, keeps the
+    state of members whose size is unchanged. Does nothing on a normalized database.
+    """
+    if "archive_path" not in _columns(cur, "files"):
+        return
+    add_missing_columns(cur)
+    # Databases created before the UNIQUE constraint existed may hold repeated members
+    cur.execute(
+        """
+        DELETE FROM files
+         WHERE id NOT IN (SELECT MIN(id) FROM files GROUP BY archive_path, member_path)
+        """
+    )
+    old_archives = "id" not in _columns(cur, "archives") and bool(_columns(cur, "archives"))
+    old_checkpoints = "archive_path" in _columns(cur, "archive_checkpoints")
+    cur.execute("ALTER TABLE files RENAME TO files_old")
+    if old_archives:
+        cur.execute("ALTER TABLE archives RENAME TO archives_old")
+    if old_checkpoints:
+        cur.execute("ALTER TABLE archive_checkpoints RENAME TO archive_checkpoints_old")
+    cur.execute(FILES_TABLE_DDL)
+    cur.execute(MEMBER_DIRS_TABLE_DDL)
+    cur.execute(ARCHIVES_TABLE_DDL)
+    cur.execute(ARCHIVE_CHECKPOINTS_TABLE_DDL)
+
+    if old_archives:
+        cur.execute(
+            """
+            INSERT INTO archives (path, kind, size, mtime_ns, fingerprint, member_count, scanned_at)
+            SELECT path, kind, size, mtime_ns, fingerprint, member_count, scanned_at
+              FROM archives_old
+            """
+        )
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO archives (path, kind, size, mtime_ns, fingerprint)
+        SELECT DISTINCT archive_path, '', -1, -1, '' FROM files_old
+        """
+    )
+    # rtrim(p, <every character of p except '/'>) keeps p up to and including its last '/'
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO member_dirs (path)
+        SELECT DISTINCT rtrim(member_path, replace(member_path, '/', '')) FROM files_old
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO files
+          (id, archive_id, dir_id, file_name, extension, file_size, processed, member_offset,
+           lease_owner, lease_expires, content_hash, duplicate_of, detected_at)
+        SELECT f.id, a.id, d.id, substr(f.member_path, length(d.path) + 1), f.extension, f.file_size,
+               f.processed, f.member_offset, f.lease_owner, f.lease_expires, f.content_hash,
+               f.duplicate_of, f.detected_at
+          FROM files_old f
+          JOIN archives a ON a.path = f.archive_path
+          JOIN member_dirs d ON d.path = rtrim(f.member_path, replace(f.member_path, '/', ''))
+        """
+    )
+    if old_checkpoints:
+        cur.execute(
+            """
+            INSERT INTO archive_checkpoints (archive_id, uncompressed_offset, compressed_offset)
+            SELECT a.id, c.uncompressed_offset, c.compressed_offset
+              FROM archive_checkpoints_old c
+              JOIN archives a ON a.path = c.archive_path
+            """
+        )
+    # Keep AUTOINCREMENT from reusing IDs of files deleted before the migration
+    cur.execute("DELETE FROM sqlite_sequence WHERE name = 'files'")
+    cur.execute("UPDATE sqlite_sequence SET name = 'files' WHERE name = 'files_old'")
+    cur.execute("DROP TABLE files_old")
+    cur.execute("DROP TABLE IF EXISTS archives_old")
+    cur.execute("DROP TABLE IF EXISTS archive_checkpoints_old")
+
+
 # --------------------- SCHEMA INITIALIZER ---------------------
 def init_all(drop_existing: bool = False) -> None:
     """
     Initialize all database tables. If drop_existing is True, drop tables first.
+    Databases with the flat `files` layout are migrated (see migrate_catalog).
     """
-    conn = sqlite3.connect(DB_ABS_PATH)
-    cur = conn.cursor()
+    with transaction() as conn:
+        cur = conn.cursor()
 
-    if drop_existing:
-        cur.execute("DROP TABLE IF EXISTS files;")
-        cur.execute("DROP TABLE IF EXISTS word_counts;")
-        cur.execute("DROP TABLE IF EXISTS tokens;")
+        if drop_existing:
+            cur.execute("DROP VIEW IF EXISTS files_view;")
+            cur.execute("DROP TABLE IF EXISTS files;")
+            cur.execute("DROP TABLE IF EXISTS member_dirs;")
+            cur.execute("DROP TABLE IF EXISTS archives;")
+            cur.execute("DROP TABLE IF EXISTS archive_checkpoints;")
+            cur.execute("DROP TABLE IF EXISTS word_counts;")
+            cur.execute("DROP TABLE IF EXISTS ngram_counts;")
+            cur.execute("DROP TABLE IF EXISTS tokens;")
+            cur.execute("DROP TABLE IF EXISTS run_metrics;")
+            cur.execute("DROP TABLE IF EXISTS documents_fts;")
 
-    # Create tables
-    cur.execute(FILES_TABLE_DDL)
-    cur.execute(WORD_COUNTS_TABLE_DDL)
-    cur.execute(TOKENS_TABLE_DDL)
+        migrate_catalog(cur)
+
+        # Create tables
+        cur.execute(FILES_TABLE_DDL)
+        cur.execute(MEMBER_DIRS_TABLE_DDL)
+        cur.execute(ARCHIVES_TABLE_DDL)
+        cur.execute(ARCHIVE_CHECKPOINTS_TABLE_DDL)
+        cur.execute(WORD_COUNTS_TABLE_DDL)
+        cur.execute(NGRAM_COUNTS_TABLE_DDL)
+        cur.execute(TOKENS_TABLE_DDL)
+        cur.execute(RUN_METRICS_TABLE_DDL)
+        cur.execute(DOCUMENTS_FTS_DDL)
+
+        add_missing_columns(cur)
 
-    conn.commit()
-    conn.close()
+        # Indexes and views
+        cur.execute(FILES_UNPROCESSED_INDEX_DDL)
+        cur.execute(FILES_BATCH_INDEX_DDL)
+        cur.execute(FILES_UNINDEXED_INDEX_DDL)
+        cur.execute(FILES_CONTENT_HASH_INDEX_DDL)
+        cur.execute(FILES_DUPLICATE_INDEX_DDL)
+        cur.execute(WORD_COUNTS_COUNT_INDEX_DDL)
+        cur.execute(NGRAM_COUNTS_COUNT_INDEX_DDL)
+        cur.execute(FILES_VIEW_DDL)
+        cur.execute(FILES_DELETE_SEARCH_TRIGGER_DDL)
 
 if __name__ == '__main__':
     init_all(drop_existing=True)
-    print(f"Initialized schema in {DB_ABS_PATH}")
+    print(f"Initialized schema in {get_database_path()}")
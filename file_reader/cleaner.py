@@ -1,5 +1,10 @@
 # file_reader/cleaner.py
+import os
 import re
+from multiprocessing import Pool
+
+from config.settings import CLEAN_WORKERS
+from utils import metrics
 
 class TextCleaner:
     """
@@ -9,40 +14,67 @@ class TextCleaner:
     - Removes empty or purely punctuation lines
     - Collapses multiple blank lines into a single blank line
     - (Optionally) applies other domain-specific filters
+
+    `clean` works on a whole buffer, `clean_iter` on a line stream, and `clean_many` on a
+    batch across processes; all three produce the same output.
     """
     # Regex to identify tar metadata lines (filename fields and ustar blocks)
     _tar_metadata_pattern = re.compile(r"^[0-9a-f\-/]+\.txt\s+\d+")
-    _ustar_marker = re.compile(r"ustar")
 
     def clean(self, text: str) -> str:
         """
         Return a cleaned version of `text`.
         """
-        cleaned_lines = []
-        blank_count = 0
-        for line in text.splitlines():
-            # Trim whitespace
+        with metrics.stage("cleaner.clean", items=1, nbytes=len(text)):
+            # Trim whitespace; splitlines and strip run in C over the whole buffer
+            lines = list(map(str.strip, text.splitlines()))
+            # Skip tar metadata and ustar marker lines; both need a marker somewhere in the text
+            if "ustar" in text or ".txt" in text:
+                match = self._tar_metadata_pattern.match
+                lines = [line for line in lines if not ("ustar" in line or (".txt" in line and match(line)))]
+            # Collapse multiple blank lines to one: keep a blank line only after a non-blank one
+            kept = [line for prev, line in zip([""] + lines, lines) if line or prev]
+            # Rejoin and ensure trailing newline
+            return "\n".join(kept).strip() + "\n"
+
+    def _is_noise(self, line: str) -> bool:
+        """Return True for a stripped line that is tar metadata or contains a ustar marker."""
+        return "ustar" in line or (".txt" in line and self._tar_metadata_pattern.match(line) is not None)
+
+    def clean_iter(self, lines):
+        """
+        Clean an iterable of lines (e.g. FileReader.iter_lines) and yield the cleaned lines.
+        `"\n".join(clean_iter(text.splitlines())) + "\n"` equals `clean(text)`.
+        """
+        started = False
+        pending_blank = False
+        for line in lines:
             line = line.strip()
-            # Skip tar metadata lines
-            if self._tar_metadata_pattern.match(line):
-                continue
-            # Skip ustar marker lines
-            if self._ustar_marker.search(line):
-                continue
-            # Skip empty lines
             if not line:
-                blank_count += 1
-                # Collapse multiple blank lines to one
-                if blank_count > 1:
-                    continue
-                cleaned_lines.append("")
+                # Leading blanks are dropped, a run of blanks becomes one
+                pending_blank = started
+                continue
+            if self._is_noise(line):
                 continue
-            blank_count = 0
-            # Append non-empty content line
-            cleaned_lines.append(line)
+            if pending_blank:
+                yield ""
+                pending_blank = False
+            started = True
+            yield line
 
-        # Rejoin and ensure trailing newline
-        return "\n".join(cleaned_lines).strip() + "\n"
+    def clean_many(self, texts, workers: int = CLEAN_WORKERS, chunksize: int = 16) -> list:
+        """
+        Clean a batch of texts, spreading them over `workers` processes.
+        Returns the cleaned texts in input order. `workers=1` cleans in this process.
+        """
+        texts = list(texts)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(texts) <= 1:
+            return [self.clean(text) for text in texts]
+        # Per-text timings stay in the pool workers; the parent records the batch
+        with metrics.stage("cleaner.clean_many", items=len(texts), nbytes=sum(map(len, texts))), \
+                Pool(processes=min(workers, len(texts))) as pool:
+            return pool.map(self.clean, texts, chunksize)
 
 if __name__ == '__main__':
     # Quick demonstration
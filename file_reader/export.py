@@ -0,0 +1,366 @@
+# file_reader/export.py
+import os
+import gzip
+import json
+import lzma
+from itertools import groupby
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from config.settings import (EXPORT_SHARD_BYTES, EXPORT_COMPRESSION, EXPORT_COMPRESS_LEVEL, EXPORT_WORKERS,
+                             TEXT_FIELD)
+from utils import metrics
+from utils.path import EXPORT_ABS_PATH
+from db.database import get_database_path, set_database_path
+from db.repositories.files_repo import iter_file_sizes, get_file_records
+from file_reader.reader import FileReader
+from file_reader.cleaner import TextCleaner
+from file_reader.json_stream import extract_fields
+from file_reader.scheduler import pack_members
+
+_META_NAME = "export.json"
+_PLAN_NAME = "plan.jsonl"
+_MANIFEST_NAME = "manifest.tsv"
+_PARTS_DIR = "parts"
+_MANIFEST_HEADER = "file_id\tshard\toffset\tlength\trecords\n"
+_SUFFIXES = {None: "", "gz": ".gz", "xz": ".xz"}
+_FORMATS = ("jsonl", "text")
+
+# Set in export workers (see _init_worker / _setup)
+_worker_metrics = False
+_directory = None
+_options = None
+_reader = None
+_cleaner = None
+
+
+def _read_meta(directory: str) -> dict:
+    meta_path = os.path.join(directory, _META_NAME)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_atomic(path: str, lines) -> None:
+    """Write `lines` to `path` through a temporary file, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _ShardSink:
+    """
+    Write one export unit's documents to size-bounded shards `<unit>-NNNN.<format>[.gz|.xz]`.
+
+    A shard is written under a `.tmp` name and renamed once complete; only then are its
+    documents appended to the unit's part manifest (file_id, shard, offset, length, records),
+    so the manifest never points into a missing or partial shard. Offsets and lengths are in
+    uncompressed bytes, and `shard_bytes` bounds the uncompressed size of a shard (a single
+    larger document gets a shard of its own).
+    """
+    def __init__(self, directory: str, unit: str, options: dict, number: int = 0):
+        self.directory = directory
+        self.unit = unit
+        self.fmt = options["format"]
+        self.compression = options["compression"]
+        self.level = options["compress_level"]
+        self.shard_bytes = options["shard_bytes"]
+        self.number = number
+        self.written = 0
+        self.shards = 0
+        self._raw = None
+        self._fp = None
+        self._size = 0
+        self._entries = []
+        self._manifest = open(os.path.join(directory, _PARTS_DIR, unit + ".tsv"), 'a', encoding='utf-8')
+
+    def _shard_name(self) -> str:
+        return f"{self.unit}-{self.number:04d}.{self.fmt}{_SUFFIXES[self.compression]}"
+
+    def _open(self) -> None:
+        self._raw = open(os.path.join(self.directory, self._shard_name() + ".tmp"), 'wb')
+        if self.compression == "gz":
+            self._fp = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=self.level, mtime=0)
+        elif self.compression == "xz":
+            self._fp = lzma.LZMAFile(self._raw, 'wb', preset=self.level)
+        else:
+            self._fp = self._raw
+        self._size = 0
+
+    def add(self, file_id: int, data: bytes, records: int) -> None:
+        """Append one document's encoded records."""
+        if self._fp is not None and self._size and self._size + len(data) > self.shard_bytes:
+            self.finish()
+        if self._fp is None:
+            self._open()
+        if data:
+            self._fp.write(data)
+        self._entries.append((file_id, self._size, len(data), records))
+        self._size += len(data)
+        self.written += len(data)
+
+    def finish(self) -> None:
+        """Complete the current shard: flush it to disk, rename it and record its documents."""
+        if self._fp is None:
+            return
+        if self._fp is not self._raw:
+            self._fp.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        name = self._shard_name()
+        os.replace(os.path.join(self.directory, name + ".tmp"), os.path.join(self.directory, name))
+        self._manifest.writelines(f"{file_id}\t{name}\t{offset}\t{length}\t{records}\n"
+                                  for file_id, offset, length, records in self._entries)
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+        self._entries.clear()
+        self._fp = self._raw = None
+        self.number += 1
+        self.shards += 1
+
+    def close(self) -> None:
+        """Complete the current shard and close the part manifest."""
+        self.finish()
+        self._manifest.close()
+
+    def abort(self) -> None:
+        """Drop the incomplete shard; completed shards and their manifest entries are kept."""
+        if self._fp is not None:
+            if self._fp is not self._raw:
+                self._fp.close()
+            self._raw.close()
+            os.remove(os.path.join(self.directory, self._shard_name() + ".tmp"))
+            self._fp = self._raw = None
+        self._manifest.close()
+
+
+def _read_part(directory: str, unit: str) -> tuple:
+    """
+    Return the file IDs already exported by `unit` and the number of its next shard.
+    A torn last line left by a crash is cut off; the documents of that shard are exported again.
+    """
+    done = set()
+    number = 0
+    path = os.path.join(directory, _PARTS_DIR, unit + ".tsv")
+    if not os.path.exists(path):
+        return done, number
+    valid = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            file_id, shard = line.split(b"\t", 2)[:2]
+            done.add(int(file_id))
+            number = max(number, int(shard[len(unit) + 1:len(unit) + 5]) + 1)
+            valid += len(line)
+    if valid < os.path.getsize(path):
+        os.truncate(path, valid)
+    return done, number
+
+
+def _encode(file_id: int, texts: list, fmt: str) -> bytes:
+    """Encode one document: a JSON line per text, or texts separated by blank lines."""
+    if fmt == "jsonl":
+        dumps = json.dumps
+        return "".join(dumps({"id": file_id, "text": text}, ensure_ascii=False) + "\n"
+                       for text in texts).encode('utf-8')
+    if not texts:
+        return b""
+    return ("".join(text if text.endswith("\n") else text + "\n" for text in texts) + "\n").encode('utf-8')
+
+
+def _setup(directory: str, options: dict) -> None:
+    """Prepare this process to run `_export_unit` tasks."""
+    global _directory, _options, _reader, _cleaner
+    _directory = directory
+    _options = options
+    _reader = FileReader(encoding=options["encoding"], errors=options["errors"], dedupe=False)
+    _cleaner = TextCleaner() if options["clean"] else None
+
+
+def _init_worker(db_path: str, metrics_state: tuple, directory: str, options: dict) -> None:
+    """Pool initializer: spawned workers inherit neither the database path nor metrics settings."""
+    global _worker_metrics
+    set_database_path(db_path)
+    metrics.configure(metrics_state)
+    _worker_metrics = True
+    _setup(directory, options)
+
+
+def _export_unit(task: tuple) -> tuple:
+    """
+    Pool task: export one unit (unit name, file IDs) into its own shards, skipping files its part
+    manifest already lists. Returns (unit, files, records, bytes, shards, error, worker_metrics).
+    """
+    unit, file_ids = task
+    options = _options
+    field_path = tuple(options["field"].split('.')) if options["extract"] else None
+    files = records = 0
+    sink = None
+    with metrics.stage("export.unit") as span:
+        try:
+            done, number = _read_part(_directory, unit)
+            pending = [r for r in get_file_records(file_ids) if r[0] not in done]
+            sink = _ShardSink(_directory, unit, options, number)
+            for file_id, data in _reader.stream_records(pending):
+                text = _reader.decode(data)
+                texts = extract_fields(text, field_path) if field_path else [text]
+                if _cleaner is not None:
+                    texts = [_cleaner.clean(t) for t in texts]
+                sink.add(file_id, _encode(file_id, texts, options["format"]), len(texts))
+                files += 1
+                records += len(texts)
+            sink.close()
+            # Marks the unit complete for resumed runs
+            open(os.path.join(_directory, _PARTS_DIR, unit + ".done"), 'w').close()
+            error = None
+        except Exception as e:
+            if sink is not None:
+                sink.abort()
+            error = e
+        span.add(items=files, nbytes=sink.written if sink is not None else 0)
+    return (unit, files, records, sink.written if sink is not None else 0, sink.shards if sink is not None else 0,
+            error, metrics.drain() if _worker_metrics else None)
+
+
+def _write_plan(path: str, options: dict) -> None:
+    """Split the selected files into units of consecutive members of one archive, about a shard each."""
+    def lines():
+        rows = iter_file_sizes(processed=options["processed"], archive_pattern=options["archives"],
+                               unique=options["unique"])
+        for archive_id, group in groupby(rows, key=lambda row: row[1]):
+            members = ((file_id, size) for file_id, _, size in group)
+            batches = pack_members(members, options["shard_bytes"], max_files=1 << 62,
+                                   stream_bytes=options["shard_bytes"])
+            for part, (_, ids) in enumerate(batches):
+                yield json.dumps({"unit": f"{archive_id:06d}-{part:05d}", "ids": ids}) + "\n"
+    _write_atomic(path, lines())
+
+
+def _iter_plan(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            unit = json.loads(line)
+            yield unit["unit"], unit["ids"]
+
+
+def export_corpus(directory: str = EXPORT_ABS_PATH, fmt: str = "jsonl", compression: str = EXPORT_COMPRESSION,
+                  compress_level: int = EXPORT_COMPRESS_LEVEL, shard_bytes: int = EXPORT_SHARD_BYTES,
+                  clean: bool = True, extract: bool = True, field_path: str = TEXT_FIELD,
+                  processed: bool = True, archives: str = None, unique: bool = True,
+                  workers: int = EXPORT_WORKERS, encoding: str = 'utf-8', errors: str = 'ignore') -> dict:
+    """
+    Export the corpus into size-bounded JSONL or plain-text shards in `directory`.
+
+    Selection: `processed` (True, False or None for all files), `archives` (SQLite GLOB on the
+    archive path) and `unique` (skip duplicates of another file's content). With `extract`,
+    each file contributes its records' `field_path` texts, otherwise its whole decoded text;
+    `clean` passes every text through TextCleaner. JSONL shards hold {"id": file_id, "text": ...}
+    lines; text shards hold the texts followed by a blank line per file.
+
+    The selected files are first planned into units of consecutive members of one archive, about
+    `shard_bytes` of input each (saved in plan.jsonl). Units run in `workers` processes, each
+    reading its archive in one forward pass and writing its own shards, so nothing is funnelled
+    through the parent. Each unit records its completed shards in parts/<unit>.tsv; once every
+    unit is done, manifest.tsv lists (file_id, shard, offset, length, records) for every file,
+    with offsets and lengths in uncompressed bytes.
+
+    An interrupted export resumes from the saved plan: finished units are skipped and partly
+    written units continue after their last completed shard. Resuming with different options
+    raises ValueError; use a new directory instead.
+    Returns the number of units, units skipped as already done, files, records, bytes, shards
+    and failed units.
+    """
+    if fmt not in _FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(_FORMATS)}")
+    if compression not in _SUFFIXES:
+        raise ValueError(f"Unknown compression {compression!r}; expected 'gz', 'xz' or None")
+    options = {"format": fmt, "compression": compression, "compress_level": compress_level,
+               "shard_bytes": shard_bytes, "clean": clean, "extract": extract, "field": field_path,
+               "processed": processed, "archives": archives, "unique": unique,
+               "encoding": encoding, "errors": errors}
+    os.makedirs(os.path.join(directory, _PARTS_DIR), exist_ok=True)
+    meta = _read_meta(directory)
+    if meta and meta.get("options") != options:
+        raise ValueError(f"{directory} holds an export with different options: {meta.get('options')}")
+    plan_path = os.path.join(directory, _PLAN_NAME)
+    if not os.path.exists(plan_path):
+        _write_atomic(os.path.join(directory, _META_NAME), [json.dumps({"options": options}, indent=2)])
+        _write_plan(plan_path, options)
+
+    summary = {"units": 0, "skipped": 0, "files": 0, "records": 0, "bytes": 0, "shards": 0, "failed": 0}
+    units = []
+    tasks = []
+    for unit, file_ids in _iter_plan(plan_path):
+        units.append(unit)
+        if os.path.exists(os.path.join(directory, _PARTS_DIR, unit + ".done")):
+            summary["skipped"] += 1
+        else:
+            tasks.append((unit, file_ids))
+    summary["units"] = len(units)
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks)) or 1
+    if workers == 1:
+        _setup(directory, options)
+        results = map(_export_unit, tasks)
+        pool = None
+    else:
+        pool = Pool(processes=workers, initializer=_init_worker,
+                    initargs=(get_database_path(), metrics.worker_state(), directory, options))
+        results = pool.imap_unordered(_export_unit, tasks)
+
+    try:
+        for unit, files, records, nbytes, shards, error, worker_metrics in tqdm(results, total=len(tasks),
+                                                                                desc="Exporting"):
+            metrics.merge(worker_metrics)
+            summary["files"] += files
+            summary["records"] += records
+            summary["bytes"] += nbytes
+            summary["shards"] += shards
+            if error is not None:
+                # Not marked done, so the next run retries it
+                print(f"Error exporting unit {unit}: {error}")
+                summary["failed"] += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif _reader is not None:
+            _reader.close()
+
+    if not summary["failed"]:
+        _write_manifest(directory, units)
+    return summary
+
+
+def _write_manifest(directory: str, units: list) -> None:
+    """Concatenate the part manifests, in plan order, into manifest.tsv."""
+    def lines():
+        yield _MANIFEST_HEADER
+        for unit in units:
+            path = os.path.join(directory, _PARTS_DIR, unit + ".tsv")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    yield from f
+    _write_atomic(os.path.join(directory, _MANIFEST_NAME), lines())
+
+
+def iter_manifest(directory: str = EXPORT_ABS_PATH):
+    """Yield (file_id, shard, offset, length, records) for every exported file."""
+    with open(os.path.join(directory, _MANIFEST_NAME), encoding='utf-8') as f:
+        next(f, None)
+        for line in f:
+            file_id, shard, offset, length, records = line.rstrip("\n").split("\t")
+            yield int(file_id), shard, int(offset), int(length), int(records)
+
+
+if __name__ == '__main__':
+    result = export_corpus()
+    print(f"Exported {result['files']} files ({result['records']} records, {result['bytes'] / 1e6:,.1f} MB) "
+          f"into {result['shards']} shards in {EXPORT_ABS_PATH}")
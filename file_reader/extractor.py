@@ -1,39 +1,108 @@
 import json
-from data_service.reader import FileReader
+from config.settings import TEXT_FIELD, DEDUPE_CONTENT, STREAM_MEMBER_BYTES
+from file_reader.reader import FileReader
+from file_reader.json_stream import iter_json_records, get_field
+from utils import metrics
+
+# Distinguishes a missing field from an explicit null
+_MISSING = object()
 
 class TextExtractor:
     """
     Uses FileReader to load JSON records and extract the 'text' field from each.
+
+    `field_path` selects another field; dots walk into nested objects (e.g. "meta.text").
+    With `stream=True`, members are parsed incrementally (top-level arrays and JSON Lines),
+    so memory is bounded by the largest record instead of the whole member.
+    Members larger than `stream_bytes` always take the streaming path, so one huge member never
+    has to fit in memory.
+    With `dedupe=True`, a member whose bytes match an already-read member yields no texts; streamed
+    members are not hashed, since that would need a second pass.
     """
-    def __init__(self, encoding: str = 'utf-8', errors: str = 'ignore'):
-        self.reader = FileReader(encoding=encoding, errors=errors)
+    def __init__(self, encoding: str = 'utf-8', errors: str = 'ignore', reader: FileReader = None,
+                 field_path: str = TEXT_FIELD, stream: bool = False, dedupe: bool = DEDUPE_CONTENT,
+                 stream_bytes: int = STREAM_MEMBER_BYTES):
+        self.reader = reader or FileReader(encoding=encoding, errors=errors, dedupe=dedupe)
+        self.field_path = tuple(field_path.split('.'))
+        self.stream = stream
+        self.stream_bytes = stream_bytes
 
-    def extract_next(self):
+    def extract_next(self, mark: bool = True):
         """
         Reads the next unprocessed JSON file, extracts its 'text' entries,
         and returns a tuple (file_id, texts_list). Returns None when done.
+        With `mark=False` the file is not marked processed (see file_reader.pipeline).
         """
         record = self.reader.get_next_file()
         if record is None:
             return None
+        return self.extract_record(record, mark=mark)
 
+    def extract_record(self, record, mark: bool = True):
+        """
+        Read one file record and return (file_id, texts_list).
+        The list is empty for a duplicate of another file's content.
+        """
         file_id, archive_path, member_path, *rest = record
-        raw_text = self.reader.read_text(record)
+        with metrics.stage("extractor.extract") as span:
+            file_size = record[4] if len(record) > 4 else None
+            if self.stream or (file_size or 0) > self.stream_bytes:
+                texts = list(self.iter_texts(record, mark=mark))
+            else:
+                raw_text = self.reader.read_text(record, mark=mark)
+                texts = [] if raw_text is None else self.extract_texts(raw_text)
+            span.add(items=len(texts))
+        return file_id, texts
 
+    def extract_texts(self, raw_text: str) -> list:
+        """
+        Parse a JSON document and return the 'text' entries of its record(s): the elements of a
+        top-level array, else each top-level value, so JSON Lines and concatenated values work as
+        in the streaming path. Invalid JSON keeps the texts of the records before the error.
+        """
+        entries = []
         try:
-            data = json.loads(raw_text)
+            with metrics.stage("extractor.parse_json", items=1, nbytes=len(raw_text)):
+                try:
+                    data = json.loads(raw_text)
+                except json.JSONDecodeError:
+                    data = _MISSING
+                if data is not _MISSING:
+                    entries = data if isinstance(data, list) else [data]
+                else:
+                    # JSON Lines or concatenated values parse record by record, as in the streaming path
+                    for entry in iter_json_records((raw_text,)):
+                        entries.append(entry)
         except json.JSONDecodeError:
-            # Skip invalid JSON
-            return (file_id, [])
+            # Invalid JSON (counted as a parse error) keeps the records before the error
+            pass
 
         texts = []
-        if isinstance(data, list):
-            for entry in data:
-                if isinstance(entry, dict) and 'text' in entry:
-                    texts.append(entry['text'])
-        elif isinstance(data, dict) and 'text' in data:
-            texts.append(data['text'])
-        return file_id, texts
+        for entry in entries:
+            text = get_field(entry, self.field_path, _MISSING)
+            if text is not _MISSING:
+                texts.append(text)
+        return texts
+
+    def iter_texts(self, record, mark: bool = True):
+        """
+        Stream the 'text' entries of one file record as a generator, parsing it incrementally.
+        The file is marked processed once the generator is exhausted (unless `mark=False`).
+        Invalid JSON ends the stream after the entries that preceded the error.
+        """
+        chunks = self.reader.iter_chunks(record, mark=False)
+        try:
+            for entry in iter_json_records(chunks):
+                text = get_field(entry, self.field_path, _MISSING)
+                if text is not _MISSING:
+                    yield text
+        except json.JSONDecodeError:
+            # Skip the invalid remainder
+            pass
+        finally:
+            chunks.close()
+        if mark:
+            self.reader.mark_processed(record[0])
 
     def close(self):
         """Clean up underlying reader resources."""
@@ -0,0 +1,131 @@
+# file_reader/handle_cache.py
+import tarfile
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config.settings import ARCHIVE_CACHE_HANDLES, ARCHIVE_CACHE_BYTES
+
+# Approximate memory of one TarInfo / ZipInfo held in an open archive's member list
+_MEMBER_INFO_BYTES = 512
+
+
+def handle_size(handle) -> int:
+    """
+    Rough number of bytes an open handle keeps in memory: the member list of a TarFile or
+    ZipFile, or `memory_size()` for objects that report it (e.g. SeekableArchive).
+    """
+    if isinstance(handle, tarfile.TarFile):
+        return len(handle.members) * _MEMBER_INFO_BYTES
+    if isinstance(handle, zipfile.ZipFile):
+        return len(handle.filelist) * _MEMBER_INFO_BYTES
+    memory_size = getattr(handle, 'memory_size', None)
+    return memory_size() if memory_size is not None else 0
+
+
+class HandleCache:
+    """
+    LRU cache of open archive handles, bounded by count and estimated memory.
+
+    `get(key, opener)` returns the cached handle or opens one with `opener()`. Once more than
+    `max_handles` handles are open, or their `handle_size` estimates add up to more than
+    `max_bytes`, the least recently used unpinned handles are closed. Pinned handles (see `pin`)
+    are never evicted, so the cache may exceed its limits while everything in it is pinned.
+    Sizes are re-estimated whenever the limits are checked, since a TarFile's member list grows
+    as it is read.
+
+    `stats()` reports hits, misses and evictions for sizing the limits.
+    """
+    def __init__(self, max_handles: int = ARCHIVE_CACHE_HANDLES, max_bytes: int = ARCHIVE_CACHE_BYTES):
+        if max_handles < 1:
+            raise ValueError("max_handles must be at least 1")
+        self.max_handles = max_handles
+        self.max_bytes = max_bytes
+        self._handles = OrderedDict()
+        self._pins = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, opener):
+        """Return the handle cached under `key`, opening it with `opener()` on a miss."""
+        handle = self._handles.get(key)
+        if handle is not None:
+            self.hits += 1
+            self._handles.move_to_end(key)
+            return handle
+        self.misses += 1
+        handle = self._handles[key] = opener()
+        self._evict(keep=key)
+        return handle
+
+    def peek(self, key):
+        """Return the handle cached under `key` or None, without touching LRU order or stats."""
+        return self._handles.get(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._handles
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    # --------------------- PINNING ---------------------
+    def pin(self, key) -> None:
+        """Protect `key` from eviction until a matching `unpin`; pins nest."""
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key) -> None:
+        """Release one `pin` of `key`, then evict down to the limits if needed."""
+        count = self._pins.get(key, 0) - 1
+        if count > 0:
+            self._pins[key] = count
+            return
+        self._pins.pop(key, None)
+        self._evict()
+
+    @contextmanager
+    def pinned(self, key):
+        """Keep `key` pinned for the duration of a `with` block."""
+        self.pin(key)
+        try:
+            yield
+        finally:
+            self.unpin(key)
+
+    # --------------------- EVICTION ---------------------
+    def memory_size(self) -> int:
+        """Current estimated memory of all open handles."""
+        return sum(handle_size(handle) for handle in self._handles.values())
+
+    def _evict(self, keep=None) -> None:
+        """Close least recently used unpinned handles (other than `keep`) until within the limits."""
+        size = self.memory_size() if self.max_bytes else 0
+        for key in list(self._handles):
+            if len(self._handles) <= self.max_handles and not (self.max_bytes and size > self.max_bytes):
+                break
+            if key == keep or key in self._pins:
+                continue
+            handle = self._handles.pop(key)
+            if self.max_bytes:
+                size -= handle_size(handle)
+            handle.close()
+            self.evictions += 1
+
+    def discard(self, key) -> None:
+        """Close and forget the handle cached under `key`, if any, along with its pins."""
+        self._pins.pop(key, None)
+        handle = self._handles.pop(key, None)
+        if handle is not None:
+            handle.close()
+
+    def clear(self) -> None:
+        """Close every handle, pinned or not."""
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+        self._pins.clear()
+
+    def stats(self) -> dict:
+        """Return hits, misses, evictions, open handles and their estimated memory in bytes."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "open": len(self._handles), "bytes": self.memory_size()}
@@ -0,0 +1,145 @@
+# file_reader/json_stream.py
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+# Characters that could still extend a number cut off at the end of the buffer
+_number_tail = re.compile(r"[0-9.eE+\-]*")
+# Compact the buffer once this many characters have been consumed
+_COMPACT_AT = 1 << 16
+
+
+class _Buffer:
+    """
+    Text buffer over an iterator of chunks. `need_more()` reads until the unparsed part
+    has at least doubled, so retrying a large record costs O(record size) overall.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def need_more(self) -> bool:
+        """Read more input; return False once the chunks are exhausted."""
+        if self.eof:
+            return False
+        if self.pos >= _COMPACT_AT:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        target = max(2 * (len(self.text) - self.pos), 1)
+        parts = [self.text]
+        added = 0
+        for chunk in self._chunks:
+            parts.append(chunk)
+            added += len(chunk)
+            if added >= target:
+                break
+        else:
+            self.eof = True
+        self.text = "".join(parts)
+        return added > 0 or not self.eof
+
+    def skip_ws(self) -> bool:
+        """Skip whitespace; return False if the input ends first."""
+        while True:
+            self.pos = _whitespace.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return True
+            if not self.need_more():
+                return False
+
+    def peek(self) -> str:
+        return self.text[self.pos]
+
+    def _may_continue(self, value, end: int) -> bool:
+        """Return True if more input could change the value decoded up to `end`."""
+        if end >= len(self.text):
+            return True
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return _number_tail.match(self.text, end).end() == len(self.text)
+        return False
+
+    def decode_value(self):
+        """
+        Decode one JSON value at the current position, reading more input as needed.
+        A number that may continue past the end of the buffer is only accepted at EOF.
+        """
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                if self.eof or not self._may_continue(value, end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.need_more():
+                value, self.pos = _decoder.raw_decode(self.text, self.pos)
+                return value
+
+
+def iter_json_records(chunks):
+    """
+    Incrementally parse JSON text given as an iterable of string chunks and yield its records.
+
+    - A top-level array yields each of its elements.
+    - Anything else (a single object, JSON Lines, concatenated values) yields each top-level value.
+
+    Only the record being decoded is held in memory, so peak memory is bounded by the
+    largest single record rather than the whole document. Raises json.JSONDecodeError on
+    malformed input after yielding the records that preceded it.
+    """
+    buf = _Buffer(chunks)
+    if not buf.skip_ws():
+        return
+
+    if buf.peek() != "[":
+        while buf.skip_ws():
+            yield buf.decode_value()
+        return
+
+    buf.pos += 1
+    first = True
+    while True:
+        if not buf.skip_ws():
+            raise json.JSONDecodeError("Unterminated array", buf.text, buf.pos)
+        if buf.peek() == "]":
+            return
+        if not first:
+            if buf.peek() != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buf.text, buf.pos)
+            buf.pos += 1
+            if not buf.skip_ws():
+                raise json.JSONDecodeError("Unterminated array", buf.text, buf.pos)
+        yield buf.decode_value()
+        first = False
+
+
+def get_field(record, field_path: tuple, default=None):
+    """
+    Follow `field_path` (a tuple of keys) through nested dicts.
+    Returns `default` if any step is missing or not a dict.
+    """
+    for key in field_path:
+        if not isinstance(record, dict) or key not in record:
+            return default
+        record = record[key]
+    return record
+
+
+def extract_fields(text: str, field_path: tuple) -> list:
+    """
+    Return the string values at `field_path` of every record in a decoded JSON document (array,
+    single object or JSON Lines). Invalid JSON ends the list after the records that preceded it.
+    """
+    values = []
+    try:
+        for record in iter_json_records((text,)):
+            value = get_field(record, field_path)
+            if isinstance(value, str):
+                values.append(value)
+    except json.JSONDecodeError:
+        pass
+    return values
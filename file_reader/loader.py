@@ -1,74 +1,428 @@
+import io
 import os
+import sys
+import queue
+import hashlib
 import zipfile
 import tarfile
+import multiprocessing as mp
+from itertools import islice
 from tqdm import tqdm
 
+from utils import metrics
 from utils.path import TEXTS_ABS_PATH
-from config.settings import  ARCHIVE_EXTENSION
-from db.repositories.files_repo import add_file
+from config.settings import  ARCHIVE_EXTENSION, REGISTER_WORKERS, REGISTER_BATCH_SIZE, ARCHIVE_FINGERPRINT_BYTES
+from db.database import transaction
+from db.repositories.files_repo import (
+    add_files, get_archive_members, update_member_offsets, delete_files, reset_files,
+)
+from db.repositories.archives_repo import get_archive_states, upsert_archive, delete_archive, set_checkpoints
+from file_reader.seek_index import SeekableArchive, MemberReader, detect_codec, xz_block_checkpoints
 
 
+def has_archive_extension(fname: str) -> bool:
+    """
+    Return True if `fname` ends with one of the supported archive extensions.
+    Multi-part extensions such as .tar.gz are matched as a whole.
+    """
+    lower = fname.lower()
+    return any(lower.endswith(ext) for ext in ARCHIVE_EXTENSION)
 
-def discover_archives(base_dir: str = TEXTS_ABS_PATH) -> list:
+
+def probe_archive(fpath: str):
     """
-    Walk `base_dir` and return a list of supported archive file paths.
+    Detect the archive type of `fpath` with a single probe.
+    Returns 'zip', 'tar', or None if the file is not a readable archive.
+    """
+    if zipfile.is_zipfile(fpath):
+        return 'zip'
+    if tarfile.is_tarfile(fpath):
+        return 'tar'
+    return None
+
+
+def discover_archive_types(base_dir: str = TEXTS_ABS_PATH) -> list:
+    """
+    Walk `base_dir` and return a list of (archive_path, kind) pairs,
+    where kind is 'zip' or 'tar'. Each candidate is probed once.
     """
     archives = []
     for root, _, files in os.walk(base_dir):
         for fname in files:
+            if not has_archive_extension(fname):
+                continue
             fpath = os.path.join(root, fname)
-            ext = os.path.splitext(fname)[1].lower()
-            if ext in ARCHIVE_EXTENSION and (zipfile.is_zipfile(fpath) or tarfile.is_tarfile(fpath)):
-                archives.append(fpath)
+            kind = probe_archive(fpath)
+            if kind is not None:
+                archives.append((fpath, kind))
     return archives
 
 
-def load_and_register_archives(base_dir: str = TEXTS_ABS_PATH) -> None:
+def scan_archive_files(base_dir: str = TEXTS_ABS_PATH) -> list:
     """
-    Discover archives in `base_dir`, extract member metadata, and register each text file in the database.
+    Walk `base_dir` and return (path, size, mtime_ns) for every file with an archive extension.
+    Only stats the files; nothing is opened.
+    """
+    found = []
+    for root, _, files in os.walk(base_dir):
+        for fname in files:
+            if not has_archive_extension(fname):
+                continue
+            fpath = os.path.join(root, fname)
+            st = os.stat(fpath)
+            found.append((fpath, st.st_size, st.st_mtime_ns))
+    return found
+
+
+def archive_fingerprint(fpath: str, size: int, sample: int = ARCHIVE_FINGERPRINT_BYTES) -> str:
+    """
+    Cheap change detector: hash of the size and the first and last `sample` bytes of a file.
+    Compressed archives end in a checksum or index, so rewrites almost always change the tail.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(fpath, 'rb') as f:
+        digest.update(f.read(sample))
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            digest.update(f.read(sample))
+    return digest.hexdigest()
+
+
+def discover_archives(base_dir: str = TEXTS_ABS_PATH) -> list:
+    """
+    Walk `base_dir` and return a list of supported archive file paths.
+    """
+    return [path for path, _ in discover_archive_types(base_dir)]
+
+
+def iter_members(archive_path: str, kind: str, checkpoints: list = None):
+    """
+    Yield the rows of `enumerate_members` one member at a time, so even a huge tar is enumerated
+    in O(1) memory. If a `checkpoints` list is given, the archive's seek checkpoints (see
+    `enumerate_archive`) are appended to it; gzip member starts are complete only once the
+    generator is exhausted.
+    """
+    if kind == 'zip':
+        with zipfile.ZipFile(archive_path) as arch:
+            for m in arch.infolist():
+                if not m.is_dir():
+                    yield _member_row(archive_path, m.filename, m.file_size, m.header_offset)
+        return
+    codec = detect_codec(archive_path) if checkpoints is not None else None
+    if codec != 'gzip':
+        if codec == 'xz':
+            checkpoints.extend(xz_block_checkpoints(archive_path))
+        with tarfile.open(archive_path, 'r|*') as arch:
+            yield from _tar_rows(archive_path, arch)
+        return
+    archive = SeekableArchive(archive_path, snapshot_span=0)
+    try:
+        stream = io.BufferedReader(MemberReader(archive, 0, sys.maxsize))
+        with tarfile.open(fileobj=stream, mode='r|') as arch:
+            yield from _tar_rows(archive_path, arch)
+        checkpoints.extend(archive.checkpoints())
+    finally:
+        archive.close()
+
+
+def enumerate_members(archive_path: str, kind: str) -> list:
+    """
+    List the regular file members of one archive.
+    Returns rows of (archive_path, member_path, file_name, extension, file_size, member_offset),
+    ready for files_repo.add_files. Tar archives are read in a single forward pass.
+
+    `member_offset` is where the member's data starts in the uncompressed tar stream,
+    or the local header offset for zip members.
+    """
+    return list(iter_members(archive_path, kind))
+
+
+def enumerate_archive(archive_path: str, kind: str) -> tuple:
+    """
+    Like enumerate_members, but also return the archive's seek checkpoints (see file_reader.seek_index):
+    xz block boundaries come from the index at the end of the file, gzip member starts are
+    recorded while the same single pass reads the tar headers. Returns (rows, checkpoints).
+    """
+    checkpoints = []
+    rows = list(iter_members(archive_path, kind, checkpoints))
+    return rows, checkpoints
+
+
+def _tar_rows(archive_path: str, arch):
+    """Yield rows for the regular file members of a tar opened in stream mode."""
+    for member in arch:
+        # A streamed TarFile still appends every header to `members`; nothing reads them back
+        arch.members.clear()
+        if member.isfile():
+            yield _member_row(archive_path, member.name, member.size, member.offset_data)
+
+
+def _member_row(archive_path: str, name: str, file_size: int, member_offset: int) -> tuple:
+    """Build one files-table row for an archive member."""
+    # You may filter to .json or text files here if desired
+    file_name = os.path.basename(name)
+    # Determine extension of the member
+    _, ext = os.path.splitext(file_name)
+    extension = ext.lstrip('.').lower()
+    return archive_path, name, file_name, extension, file_size, member_offset
+
+
+def _enumerate_chunks(task: tuple, batch_size: int, worker: bool = False):
+    """
+    Enumerate one archive; `task` starts with (archive_path, kind[, size]). Yields messages
+    (task, rows, done, checkpoints, error, worker_metrics) with at most `batch_size` rows each;
+    the last one has `done` set and carries the checkpoints and any error, so failures are
+    reported by the parent. `worker_metrics` is a metrics snapshot when run in a `worker`
+    process, else None.
     """
-    archives = discover_archives(base_dir)
+    archive_path, kind = task[:2]
+    checkpoints = []
+    members = iter_members(archive_path, kind, checkpoints)
+    nbytes = task[2] if len(task) > 2 else 0
+    while True:
+        try:
+            with metrics.stage("loader.enumerate", nbytes=nbytes) as span:
+                rows = list(islice(members, batch_size))
+                span.add(items=len(rows))
+            error = None
+        except Exception as e:
+            rows, error = [], f"{type(e).__name__}: {e}"
+        nbytes = 0
+        if error is None and len(rows) == batch_size:
+            yield task, rows, False, None, None, None
+            continue
+        yield task, rows, True, checkpoints, error, metrics.drain() if worker else None
+        return
+
 
-    for archive_path in tqdm(archives, desc="Registering archives"):
+def _worker(tasks, results, batch_size: int, metrics_state: tuple) -> None:
+    """
+    Worker process: enumerate archives taken from `tasks` until it reads None, putting their
+    rows on the bounded `results` queue a chunk at a time (see _enumerate_chunks).
+    """
+    metrics.configure(metrics_state)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        for message in _enumerate_chunks(task, batch_size, worker=True):
+            results.put(message)
+
+
+def _receive(results, procs: list, archives: int):
+    """Yield messages from `results` until `archives` archives are done."""
+    while archives:
         try:
-            if zipfile.is_zipfile(archive_path):
-                with zipfile.ZipFile(archive_path) as arch:
-                    members = arch.infolist()
-                    get_name = lambda m: m.filename
-                    get_size = lambda m: m.file_size
+            message = results.get(timeout=1.0)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in procs):
+                raise RuntimeError("A registration worker exited without reporting")
+            continue
+        if message[2]:
+            archives -= 1
+        yield message
+
+
+class ArchiveReconciler:
+    """
+    Bring the files rows of one archive in line with a fresh enumeration delivered in chunks.
+
+    Each `add(rows)` commits one transaction: members that changed size are deleted (and
+    registered again as unprocessed), members that only moved get their new offset, and new
+    members are added. The archive itself changed, so a member's path and size say nothing
+    about its content: every kept member is reset to unprocessed, with its content hash,
+    duplicate link and full-text document dropped. `reset=False` (a rescan of an archive whose
+    state did not change) keeps their state instead.
+
+    `finish()` then deletes the members that were not seen, and records the archive's new state
+    and seek checkpoints. An archive left unfinished (e.g. its enumeration failed) keeps its old
+    recorded state, so the next run enumerates it again; applying the same rows twice is harmless.
+
+    `stale` counts the files deleted or reset. Words counted from them stay in `word_counts`
+    (counts are not kept per file), so after changes that table needs a rebuild with
+    stats.word_counter.recount_corpus.
+    """
+    def __init__(self, archive_path: str, reset: bool = True):
+        self.archive_path = archive_path
+        self.reset = reset
+        # Members registered before, not yet seen in the enumeration
+        self._existing = get_archive_members(archive_path)
+        self.members = 0
+        self.stale = 0
+
+    def add(self, rows) -> None:
+        """Reconcile a chunk of enumerated rows."""
+        existing = self._existing
+        fresh = []
+        stale = []
+        moved = []
+        kept = []
+        for row in rows:
+            member_path, file_size, member_offset = row[1], row[4], row[5]
+            old = existing.pop(member_path, None)
+            if old is None:
+                fresh.append(row)
+            elif old[1] != file_size:
+                stale.append(old[0])
+                fresh.append(row)
             else:
-                with tarfile.open(archive_path, 'r:*') as arch:
-                    members = arch.getmembers()
-                    get_name = lambda m: m.name
-                    get_size = lambda m: m.size
-
-            for member in tqdm(members, desc=os.path.basename(archive_path), leave=False):
-                # Skip directories
-                name = get_name(member)
-                if name.endswith('/'):
-                    continue
-
-                # You may filter to .json or text files here if desired
-                # if not name.lower().endswith('.json'):
-                #     continue
-
-                file_name = os.path.basename(name)
-                file_size = get_size(member)
-                # Determine extension of the member
-                _, ext = os.path.splitext(file_name)
-                extension = ext.lstrip('.').lower()
-
-                add_file(
-                    archive_path=archive_path,
-                    member_path=name,
-                    file_name=file_name,
-                    extension=extension,
-                    file_size=file_size
-                )
-        except Exception as e:
-            print(f"Error processing {archive_path}: {e}")
+                kept.append(old[0])
+                if old[2] != member_offset:
+                    moved.append((member_offset, old[0]))
+        with metrics.stage("loader.reconcile", items=len(rows)), transaction():
+            delete_files(stale)
+            if self.reset:
+                reset_files(kept)
+            update_member_offsets(moved)
+            add_files(fresh)
+        self.members += len(rows)
+        self.stale += len(stale) + (len(kept) if self.reset else 0)
+
+    def finish(self, kind: str, size: int, mtime_ns: int, fingerprint: str, checkpoints=()) -> int:
+        """Delete the members not seen, record the archive's state; returns `stale`."""
+        with metrics.stage("loader.reconcile"), transaction():
+            delete_files(file_id for file_id, _, _ in self._existing.values())
+            upsert_archive(self.archive_path, kind, size, mtime_ns, fingerprint, self.members)
+            # A lone checkpoint at the start of the stream gains nothing over no checkpoints
+            set_checkpoints(self.archive_path, checkpoints if len(checkpoints) > 1 else [])
+        self.stale += len(self._existing)
+        self._existing = {}
+        return self.stale
+
+
+def reconcile_archive(archive_path: str, kind: str, size: int, mtime_ns: int, fingerprint: str, rows: list,
+                      checkpoints=(), reset: bool = True) -> int:
+    """
+    Bring the files rows of one archive in line with a complete enumeration, in one transaction
+    (see ArchiveReconciler). Returns the number of files deleted or reset.
+    """
+    with transaction():
+        reconciler = ArchiveReconciler(archive_path, reset)
+        reconciler.add(rows)
+        return reconciler.finish(kind, size, mtime_ns, fingerprint, checkpoints)
+
+
+def remove_archive(archive_path: str) -> int:
+    """
+    Delete an archive's files rows and its `archives` record in one transaction.
+    Returns the number of files deleted (see reconcile_archive on `word_counts`).
+    """
+    with transaction():
+        file_ids = [file_id for file_id, _, _ in get_archive_members(archive_path).values()]
+        delete_files(file_ids)
+        delete_archive(archive_path)
+    return len(file_ids)
+
+
+def _is_under(path: str, base_dir: str) -> bool:
+    """True if `path` lies inside `base_dir`."""
+    base = os.path.join(os.path.abspath(base_dir), '')
+    return os.path.abspath(path).startswith(base)
+
+
+def load_and_register_archives(base_dir: str = TEXTS_ABS_PATH, workers: int = REGISTER_WORKERS,
+                               rescan: bool = False, batch_size: int = REGISTER_BATCH_SIZE) -> dict:
+    """
+    Discover archives in `base_dir`, extract member metadata, and register each text file in the database.
+
+    Archives whose size, mtime and fingerprint match the `archives` table are skipped without
+    being opened; only new and modified archives are probed and enumerated, and known archives
+    that no longer exist are removed with their files rows. `rescan=True` enumerates everything.
+
+    With `workers` > 1, archives are enumerated in worker processes (one archive at a time each)
+    and the parent process is the single DB writer. Member rows come back and are reconciled
+    (see ArchiveReconciler) in chunks of `batch_size`, so memory stays bounded however many
+    members an archive has. `workers=None` uses one process per CPU core.
+    Returns counts of new, modified, unchanged, removed and failed archives, and `stale_files`:
+    files deleted or reset, whose earlier words may still be in `word_counts` (see reconcile_archive).
+    """
+    summary = dict.fromkeys(('new', 'modified', 'unchanged', 'removed', 'failed', 'stale_files'), 0)
+    known = get_archive_states()
+    seen = set()
+    tasks = []
+    changed = set()
+    for fpath, size, mtime_ns in scan_archive_files(base_dir):
+        seen.add(fpath)
+        with metrics.stage("loader.fingerprint", items=1):
+            fingerprint = archive_fingerprint(fpath, size)
+        state = known.get(fpath)
+        if not rescan and state == (size, mtime_ns, fingerprint):
+            summary['unchanged'] += 1
+            continue
+        with metrics.stage("loader.probe", items=1):
+            kind = probe_archive(fpath)
+        if kind is None:
+            continue
+        tasks.append((fpath, kind, size, mtime_ns, fingerprint))
+        # Placeholder rows (size -1, see ensure_archives) were never enumerated, so their members'
+        # state is as good as any registration's
+        if state is not None and state[0] >= 0 and state != (size, mtime_ns, fingerprint):
+            changed.add(fpath)
+        summary['new' if state is None else 'modified'] += 1
+
+    for fpath in known:
+        if fpath not in seen and _is_under(fpath, base_dir):
+            summary['stale_files'] += remove_archive(fpath)
+            summary['removed'] += 1
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks)) or 1
+
+    procs = []
+    if workers == 1:
+        messages = (message for task in tasks for message in _enumerate_chunks(task, batch_size))
+    else:
+        task_queue = mp.Queue()
+        for task in tasks:
+            task_queue.put(task)
+        for _ in range(workers):
+            task_queue.put(None)
+        # At most a couple of chunks per worker wait for the writer
+        results = mp.Queue(maxsize=2 * workers)
+        procs = [mp.Process(target=_worker, daemon=True,
+                            args=(task_queue, results, batch_size, metrics.worker_state()))
+                 for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        messages = _receive(results, procs, len(tasks))
+
+    progress = tqdm(total=len(tasks), desc="Registering archives")
+    reconcilers = {}
+    try:
+        for task, rows, done, checkpoints, error, worker_metrics in messages:
+            metrics.merge(worker_metrics)
+            archive_path = task[0]
+            reconciler = reconcilers.get(archive_path)
+            if reconciler is None:
+                reconciler = ArchiveReconciler(archive_path, reset=archive_path in changed)
+                reconcilers[archive_path] = reconciler
+            if rows:
+                reconciler.add(rows)
+            if not done:
+                continue
+            del reconcilers[archive_path]
+            progress.update(1)
+            if error is not None:
+                # Its state is not recorded in `archives`, so the next run tries again; a new
+                # archive leaves none of the rows registered before the failure
+                print(f"Error processing {archive_path}: {error}")
+                summary['failed'] += 1
+                if archive_path in known:
+                    summary['stale_files'] += reconciler.stale
+                else:
+                    remove_archive(archive_path)
+                continue
+            summary['stale_files'] += reconciler.finish(*task[1:], checkpoints)
+    finally:
+        progress.close()
+        for proc in procs:
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.terminate()
+    return summary
 
 
 if __name__ == '__main__':
-    load_and_register_archives()
-    print("Archive discovery and member registration complete.")
+    result = load_and_register_archives()
+    print("Archive discovery and member registration complete: "
+          + ", ".join(f"{count} {state}" for state, count in result.items()))
@@ -0,0 +1,180 @@
+# file_reader/pipeline.py
+import os
+import time
+import queue
+import multiprocessing as mp
+
+from config.settings import (CLAIM_BATCH_SIZE, CLAIM_BATCH_BYTES, CLAIM_LEASE_SECONDS, PIPELINE_WORKERS,
+                             PIPELINE_QUEUE_SIZE, PIPELINE_SCHEDULE)
+from db.database import get_database_path, set_database_path
+from db.repositories.files_repo import mark_files_processed, release_files, renew_leases
+from file_reader.extractor import TextExtractor
+from file_reader.scheduler import plan_batches
+from utils import metrics
+
+# Sent by a worker as (_DONE, its metrics snapshot) when it has no more files to claim
+_DONE = None
+# Sent by a worker as (_FAILED, file_id, error message) for a file it could not extract; IDs are positive
+_FAILED = -1
+
+
+def _worker(results, stop, batch_size: int, batch_bytes: int, lease_seconds: float, encoding: str, errors: str,
+            process, db_path: str, metrics_state: tuple) -> None:
+    """
+    Worker process: claim file batches with its own FileReader and push (file_id, texts)
+    onto the bounded `results` queue. Files are never marked processed here; the consumer does
+    that once it has handled a result. If `process` is given, (file_id, process(file_id, texts))
+    is pushed instead. A file that fails is reported as (_FAILED, file_id, message) and keeps
+    its claim until the consumer releases it. The worker's metrics go to the consumer with its
+    final message.
+    """
+    # Spawned workers do not inherit set_database_path() or metrics.enable()
+    set_database_path(db_path)
+    metrics.configure(metrics_state)
+    extractor = TextExtractor(encoding=encoding, errors=errors)
+    extractor.reader.batch_size = batch_size
+    extractor.reader.batch_bytes = batch_bytes
+    extractor.reader.lease_seconds = lease_seconds
+    try:
+        while not stop.is_set():
+            record = extractor.reader.get_next_file()
+            if record is None:
+                break
+            try:
+                result = extractor.extract_record(record, mark=False)
+                if process is not None:
+                    with metrics.stage("pipeline.process", items=1):
+                        result = (result[0], process(*result))
+            except Exception as e:
+                result = (_FAILED, record[0], f"{type(e).__name__}: {e}")
+            # Blocks while the queue is full, which bounds memory when the consumer is slow
+            while not stop.is_set():
+                try:
+                    results.put(result, timeout=0.5)
+                    break
+                except queue.Full:
+                    extractor.reader.renew_claims((record[0],))
+            else:
+                release_files([record[0]])
+    finally:
+        extractor.close()
+        results.put((_DONE, metrics.drain()))
+
+
+def run_pipeline(workers: int = PIPELINE_WORKERS, batch_size: int = CLAIM_BATCH_SIZE,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, encoding: str = 'utf-8', errors: str = 'ignore',
+                 process=None, mark: bool = True, batch_bytes: int = CLAIM_BATCH_BYTES,
+                 schedule: bool = PIPELINE_SCHEDULE, lease_seconds: float = CLAIM_LEASE_SECONDS):
+    """
+    Extract all unprocessed files with `workers` processes and yield (file_id, texts) results.
+
+    Each worker runs its own TextExtractor and claims batches of at most `batch_size` files and
+    `batch_bytes` bytes from the work queue. With `schedule=True` the pending files are first
+    planned into size-balanced batches, largest first (see file_reader/scheduler.py).
+    Results pass through a queue holding at most `queue_size` items.
+    `process(file_id, texts)` optionally runs in the workers, and its return value replaces `texts`
+    in the results (e.g. per-file word counts); it must be a picklable module-level function.
+
+    Delivery is at-least-once: a file is marked processed only after the consumer has asked
+    for the next result, so anything in flight when the run dies is claimed again once its lease
+    expires. Processed marks are committed in batches of `batch_size`. With `mark=False` the
+    consumer marks files itself (e.g. together with its own results, in one transaction).
+
+    Claims are leased for `lease_seconds`. While the run lasts, the leases of files handed to the
+    consumer and not yet marked processed are renewed every third of that, however long the
+    consumer holds them before committing, and a result for one of them is dropped rather than
+    yielded twice. Only those files are remembered, so memory stays bounded by what the consumer
+    holds uncommitted; a file already committed is delivered again only if its lease ran out
+    (the consumer stalled for longer than the lease). Workers renew their own claims likewise
+    while they wait on a full queue.
+
+    Files whose extraction fails are reported and stay claimed for the rest of the run, so they
+    are not retried in a loop; they are released when the run ends.
+    """
+    workers = workers or os.cpu_count() or 1
+    if schedule:
+        plan_batches(max_bytes=batch_bytes, max_files=batch_size)
+    results = mp.Queue(maxsize=queue_size)
+    stop = mp.Event()
+    procs = [
+        mp.Process(target=_worker, daemon=True,
+                   args=(results, stop, batch_size, batch_bytes, lease_seconds, encoding, errors, process,
+                         get_database_path(), metrics.worker_state()))
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    done = []
+    unread = []
+    # Handed to the consumer and not yet seen processed; their leases are renewed
+    pending = set()
+    # Failed in a worker: kept claimed (so not retried) until the run ends, then released
+    failed = set()
+    renewed_at = time.monotonic()
+    running = workers
+    try:
+        while running:
+            if (pending or failed) and time.monotonic() - renewed_at >= lease_seconds / 3:
+                leased = set(renew_leases(pending | failed, lease_seconds))
+                pending &= leased
+                failed &= leased
+                renewed_at = time.monotonic()
+            try:
+                result = results.get(timeout=lease_seconds / 3)
+            except queue.Empty:
+                continue
+            if result[0] is _DONE:
+                running -= 1
+                metrics.merge(result[1])
+                continue
+            if result[0] == _FAILED:
+                print(f"Error extracting file {result[1]}: {result[2]}")
+                failed.add(result[1])
+                continue
+            if result[0] in pending:
+                continue
+            unread.append(result[0])
+            yield result
+            # The consumer has handled the result
+            file_id = unread.pop()
+            pending.add(file_id)
+            if mark:
+                done.append(file_id)
+                if len(done) >= batch_size:
+                    mark_files_processed(done)
+                    pending.difference_update(done)
+                    done.clear()
+    finally:
+        if done:
+            mark_files_processed(done)
+        stop.set()
+        # Drain so workers blocked on a full queue can see the stop flag and exit
+        while running:
+            try:
+                result = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    break
+                continue
+            if result[0] is _DONE:
+                running -= 1
+                metrics.merge(result[1])
+            elif result[0] == _FAILED:
+                failed.add(result[1])
+            else:
+                unread.append(result[0])
+        # The next run retries failed files right away instead of waiting for their leases
+        if unread or failed:
+            release_files(unread + sorted(failed))
+        for proc in procs:
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.terminate()
+
+
+if __name__ == '__main__':
+    total = 0
+    for file_id, texts in run_pipeline():
+        total += len(texts)
+    print(f"Extracted {total} text entries.")
@@ -1,9 +1,124 @@
 # file_reader/reader.py
+import io
+import os
+import socket
+import time
 import zipfile
 import tarfile
 import lzma
+import codecs
+import hashlib
+from collections import deque
 
-from db.repositories.files_repo import get_unprocessed_files, get_file_by_id, mark_file_processed_by_id
+from config.settings import (
+    CLAIM_BATCH_SIZE, CLAIM_BATCH_BYTES, CLAIM_LEASE_SECONDS, STREAM_CHUNK_SIZE, ARCHIVE_CACHE_HANDLES,
+    ARCHIVE_CACHE_BYTES,
+)
+from db.repositories.archives_repo import get_checkpoints
+from db.repositories.files_repo import (
+    claim_files, claim_batch, renew_leases, release_files, get_file_by_id, mark_files_processed, get_pending_archives, link_content,
+)
+from file_reader.seek_index import SeekableArchive, MemberReader
+from file_reader.handle_cache import HandleCache
+from utils import metrics
+
+# Line boundaries recognised by str.splitlines()
+_LINE_ENDS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+class _NestedXZFile(lzma.LZMAFile):
+    """LZMAFile over an archive member handle that also closes the member handle."""
+    def __init__(self, fp):
+        super().__init__(fp, mode='rb')
+        self._member_fp = fp
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._member_fp.close()
+
+
+class _PinnedMember(io.RawIOBase):
+    """Member file object that keeps its archive handle pinned in the handle cache until closed."""
+    def __init__(self, fp, release):
+        self._fp = fp
+        self._release = release
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._fp.read(size)
+
+    def readinto(self, b) -> int:
+        data = self._fp.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._fp.close()
+            finally:
+                self._release()
+        super().close()
+
+
+def _strip_line_end(line: str) -> str:
+    """Remove the single line ending (as produced by splitlines(keepends=True)) from `line`."""
+    if line.endswith('\r\n'):
+        return line[:-2]
+    if line[-1:] in _LINE_ENDS:
+        return line[:-1]
+    return line
+
+
+def _iter_xz_blocks(fp, chunk_size: int):
+    """
+    Incrementally decompress an .xz stream read from `fp`, yielding at most `chunk_size` bytes at a time.
+    Concatenated .xz streams are decoded one after another, like lzma.decompress.
+    """
+    decompressor = lzma.LZMADecompressor()
+    while True:
+        if decompressor.eof:
+            leftover = decompressor.unused_data
+            if not leftover:
+                leftover = fp.read(chunk_size)
+                if not leftover:
+                    return
+            decompressor = lzma.LZMADecompressor()
+            data = decompressor.decompress(leftover, chunk_size)
+        elif decompressor.needs_input:
+            raw = fp.read(chunk_size)
+            if not raw:
+                raise EOFError("Compressed member ended before the end-of-stream marker was reached")
+            data = decompressor.decompress(raw, chunk_size)
+        else:
+            data = decompressor.decompress(b'', chunk_size)
+        if data:
+            yield data
+
+
+def content_hash(data: bytes) -> str:
+    """Hash of a member's stored bytes, used to recognise identical members."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _member_location(record):
+    """
+    Return (file_size, member_offset) of a FileRecord
+    (id, archive_path, member_path, file_name, file_size, member_offset); (None, None) for shorter rows.
+    """
+    if len(record) >= 6:
+        return record[4], record[5]
+    return None, None
+
+
+def _offset_key(record):
+    """Sort key placing records in on-disk member order; records without an offset go last."""
+    member_offset = record[5] if len(record) > 5 else None
+    return (member_offset is None, member_offset or 0)
 
 class FileReader:
     """
@@ -11,77 +126,336 @@ class FileReader:
 
     Provides methods to read the next unprocessed file or a specific file by ID,
     decode its text content (including nested .xz files), and mark it as processed.
+
+    Unprocessed files are claimed from the DB work queue in batches of `batch_size` files and at
+    most `batch_bytes` bytes, so several readers (threads or processes) can share one database.
+    Batches planned by file_reader.scheduler.plan_batches are claimed first, largest first.
+    Processed marks are buffered and committed once per batch; call `flush()` or `close()` to commit them.
+
+    With `dedupe=True`, whole-member reads hash the member's stored bytes and link the file to the
+    first file with the same content; duplicates are marked processed without being decompressed
+    or decoded, and read as None.
+
+    `shards` (a file_reader.shards.ShardReader) lets `read_text_by_id` serve materialized texts
+    without touching the archive.
+
+    Tar members registered with an offset are read through a SeekableArchive per archive, which
+    restarts decompression from the nearest stored checkpoint instead of scanning the archive.
+
+    Open archive handles live in an LRU HandleCache holding at most `max_handles` handles and
+    about `max_handle_bytes` of member lists and decoder state; the archive being streamed and
+    members opened with `open_member` stay pinned until done. `handle_stats()` reports hits,
+    misses and evictions.
     """
-    def __init__(self, encoding: str = 'utf-8', errors: str = 'ignore'):
-        self._archives = {}
+    def __init__(self, encoding: str = 'utf-8', errors: str = 'ignore',
+                 batch_size: int = CLAIM_BATCH_SIZE, owner: str = None, dedupe: bool = False, shards=None,
+                 batch_bytes: int = CLAIM_BATCH_BYTES,
+                 max_handles: int = ARCHIVE_CACHE_HANDLES, max_handle_bytes: int = ARCHIVE_CACHE_BYTES):
+        self._handles = HandleCache(max_handles, max_handle_bytes)
+        # archive_path -> True for zip archives; probed once per path
+        self._zip = {}
         self.encoding = encoding
         self.errors = errors
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.dedupe = dedupe
+        self.shards = shards
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.lease_seconds = CLAIM_LEASE_SECONDS
+        self._claimed = deque()
+        self._leased_at = 0.0
+        self._processed = []
 
     def _open_archive(self, archive_path: str):
         """Open or reuse an archive handle (ZIP or TAR)."""
-        if archive_path in self._archives:
-            return self._archives[archive_path]
+        def opener():
+            if self._is_zip(archive_path):
+                return zipfile.ZipFile(archive_path, mode='r')
+            return tarfile.open(archive_path, mode='r:*')
+        return self._handles.get(('archive', archive_path), opener)
 
-        if zipfile.is_zipfile(archive_path):
-            archive = zipfile.ZipFile(archive_path, mode='r')
-        else:
-            archive = tarfile.open(archive_path, mode='r:*')
+    def _seekable_archive(self, archive_path: str) -> SeekableArchive:
+        """Open or reuse random access to the uncompressed stream of a tar archive."""
+        return self._handles.get(('seekable', archive_path),
+                                 lambda: SeekableArchive(archive_path, get_checkpoints(archive_path)))
+
+    def _is_zip(self, archive_path: str) -> bool:
+        is_zip = self._zip.get(archive_path)
+        if is_zip is None:
+            is_zip = self._zip[archive_path] = zipfile.is_zipfile(archive_path)
+        return is_zip
 
-        self._archives[archive_path] = archive
-        return archive
+    def handle_stats(self) -> dict:
+        """Hits, misses, evictions, open handles and estimated bytes of the archive handle cache."""
+        return self._handles.stats()
 
     def get_next_file(self):
         """Return the next unprocessed file record from the DB, or None if none remain."""
-        rows = get_unprocessed_files()
-        return rows[0] if rows else None
+        if not self._claimed:
+            # Commit the finished batch before reserving the next one
+            self.flush()
+            self._claimed.extend(claim_batch(self.owner, self.lease_seconds)
+                                 or claim_files(self.owner, self.batch_size, self.lease_seconds,
+                                                max_bytes=self.batch_bytes))
+            self._leased_at = time.monotonic()
+        else:
+            self.renew_claims()
+        return self._claimed.popleft() if self._claimed else None
+
+    def renew_claims(self, file_ids=()) -> None:
+        """
+        Renew the leases of the claimed files not yet returned, and of `file_ids` (files returned
+        but still being worked on), once a third of the lease has passed since the last renewal,
+        so a slow batch keeps its claim instead of being handed to another reader.
+        """
+        if time.monotonic() - self._leased_at < self.lease_seconds / 3:
+            return
+        renew_leases([row[0] for row in self._claimed] + list(file_ids), self.lease_seconds)
+        self._leased_at = time.monotonic()
 
     def get_file_record(self, file_id: int):
         """Return the file record for a given ID, or None if not found."""
         return get_file_by_id(file_id)
 
-    def read_text(self, file_record) -> str:
+    def read_text(self, file_record, mark: bool = True) -> str:
         """
         Given a DB row tuple (id, archive_path, member_path, ...),
         read and return its decoded text content, then mark it processed.
         Supports nested .xz members inside tar archives.
+        With `mark=False` the processed flag is left to the caller.
+        With dedupe on, returns None if the member duplicates another file's content.
         """
         file_id, archive_path, member_path, *rest = file_record
-        archive = self._open_archive(archive_path)
+        file_size, member_offset = _member_location(file_record)
 
         # Read raw bytes from archive member
-        if isinstance(archive, zipfile.ZipFile):
-            with archive.open(member_path, 'r') as fp:
-                raw = fp.read()
+        with metrics.stage("reader.read_member", items=1) as span:
+            if self._is_zip(archive_path):
+                with self._open_archive(archive_path).open(member_path, 'r') as fp:
+                    raw = fp.read()
+            elif member_offset is not None:
+                raw = self._seekable_archive(archive_path).read_at(member_offset, file_size)
+            else:
+                archive = self._open_archive(archive_path)
+                member = archive.getmember(member_path)
+                with archive.extractfile(member) as fp:
+                    raw = fp.read() if fp else b''
+            span.add(nbytes=len(raw))
+
+        if self.dedupe and self.is_duplicate(file_id, raw):
+            if mark:
+                self.mark_processed(file_id)
+            return None
+
+        with metrics.stage("reader.decode", items=1) as span:
+            text = self.decode(self._unwrap(member_path, raw))
+            span.add(nbytes=len(text))
+        if mark:
+            self.mark_processed(file_id)
+        return text
+
+    def open_member(self, file_record, unwrap: bool = True):
+        """
+        Open a member as a binary file object without reading it into memory.
+        Nested .xz members are decompressed on the fly unless `unwrap=False`.
+        The caller closes the result.
+        """
+        file_id, archive_path, member_path, *rest = file_record
+        file_size, member_offset = _member_location(file_record)
+        if self._is_zip(archive_path):
+            key = ('archive', archive_path)
+            fp = self._open_archive(archive_path).open(member_path, 'r')
+        elif member_offset is not None:
+            key = ('seekable', archive_path)
+            fp = io.BufferedReader(MemberReader(self._seekable_archive(archive_path), member_offset, file_size))
         else:
-            member = archive.getmember(member_path)
-            with archive.extractfile(member) as fp:
-                raw = fp.read() if fp else b''
+            key = ('archive', archive_path)
+            archive = self._open_archive(archive_path)
+            fp = archive.extractfile(archive.getmember(member_path)) or io.BytesIO()
+        # The handle must stay open while the member is being read
+        self._handles.pin(key)
+        fp = _PinnedMember(fp, lambda: self._handles.unpin(key))
+        if unwrap and member_path.lower().endswith('.xz'):
+            return _NestedXZFile(fp)
+        return fp
+
+    def iter_chunks(self, file_record, chunk_size: int = STREAM_CHUNK_SIZE, mark: bool = True):
+        """
+        Yield the decoded text of a member in chunks of roughly `chunk_size` characters.
+
+        The member is read `chunk_size` bytes at a time; nested .xz members go through an
+        incremental LZMA decompressor with bounded output, and an incremental decoder keeps
+        multibyte sequences split across chunks intact. Memory stays O(chunk_size) whatever the
+        member size. The file is marked processed once the generator is exhausted (unless `mark=False`).
+        """
+        file_id, archive_path, member_path, *rest = file_record
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors=self.errors)
+        with self.open_member(file_record, unwrap=False) as fp:
+            if member_path.lower().endswith('.xz'):
+                blocks = _iter_xz_blocks(fp, chunk_size)
+            else:
+                blocks = iter(lambda: fp.read(chunk_size), b'')
+            for block in blocks:
+                text = decoder.decode(block)
+                if text:
+                    yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+        if mark:
+            self.mark_processed(file_id)
+
+    def iter_lines(self, file_record, chunk_size: int = STREAM_CHUNK_SIZE, mark: bool = True):
+        """
+        Yield the lines of a member without their line endings, splitting exactly like
+        `str.splitlines()` on the whole text, while reading it through `iter_chunks`.
+        """
+        carry = ''
+        for chunk in self.iter_chunks(file_record, chunk_size, mark=mark):
+            lines = (carry + chunk).splitlines(keepends=True)
+            carry = ''
+            # The last piece is incomplete if it has no line ending yet, or ends in a '\r'
+            # that may be the first half of '\r\n'
+            last = lines[-1]
+            if last[-1] not in _LINE_ENDS or last[-1] == '\r':
+                carry = lines.pop()
+            for line in lines:
+                yield _strip_line_end(line)
+        if carry:
+            yield _strip_line_end(carry)
+
+    def decode(self, data: bytes) -> str:
+        """Decode member bytes with the reader's encoding settings."""
+        return data.decode(self.encoding, errors=self.errors)
 
-        # If the member itself is compressed (e.g. an .xz file inside tar), decompress
+    @staticmethod
+    def _unwrap(member_path: str, raw: bytes) -> bytes:
+        """If the member itself is compressed (e.g. an .xz file inside tar), decompress it."""
         if member_path.lower().endswith('.xz'):
-            raw = lzma.decompress(raw)
+            with metrics.stage("reader.unwrap_xz", items=1, nbytes=len(raw)):
+                return lzma.decompress(raw)
+        return raw
 
-        # Decode to string
-        text = raw.decode(self.encoding, errors=self.errors)
+    def is_duplicate(self, file_id: int, raw: bytes) -> bool:
+        """Record the content hash of a member's stored bytes; True if another file has the same content."""
+        with metrics.stage("reader.hash", items=1, nbytes=len(raw)):
+            digest = content_hash(raw)
+        return link_content(file_id, digest) != file_id
 
-        # Mark as processed in DB
-        mark_file_processed_by_id(file_id)
-        return text
+    def mark_processed(self, file_id: int):
+        """Mark as processed in DB (group-committed per batch)."""
+        self._processed.append(file_id)
+        if len(self._processed) >= self.batch_size:
+            self.flush()
+
+    # --------------------- STREAMING ---------------------
+    def stream_records(self, records):
+        """
+        Yield (file_id, bytes) for the given records, grouped by archive and in on-disk member order,
+        so each archive is read in one forward pass. Nested .xz members are decompressed.
+        With dedupe on, duplicates of another file's content yield (file_id, None).
+        Does not mark anything processed.
+        """
+        by_archive = {}
+        for record in records:
+            by_archive.setdefault(record[1], []).append(record)
+        for archive_path, group in by_archive.items():
+            for file_id, member_path, raw in self._stream_archive(archive_path, sorted(group, key=_offset_key)):
+                # Reads interleave with the consumer here, so they are counted but not timed
+                metrics.count("reader.stream_member", items=1, nbytes=len(raw))
+                if self.dedupe and self.is_duplicate(file_id, raw):
+                    yield file_id, None
+                else:
+                    yield file_id, self._unwrap(member_path, raw)
+
+    def _stream_archive(self, archive_path: str, records: list):
+        """
+        Yield (file_id, member_path, stored bytes) for records of one archive, already sorted by
+        member offset.
+        """
+        if self._is_zip(archive_path):
+            archive = self._open_archive(archive_path)
+            with self._handles.pinned(('archive', archive_path)):
+                for file_id, _, member_path, *rest in records:
+                    with archive.open(member_path, 'r') as fp:
+                        yield file_id, member_path, fp.read()
+            return
+
+        with_offset = [r for r in records if len(r) > 5 and r[5] is not None]
+        without_offset = [r for r in records if len(r) <= 5 or r[5] is None]
+
+        # Members registered with a data offset: read forward through the uncompressed stream,
+        # jumping ahead at checkpoints
+        if with_offset:
+            stream = self._seekable_archive(archive_path)
+            with self._handles.pinned(('seekable', archive_path)):
+                for file_id, _, member_path, _, file_size, member_offset in with_offset:
+                    yield file_id, member_path, stream.read_at(member_offset, file_size)
+
+        # Older rows without offsets: match names while walking the headers once
+        if without_offset:
+            wanted = {r[2]: r[0] for r in without_offset}
+            with tarfile.open(archive_path, mode='r|*') as arch:
+                for member in arch:
+                    file_id = wanted.pop(member.name, None)
+                    if file_id is None:
+                        continue
+                    fp = arch.extractfile(member)
+                    yield file_id, member.name, fp.read() if fp else b''
+                    if not wanted:
+                        break
+
+    def iter_pending(self, lease_seconds: float = CLAIM_LEASE_SECONDS):
+        """
+        Claim and stream all unprocessed files, one archive at a time, yielding (file_id, bytes).
+        Each archive's pending members are claimed together and read in a single forward pass.
+        A file is marked processed once the consumer asks for the next item; claims left
+        unread when the generator is closed are released. Duplicates (with dedupe on) are marked
+        processed without being yielded.
+        """
+        for archive_path in get_pending_archives():
+            records = claim_files(self.owner, batch_size=None, lease_seconds=lease_seconds,
+                                  archive_path=archive_path)
+            unread = {r[0] for r in records}
+            try:
+                for file_id, data in self.stream_records(records):
+                    if data is not None:
+                        yield file_id, data
+                    unread.discard(file_id)
+                    self.mark_processed(file_id)
+            finally:
+                self.flush()
+                if unread:
+                    release_files(unread)
 
     def read_text_by_id(self, file_id: int) -> str:
         """
         Fetch the file record by ID, read its text content, and mark it processed.
+        Materialized texts are served from `shards` as stored (cleaned if the shards were).
         """
+        if self.shards is not None:
+            text = self.shards.read_text(file_id)
+            if text is not None:
+                self.mark_processed(file_id)
+                return text
         record = self.get_file_record(file_id)
         if record is None:
             raise ValueError(f"No file found with ID {file_id}")
         return self.read_text(record)
 
+    def flush(self):
+        """Commit buffered processed marks to the DB."""
+        if self._processed:
+            mark_files_processed(self._processed)
+            self._processed.clear()
+
     def close(self):
-        """Close all open archive handles."""
-        for archive in self._archives.values():
-            archive.close()
-        self._archives.clear()
+        """Commit processed marks, release unread claims and close all open archive handles."""
+        self.flush()
+        if self._claimed:
+            release_files([row[0] for row in self._claimed])
+            self._claimed.clear()
+        self._handles.clear()
 
 if __name__ == '__main__':
     reader = FileReader()
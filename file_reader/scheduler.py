@@ -0,0 +1,79 @@
+# file_reader/scheduler.py
+from itertools import groupby
+
+from config.settings import CLAIM_BATCH_SIZE, CLAIM_BATCH_BYTES, STREAM_MEMBER_BYTES
+from db.database import transaction
+from db.repositories.files_repo import iter_pending_sizes, set_batch_ids, renumber_batches, clear_batch_ids
+
+
+def pack_members(members, max_bytes: int = CLAIM_BATCH_BYTES, max_files: int = CLAIM_BATCH_SIZE,
+                 stream_bytes: int = STREAM_MEMBER_BYTES) -> list:
+    """
+    Pack one archive's (file_id, file_size) pairs, in member order, into batches of consecutive
+    members holding at most `max_files` files and `max_bytes` bytes. A member larger than
+    `stream_bytes` (or than `max_bytes`) gets a batch of its own.
+    Returns a list of (total_bytes, [file_id, ...]).
+    """
+    batches = []
+    ids = []
+    total = 0
+    for file_id, file_size in members:
+        size = file_size or 0
+        if size > stream_bytes or size > max_bytes:
+            batches.append((size, [file_id]))
+            continue
+        if ids and (len(ids) >= max_files or total + size > max_bytes):
+            batches.append((total, ids))
+            ids = []
+            total = 0
+        ids.append(file_id)
+        total += size
+    if ids:
+        batches.append((total, ids))
+    return batches
+
+
+def plan_batches(max_bytes: int = CLAIM_BATCH_BYTES, max_files: int = CLAIM_BATCH_SIZE,
+                 stream_bytes: int = STREAM_MEMBER_BYTES) -> dict:
+    """
+    Split every unprocessed file into batches (see `pack_members`) and store the plan in
+    `files.batch_id`, numbered largest batch first, so readers claiming with `claim_batch` start
+    the longest jobs first and the run ends on small batches that even out worker load.
+    Members of one archive stay together and in on-disk order.
+
+    Replaces any previous plan. Files registered later are not in the plan and are claimed by
+    count (and `max_bytes`) once the planned batches are done.
+    Returns the number of batches, planned files and bytes, the largest batch's bytes and the
+    number of files larger than `stream_bytes`.
+    """
+    summary = {"batches": 0, "files": 0, "bytes": 0, "largest_batch_bytes": 0, "stream_files": 0}
+    sizes = []
+    with transaction():
+        clear_batch_ids()
+        for _, group in groupby(iter_pending_sizes(), key=lambda row: row[1]):
+            batches = pack_members(((file_id, size) for file_id, _, size in group),
+                                   max_bytes, max_files, stream_bytes)
+            pairs = []
+            for total, ids in batches:
+                batch_id = len(sizes)
+                sizes.append(total)
+                pairs.extend((batch_id, file_id) for file_id in ids)
+                summary["files"] += len(ids)
+                summary["bytes"] += total
+                if len(ids) == 1 and total > stream_bytes:
+                    summary["stream_files"] += 1
+                if len(pairs) >= 10_000:
+                    set_batch_ids(pairs)
+                    pairs.clear()
+            set_batch_ids(pairs)
+        # Longest processing time first
+        renumber_batches(sorted(range(len(sizes)), key=lambda batch_id: -sizes[batch_id]))
+    summary["batches"] = len(sizes)
+    summary["largest_batch_bytes"] = max(sizes, default=0)
+    return summary
+
+
+if __name__ == '__main__':
+    result = plan_batches()
+    print(f"Planned {result['batches']} batches over {result['files']} files "
+          f"({result['bytes'] / 1e6:,.1f} MB, {result['stream_files']} streamed)")
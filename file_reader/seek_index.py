@@ -0,0 +1,406 @@
+# file_reader/seek_index.py
+import io
+import bz2
+import zlib
+import lzma
+import bisect
+from abc import ABC, abstractmethod
+
+from config.settings import STREAM_CHUNK_SIZE, SEEK_CHECKPOINT_SPAN
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+_XZ_FOOTER_MAGIC = b"YZ"
+
+# Approximate memory of one in-memory gzip snapshot (32 KiB window plus inflate state)
+_ZLIB_SNAPSHOT_BYTES = 48 * 1024
+
+# xz filter IDs that a block header may name, and how to read their properties
+_XZ_LZMA2 = 0x21
+_XZ_DELTA = 0x03
+_XZ_BCJ = {0x04: lzma.FILTER_X86, 0x05: lzma.FILTER_POWERPC, 0x06: lzma.FILTER_IA64,
+           0x07: lzma.FILTER_ARM, 0x08: lzma.FILTER_ARMTHUMB, 0x09: lzma.FILTER_SPARC}
+
+
+def detect_codec(archive_path: str) -> str:
+    """Return 'gzip', 'xz', 'bzip2' or 'plain' from the archive's magic bytes."""
+    with open(archive_path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(_GZIP_MAGIC):
+        return 'gzip'
+    if magic.startswith(_XZ_MAGIC):
+        return 'xz'
+    if magic.startswith(b"BZh"):
+        return 'bzip2'
+    return 'plain'
+
+
+# --------------------- XZ BLOCK INDEX ---------------------
+def _read_varint(data: bytes, pos: int):
+    """Decode an xz multibyte integer at `pos`; returns (value, next position)."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def xz_block_checkpoints(archive_path: str) -> list:
+    """
+    Read the block index at the end of each xz stream and return one (uncompressed_offset,
+    compressed_offset) checkpoint per block, without decompressing anything.
+    Files written with several blocks (xz -T0, --block-size) get one checkpoint per block;
+    a single-block file gets only the start. Returns [] if the index cannot be read.
+    """
+    streams = []
+    with open(archive_path, 'rb') as f:
+        end = f.seek(0, io.SEEK_END)
+        while end > 0:
+            # Skip stream padding (multiples of four null bytes) between concatenated streams
+            f.seek(end - 4)
+            if f.read(4) == b"\0\0\0\0":
+                end -= 4
+                continue
+            if end < 24:
+                return []
+            f.seek(end - 12)
+            footer = f.read(12)
+            if footer[10:] != _XZ_FOOTER_MAGIC:
+                return []
+            index_size = (int.from_bytes(footer[4:8], 'little') + 1) * 4
+            index_start = end - 12 - index_size
+            f.seek(index_start)
+            index = f.read(index_size)
+            if not index or index[0] != 0:
+                return []
+            count, pos = _read_varint(index, 1)
+            blocks = []
+            for _ in range(count):
+                unpadded, pos = _read_varint(index, pos)
+                uncompressed, pos = _read_varint(index, pos)
+                blocks.append((unpadded, uncompressed))
+            stream_size = 12 + sum((u + 3) & ~3 for u, _ in blocks) + index_size + 12
+            start = end - stream_size
+            if start < 0:
+                return []
+            streams.append((start, blocks))
+            end = start
+
+    checkpoints = []
+    uncompressed_offset = 0
+    for start, blocks in reversed(streams):
+        compressed_offset = start + 12
+        for unpadded, uncompressed in blocks:
+            checkpoints.append((uncompressed_offset, compressed_offset))
+            compressed_offset += (unpadded + 3) & ~3
+            uncompressed_offset += uncompressed
+    return checkpoints
+
+
+def _xz_block_filters(header: bytes) -> list:
+    """Build an lzma FORMAT_RAW filter chain from an xz block header, or None if unsupported."""
+    flags = header[1]
+    pos = 2
+    if flags & 0x40:
+        _, pos = _read_varint(header, pos)
+    if flags & 0x80:
+        _, pos = _read_varint(header, pos)
+    filters = []
+    for _ in range((flags & 0x03) + 1):
+        filter_id, pos = _read_varint(header, pos)
+        size, pos = _read_varint(header, pos)
+        props = header[pos:pos + size]
+        pos += size
+        if filter_id == _XZ_LZMA2:
+            bits = props[0] & 0x3F
+            dict_size = 0xFFFFFFFF if bits == 40 else (2 | (bits & 1)) << (bits // 2 + 11)
+            filters.append({'id': lzma.FILTER_LZMA2, 'dict_size': dict_size})
+        elif filter_id == _XZ_DELTA:
+            filters.append({'id': lzma.FILTER_DELTA, 'dist': props[0] + 1})
+        elif filter_id in _XZ_BCJ:
+            spec = {'id': _XZ_BCJ[filter_id]}
+            if size == 4:
+                spec['start_offset'] = int.from_bytes(props, 'little')
+            filters.append(spec)
+        else:
+            return None
+    return filters
+
+
+# --------------------- GZIP MEMBER BOUNDARIES ---------------------
+def gzip_member_checkpoints(archive_path: str) -> list:
+    """
+    Decompress a gzip file once and return a (uncompressed_offset, compressed_offset) checkpoint
+    at the start of every gzip member. Concatenated-member files (bgzip, `cat a.gz b.gz`) get one
+    per member; ordinary single-member files only the start, since a deflate stream can only be
+    resumed mid-member from in-memory decompressor state.
+    """
+    archive = SeekableArchive(archive_path, snapshot_span=0)
+    try:
+        while archive._decoder.step():
+            pass
+        return archive.checkpoints()
+    finally:
+        archive.close()
+
+
+def build_checkpoints(archive_path: str) -> list:
+    """
+    Return the persistent seek checkpoints of a compressed tar: xz blocks or gzip members.
+    Plain tars need none (member offsets are file offsets); bzip2 is not supported.
+    """
+    codec = detect_codec(archive_path)
+    if codec == 'xz':
+        return xz_block_checkpoints(archive_path)
+    if codec == 'gzip':
+        return gzip_member_checkpoints(archive_path)
+    return []
+
+
+# --------------------- DECODERS ---------------------
+class _Decoder(ABC):
+    """
+    Decompresses an archive forward from a checkpoint, one bounded chunk per `step()`.
+    `pos` is the uncompressed offset of the next byte `step()` returns.
+    """
+    def __init__(self, fp, checkpoints: list, chunk_size: int):
+        self.fp = fp
+        self.checkpoints = sorted(checkpoints)
+        self.offsets = [u for u, _ in self.checkpoints]
+        self.chunk_size = chunk_size
+        self.pos = 0
+
+    def nearest(self, offset: int):
+        """Return the best known restart point at or before `offset` as (uncompressed_offset, token)."""
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        return (self.offsets[i], i) if i >= 0 else (None, None)
+
+    @abstractmethod
+    def restart(self, token) -> None:
+        """Continue decoding from the restart point `token` returned by `nearest()`."""
+
+    @abstractmethod
+    def step(self) -> bytes:
+        """Return the next decompressed bytes, or b'' at the end of the stream."""
+
+
+class _GzipStream(_Decoder):
+    """
+    Gzip decoder restartable at member starts (persistent checkpoints) and at in-memory
+    zlib snapshots taken every `snapshot_span` uncompressed bytes the first time the stream is read
+    that far.
+    """
+    def __init__(self, fp, checkpoints: list, chunk_size: int = STREAM_CHUNK_SIZE,
+                 snapshot_span: int = SEEK_CHECKPOINT_SPAN):
+        super().__init__(fp, checkpoints or [(0, 0)], chunk_size)
+        self.snapshot_span = snapshot_span
+        # (uncompressed_offset, compressed_offset, decompressor copy)
+        self._snapshots = []
+        self._snapshot_offsets = []
+        self.member_starts = []
+        self.restart(0)
+
+    def _start(self, uncompressed_offset: int, compressed_offset: int, dec) -> None:
+        self.fp.seek(compressed_offset)
+        self._dec = dec
+        # Input read from the file but not yet consumed by the decompressor
+        self._tail = b''
+        self.pos = uncompressed_offset
+        # Regions read before already have their snapshots; only extend past the last one, which
+        # also keeps _snapshot_offsets sorted for nearest()
+        frontier = self._snapshot_offsets[-1] if self._snapshot_offsets else 0
+        self._next_snapshot = max(uncompressed_offset, frontier) + self.snapshot_span
+
+    def _note_member(self, uncompressed_offset: int, compressed_offset: int) -> None:
+        if not self.member_starts or self.member_starts[-1][0] < uncompressed_offset:
+            self.member_starts.append((uncompressed_offset, compressed_offset))
+
+    def nearest(self, offset: int):
+        best, token = super().nearest(offset)
+        i = bisect.bisect_right(self._snapshot_offsets, offset) - 1
+        if i >= 0 and (best is None or self._snapshot_offsets[i] > best):
+            return self._snapshot_offsets[i], ('snapshot', i)
+        return best, token
+
+    def restart(self, token) -> None:
+        if isinstance(token, tuple):
+            uncompressed_offset, compressed_offset, dec = self._snapshots[token[1]]
+            self._start(uncompressed_offset, compressed_offset, dec.copy())
+        else:
+            uncompressed_offset, compressed_offset = self.checkpoints[token]
+            self._start(uncompressed_offset, compressed_offset, zlib.decompressobj(zlib.MAX_WBITS | 16))
+            self._note_member(uncompressed_offset, compressed_offset)
+
+    def step(self) -> bytes:
+        data = b''
+        while not data:
+            dec = self._dec
+            if dec.eof:
+                leftover = dec.unused_data
+                start = self.fp.tell() - len(leftover)
+                if not leftover:
+                    leftover = self.fp.read(self.chunk_size)
+                # Trailing null padding after the last member is not another member
+                if not leftover.strip(b"\0"):
+                    return b''
+                dec = self._dec = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                self._note_member(self.pos, start)
+                data = dec.decompress(leftover, self.chunk_size)
+            else:
+                raw = self._tail or self.fp.read(self.chunk_size)
+                if not raw:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                data = dec.decompress(raw, self.chunk_size)
+            self._tail = dec.unconsumed_tail
+        self.pos += len(data)
+        if self.snapshot_span and self.pos >= self._next_snapshot and not dec.eof:
+            # The copy resumes with the input after what it has consumed
+            self._snapshots.append((self.pos, self.fp.tell() - len(self._tail), dec.copy()))
+            self._snapshot_offsets.append(self.pos)
+            self._next_snapshot = self.pos + self.snapshot_span
+        return data
+
+
+class _XzStream(_Decoder):
+    """Xz decoder that starts at any block boundary by decoding the raw block directly."""
+    def __init__(self, fp, checkpoints: list, chunk_size: int = STREAM_CHUNK_SIZE):
+        super().__init__(fp, checkpoints, chunk_size)
+        self._block = None
+        self.restart(0)
+
+    def restart(self, token) -> None:
+        self._block = token
+        self.pos, compressed_offset = self.checkpoints[token]
+        self.fp.seek(compressed_offset)
+        size_byte = self.fp.read(1)
+        header = size_byte + self.fp.read((size_byte[0] + 1) * 4 - 1)
+        filters = _xz_block_filters(header)
+        if filters is None:
+            raise ValueError("Unsupported xz filter chain")
+        self._dec = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=filters)
+
+    def step(self) -> bytes:
+        data = b''
+        while not data:
+            dec = self._dec
+            if dec.eof:
+                if self._block + 1 >= len(self.checkpoints):
+                    return b''
+                self.restart(self._block + 1)
+                continue
+            if dec.needs_input:
+                raw = self.fp.read(self.chunk_size)
+                if not raw:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                data = dec.decompress(raw, self.chunk_size)
+            else:
+                data = dec.decompress(b'', self.chunk_size)
+        self.pos += len(data)
+        return data
+
+
+# --------------------- RANDOM ACCESS ---------------------
+class SeekableArchive:
+    """
+    Random reads from the uncompressed stream of a (possibly compressed) tar archive.
+
+    Plain files are read with a seek. Gzip and xz streams restart from the nearest checkpoint
+    at or before the requested offset (see `build_checkpoints`; gzip also snapshots its state
+    every `snapshot_span` bytes in memory), or continue forward if no checkpoint lies closer,
+    so reads in increasing offset order decompress the archive at most once.
+    Bzip2 falls back to a forward stream that rewinds for backward reads.
+    """
+    def __init__(self, archive_path: str, checkpoints=None, chunk_size: int = STREAM_CHUNK_SIZE,
+                 snapshot_span: int = SEEK_CHECKPOINT_SPAN):
+        self.archive_path = archive_path
+        self.codec = detect_codec(archive_path)
+        self._buffer = b''
+        self._decoder = None
+        if self.codec == 'bzip2':
+            self._fp = bz2.open(archive_path, 'rb')
+            return
+        self._fp = open(archive_path, 'rb')
+        if self.codec == 'gzip':
+            self._decoder = _GzipStream(self._fp, checkpoints, chunk_size, snapshot_span)
+        elif self.codec == 'xz':
+            checkpoints = checkpoints or xz_block_checkpoints(archive_path)
+            try:
+                self._decoder = _XzStream(self._fp, checkpoints, chunk_size) if checkpoints else None
+            except ValueError:
+                self._decoder = None
+            if self._decoder is None:
+                # No usable block index: decode the whole stream forward
+                self._fp.close()
+                self._fp = lzma.open(archive_path, 'rb')
+
+    def checkpoints(self) -> list:
+        """Persistent checkpoints known so far (all xz blocks; gzip members decoded so far)."""
+        if isinstance(self._decoder, _GzipStream):
+            return list(self._decoder.member_starts)
+        if isinstance(self._decoder, _XzStream):
+            return list(self._decoder.checkpoints)
+        return []
+
+    def memory_size(self) -> int:
+        """Approximate bytes held in memory: the decoded buffer and any gzip snapshots."""
+        snapshots = len(self._decoder._snapshots) if isinstance(self._decoder, _GzipStream) else 0
+        return len(self._buffer) + snapshots * _ZLIB_SNAPSHOT_BYTES
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Return `size` bytes of the uncompressed stream starting at `offset` (fewer at the end)."""
+        decoder = self._decoder
+        if decoder is None:
+            self._fp.seek(offset)
+            return self._fp.read(size)
+
+        # self._buffer holds the last decoded bytes, ending at decoder.pos
+        start = decoder.pos - len(self._buffer)
+        if not start <= offset <= decoder.pos:
+            best, token = decoder.nearest(offset)
+            if offset < start or best > decoder.pos:
+                decoder.restart(token)
+                self._buffer = b''
+        parts = []
+        needed = size
+        while needed > 0:
+            if offset < decoder.pos:
+                start = decoder.pos - len(self._buffer)
+                piece = self._buffer[offset - start:offset - start + needed]
+                parts.append(piece)
+                offset += len(piece)
+                needed -= len(piece)
+                continue
+            data = decoder.step()
+            if not data:
+                break
+            self._buffer = data
+        return b''.join(parts)
+
+    def close(self) -> None:
+        self._fp.close()
+        self._buffer = b''
+
+
+class MemberReader(io.RawIOBase):
+    """Read-only file object over one member's bytes in a SeekableArchive."""
+    def __init__(self, archive: SeekableArchive, offset: int, size: int):
+        self._archive = archive
+        self._offset = offset
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self._remaining)
+        if n <= 0:
+            return 0
+        data = self._archive.read_at(self._offset, n)
+        b[:len(data)] = data
+        self._offset += len(data)
+        self._remaining -= len(data)
+        return len(data)
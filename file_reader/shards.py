@@ -0,0 +1,231 @@
+# file_reader/shards.py
+import os
+import json
+import mmap
+import struct
+from itertools import groupby
+
+from config.settings import SHARD_SIZE
+from utils.path import SHARDS_ABS_PATH
+from db.repositories.files_repo import iter_file_records
+from file_reader.reader import FileReader
+from file_reader.cleaner import TextCleaner
+
+# Index entry for file_id N at byte N * _ENTRY.size: (shard number + 1, length, offset); 0 = not stored
+_ENTRY = struct.Struct('<IQQ')
+# Entries of directories written before meta.json recorded the format; lengths must fit 32 bits
+_LEGACY_ENTRY = struct.Struct('<IIQ')
+_INDEX_NAME = "index.bin"
+_META_NAME = "meta.json"
+
+
+def _shard_name(number: int) -> str:
+    return f"shard-{number:05d}.bin"
+
+
+def _read_meta(directory: str) -> dict:
+    meta_path = os.path.join(directory, _META_NAME)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _entry_struct(meta: dict) -> struct.Struct:
+    """Index entry layout of a shard directory: new directories use _ENTRY."""
+    if not meta or meta.get("index_format") == _ENTRY.format:
+        return _ENTRY
+    return _LEGACY_ENTRY
+
+
+class ShardWriter:
+    """
+    Append decoded texts to a directory of shard files with a fixed-width index keyed by file_id.
+
+    Texts are stored as UTF-8 one after another in `shard-NNNNN.bin` files; a new shard starts
+    once the current one reaches `shard_size` bytes. `index.bin` holds one 20-byte entry per
+    file_id at position file_id * 20 (shard, 64-bit length, offset), so lookups need no search.
+    Writing a file_id again appends the new text and repoints its entry. Directories written
+    with the older 16-byte entries keep them, and reject texts of 4 GiB or more.
+
+    Index entries are written only after the shard data they point to has been flushed,
+    so a crash leaves unindexed bytes at worst, never a dangling entry.
+    `cleaned` is recorded in the directory metadata and must match existing shards.
+    """
+    def __init__(self, directory: str = SHARDS_ABS_PATH, shard_size: int = SHARD_SIZE, cleaned: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        meta = _read_meta(directory)
+        if meta and meta.get("cleaned") != cleaned:
+            raise ValueError(f"Shards in {directory} were written with cleaned={meta.get('cleaned')}")
+        self._layout = _entry_struct(meta)
+        with open(os.path.join(directory, _META_NAME), 'w', encoding='utf-8') as f:
+            json.dump({"cleaned": cleaned, "index_format": self._layout.format}, f)
+
+        self.directory = directory
+        self.shard_size = shard_size
+        self.cleaned = cleaned
+        self._max_length = (1 << 32) - 1 if self._layout is _LEGACY_ENTRY else (1 << 64) - 1
+        index_path = os.path.join(directory, _INDEX_NAME)
+        self._index = open(index_path, 'r+b' if os.path.exists(index_path) else 'w+b')
+        self._pending = []
+
+        # Continue appending to the last shard
+        self._number = 0
+        while os.path.exists(os.path.join(directory, _shard_name(self._number + 1))):
+            self._number += 1
+        self._shard = open(os.path.join(directory, _shard_name(self._number)), 'ab')
+
+    def add(self, file_id: int, text: str) -> None:
+        """Append the text of `file_id`. Raises ValueError if it is too long for the index."""
+        data = text.encode('utf-8')
+        if len(data) > self._max_length:
+            raise ValueError(f"Text of file {file_id} is too long for the shard index ({len(data)} bytes)")
+        if self._shard.tell() and self._shard.tell() + len(data) > self.shard_size:
+            self.flush()
+            self._shard.close()
+            self._number += 1
+            self._shard = open(os.path.join(self.directory, _shard_name(self._number)), 'ab')
+        offset = self._shard.tell()
+        self._shard.write(data)
+        self._pending.append((file_id, self._number + 1, len(data), offset))
+
+    def flush(self) -> None:
+        """Flush shard data, then write the index entries that point to it."""
+        if not self._pending:
+            return
+        self._shard.flush()
+        os.fsync(self._shard.fileno())
+        index = self._index
+        entry = self._layout
+        for file_id, shard, length, offset in self._pending:
+            index.seek(file_id * entry.size)
+            index.write(entry.pack(shard, length, offset))
+        index.flush()
+        self._pending.clear()
+
+    def close(self) -> None:
+        """Flush and close the shard and index files."""
+        self.flush()
+        self._shard.close()
+        self._index.close()
+
+
+class ShardReader:
+    """
+    Serve materialized texts through `mmap`.
+
+    `get_bytes(file_id)` returns a zero-copy memoryview into the shard; `read_text` decodes
+    straight from that view. Both are O(1): one fixed-width index entry, one slice.
+    Memoryviews must be released before `close()`. Texts written after the reader opened
+    become visible after `reload()`.
+    """
+    def __init__(self, directory: str = SHARDS_ABS_PATH):
+        self.directory = directory
+        meta = _read_meta(directory)
+        self.cleaned = bool(meta.get("cleaned"))
+        self._layout = _entry_struct(meta)
+        self._index = None
+        self._shards = {}
+        self.reload()
+
+    @staticmethod
+    def _map(path: str):
+        """Map a file read-only; empty files map to None."""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def reload(self) -> None:
+        """Re-map the index and drop shard maps so newly written texts become visible."""
+        self.close()
+        self._index = self._map(os.path.join(self.directory, _INDEX_NAME))
+
+    def _entry(self, file_id: int):
+        index = self._index
+        entry = self._layout
+        pos = file_id * entry.size
+        if index is None or file_id < 0 or pos + entry.size > len(index):
+            return None
+        shard, length, offset = entry.unpack_from(index, pos)
+        if shard == 0:
+            return None
+        return shard - 1, length, offset
+
+    def __contains__(self, file_id: int) -> bool:
+        return self._entry(file_id) is not None
+
+    def get_bytes(self, file_id: int):
+        """Return a memoryview of the stored UTF-8 text of `file_id`, or None if it is not stored."""
+        entry = self._entry(file_id)
+        if entry is None:
+            return None
+        number, length, offset = entry
+        shard = self._shards.get(number)
+        if shard is None:
+            shard = self._shards[number] = self._map(os.path.join(self.directory, _shard_name(number)))
+        if shard is None:
+            return memoryview(b'')
+        return memoryview(shard)[offset:offset + length]
+
+    def read_text(self, file_id: int):
+        """Return the stored text of `file_id`, or None if it is not stored."""
+        view = self.get_bytes(file_id)
+        if view is None:
+            return None
+        with view:
+            return str(view, 'utf-8')
+
+    def close(self) -> None:
+        """Unmap all files."""
+        for shard in self._shards.values():
+            if shard is not None:
+                shard.close()
+        self._shards.clear()
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+
+def open_shards(directory: str = SHARDS_ABS_PATH):
+    """Return a ShardReader for `directory`, or None if nothing has been materialized there."""
+    if not os.path.exists(os.path.join(directory, _INDEX_NAME)):
+        return None
+    return ShardReader(directory)
+
+
+def materialize(directory: str = SHARDS_ABS_PATH, clean: bool = False, shard_size: int = SHARD_SIZE,
+                encoding: str = 'utf-8', errors: str = 'ignore') -> int:
+    """
+    Decode every registered file (cleaned with TextCleaner if `clean`) into shards in `directory`.
+
+    Each archive is read in one forward pass. Files already stored are skipped, so an interrupted
+    run resumes where it stopped. Processed flags are not touched.
+    Returns the number of texts written.
+    """
+    existing = open_shards(directory)
+    reader = FileReader(encoding=encoding, errors=errors)
+    cleaner = TextCleaner() if clean else None
+    writer = ShardWriter(directory, shard_size=shard_size, cleaned=clean)
+    written = 0
+    try:
+        for _, group in groupby(iter_file_records(), key=lambda record: record[1]):
+            records = [r for r in group if existing is None or r[0] not in existing]
+            for file_id, data in reader.stream_records(records):
+                text = reader.decode(data)
+                if cleaner is not None:
+                    text = cleaner.clean(text)
+                writer.add(file_id, text)
+                written += 1
+            writer.flush()
+    finally:
+        writer.close()
+        reader.close()
+        if existing is not None:
+            existing.close()
+    return written
+
+
+if __name__ == '__main__':
+    count = materialize()
+    print(f"Materialized {count} texts into {SHARDS_ABS_PATH}")
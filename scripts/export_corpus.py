@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+scripts/export_corpus.py
+
+Export the processed corpus into sharded JSONL or plain-text files for training (see
+file_reader/export.py). Re-running with the same options resumes an interrupted export.
+
+Run from the project root:
+    python -m scripts.export_corpus [--output DIR] [--format jsonl|text] [--compression gz|xz|none]
+"""
+import argparse
+
+from config.settings import EXPORT_SHARD_BYTES, EXPORT_COMPRESSION, EXPORT_COMPRESS_LEVEL, EXPORT_WORKERS, TEXT_FIELD
+from utils.path import EXPORT_ABS_PATH
+from file_reader.export import export_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=EXPORT_ABS_PATH, help="export directory")
+    parser.add_argument("--format", default="jsonl", choices=("jsonl", "text"))
+    parser.add_argument("--compression", default=EXPORT_COMPRESSION or "none", choices=("gz", "xz", "none"))
+    parser.add_argument("--level", type=int, default=EXPORT_COMPRESS_LEVEL, help="compression level")
+    parser.add_argument("--shard-mb", type=float, default=EXPORT_SHARD_BYTES / (1 << 20),
+                        help="uncompressed MiB per shard")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    parser.add_argument("--archives", default=None, help="only archives whose path matches this glob")
+    parser.add_argument("--all", action="store_true", help="include files not yet processed")
+    parser.add_argument("--keep-duplicates", action="store_true", help="include duplicates of other files' content")
+    parser.add_argument("--raw", action="store_true", help="export whole decoded files instead of their text fields")
+    parser.add_argument("--field", default=TEXT_FIELD, help="JSON field holding the text")
+    parser.add_argument("--no-clean", action="store_true", help="skip TextCleaner")
+    args = parser.parse_args()
+
+    result = export_corpus(
+        directory=args.output,
+        fmt=args.format,
+        compression=None if args.compression == "none" else args.compression,
+        compress_level=args.level,
+        shard_bytes=int(args.shard_mb * (1 << 20)),
+        clean=not args.no_clean,
+        extract=not args.raw,
+        field_path=args.field,
+        processed=None if args.all else True,
+        archives=args.archives,
+        unique=not args.keep_duplicates,
+        workers=args.workers,
+    )
+    print(f"Exported {result['files']} files ({result['records']} records, {result['bytes'] / 1e6:,.1f} MB) "
+          f"into {result['shards']} shards in {args.output}; "
+          f"{result['skipped']} of {result['units']} units were already done, {result['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import os
 
 from utils.path import resolve_from_root
 from file_reader.reader import FileReader
+from file_reader.shards import open_shards
 from  file_reader.cleaner import TextCleaner
 
 # IDs of sample records to extract
@@ -19,7 +20,13 @@ OUTPUT_DIR = resolve_from_root(os.path.join("storage", "samples"))
 
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    reader = FileReader()
+    # Serve from materialized shards when present (see file_reader/shards.py); cleaned shards
+    # cannot stand in for the raw sample
+    shards = open_shards()
+    if shards is not None and shards.cleaned:
+        shards.close()
+        shards = None
+    reader = FileReader(shards=shards)
     text_cleaner = TextCleaner()
 
     for file_id in SAMPLE_IDS:
@@ -38,6 +45,8 @@ def main():
         print(f"Wrote sample text for ID {file_id} to {out_path}")
 
     reader.close()
+    if shards is not None:
+        shards.close()
 
 
 if __name__ == "__main__":
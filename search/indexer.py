@@ -0,0 +1,175 @@
+# search/indexer.py
+import os
+from itertools import groupby
+from multiprocessing import Pool
+from tqdm import tqdm
+
+from config.settings import SEARCH_WORKERS, SEARCH_BATCH_BYTES, SEARCH_FLUSH_DOCS, SEARCH_FLUSH_BYTES, TEXT_FIELD
+from utils import metrics
+from db.database import get_database_path, set_database_path
+from db.repositories.files_repo import iter_file_sizes, get_file_records
+from db.repositories.search_repo import add_documents, optimize_index, clear_index
+from file_reader.reader import FileReader
+from file_reader.cleaner import TextCleaner
+from file_reader.json_stream import extract_fields
+from file_reader.scheduler import pack_members
+
+# Set in indexing workers (see _init_worker / _setup)
+_worker_metrics = False
+_reader = None
+_cleaner = None
+_field_path = None
+
+
+def document_text(texts, cleaner: TextCleaner = None) -> str:
+    """
+    Join one file's texts into the document stored in the index, cleaning each first if `cleaner`
+    is given. Values that are not strings are skipped.
+    """
+    texts = [text for text in texts if isinstance(text, str)]
+    if cleaner is not None:
+        texts = [cleaner.clean(text) for text in texts]
+    return "\n".join(text.rstrip("\n") for text in texts)
+
+
+class DocumentIndexer:
+    """
+    Buffer (file_id, text) documents and write them to the full-text index in bulk.
+
+    Documents accumulate until `max_docs` of them or `max_bytes` characters are held, then one
+    transaction stores them and flags their files as indexed, so an interrupted run loses at most
+    the unflushed buffer and never leaves a file flagged without its text.
+    Files without text are flagged as well, so they are not read again.
+    """
+    def __init__(self, max_docs: int = SEARCH_FLUSH_DOCS, max_bytes: int = SEARCH_FLUSH_BYTES):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._rows = []
+        self._empty = []
+        self._bytes = 0
+        self.documents = 0
+        self.empty = 0
+
+    def add(self, file_id: int, text: str) -> None:
+        """Index `text` as the document of `file_id`; an empty text only flags the file."""
+        if text:
+            self._rows.append((file_id, text))
+            self._bytes += len(text)
+        else:
+            self._empty.append(file_id)
+        if len(self._rows) + len(self._empty) >= self.max_docs or self._bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the held documents and flag their files as indexed."""
+        if not self._rows and not self._empty:
+            return
+        self.documents += add_documents(self._rows, self._empty)
+        self.empty += len(self._empty)
+        self._rows = []
+        self._empty = []
+        self._bytes = 0
+
+    def close(self) -> None:
+        """Flush any remaining documents."""
+        self.flush()
+
+
+def _setup(clean: bool, field_path: str, encoding: str, errors: str) -> None:
+    """Prepare this process to run `_index_task` tasks."""
+    global _reader, _cleaner, _field_path
+    _reader = FileReader(encoding=encoding, errors=errors, dedupe=False)
+    _cleaner = TextCleaner() if clean else None
+    _field_path = tuple(field_path.split('.'))
+
+
+def _init_worker(db_path: str, metrics_state: tuple, clean: bool, field_path: str, encoding: str,
+                 errors: str) -> None:
+    """Pool initializer: spawned workers inherit neither the database path nor metrics settings."""
+    global _worker_metrics
+    set_database_path(db_path)
+    metrics.configure(metrics_state)
+    _worker_metrics = True
+    _setup(clean, field_path, encoding, errors)
+
+
+def _index_task(file_ids: list) -> tuple:
+    """
+    Pool task: read a batch of files of one archive in a single forward pass and build their
+    documents. Returns (file_ids, [(file_id, text), ...], error, worker_metrics).
+    """
+    documents = []
+    with metrics.stage("search.build", items=len(file_ids)) as span:
+        try:
+            for file_id, data in _reader.stream_records(get_file_records(file_ids)):
+                text = document_text(extract_fields(_reader.decode(data), _field_path), _cleaner)
+                documents.append((file_id, text))
+                span.add(nbytes=len(data))
+            error = None
+        except Exception as e:
+            error = e
+    return file_ids, documents, error, metrics.drain() if _worker_metrics else None
+
+
+def _plan(batch_bytes: int):
+    """Split the files not yet indexed into batches of consecutive members of one archive."""
+    for _, group in groupby(iter_file_sizes(indexed=False, unique=True), key=lambda row: row[1]):
+        members = ((file_id, size) for file_id, _, size in group)
+        for _, ids in pack_members(members, batch_bytes, max_files=1 << 62, stream_bytes=batch_bytes):
+            yield ids
+
+
+def index_corpus(workers: int = SEARCH_WORKERS, batch_bytes: int = SEARCH_BATCH_BYTES, clean: bool = True,
+                 field_path: str = TEXT_FIELD, rebuild: bool = False, optimize: bool = False,
+                 indexer: DocumentIndexer = None, encoding: str = 'utf-8', errors: str = 'ignore') -> DocumentIndexer:
+    """
+    Add every file not yet in the full-text index to it.
+
+    Only files flagged `indexed = 0` are read, so each run picks up where the last one stopped
+    and later runs index only newly registered files. Duplicates of another file's content are
+    not indexed separately. Files are read and their `field_path` texts extracted and cleaned
+    (with `clean`) in `workers` processes, a batch of about `batch_bytes` of one archive at a
+    time; this process writes the documents in bulk through `indexer`.
+    `rebuild` empties the index first; `optimize` merges its segments afterwards.
+    """
+    if rebuild:
+        clear_index()
+    indexer = indexer or DocumentIndexer()
+    tasks = list(_plan(batch_bytes))
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks)) or 1
+    if workers == 1:
+        _setup(clean, field_path, encoding, errors)
+        results = map(_index_task, tasks)
+        pool = None
+    else:
+        pool = Pool(processes=workers, initializer=_init_worker,
+                    initargs=(get_database_path(), metrics.worker_state(), clean, field_path, encoding, errors))
+        results = pool.imap_unordered(_index_task, tasks)
+
+    try:
+        for file_ids, documents, error, worker_metrics in tqdm(results, total=len(tasks), desc="Indexing"):
+            metrics.merge(worker_metrics)
+            if error is not None:
+                # Left unflagged, so the next run retries the batch
+                print(f"Error indexing files {file_ids[0]}..{file_ids[-1]}: {error}")
+                continue
+            for file_id, text in documents:
+                indexer.add(file_id, text)
+    finally:
+        indexer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif _reader is not None:
+            _reader.close()
+
+    if optimize:
+        optimize_index()
+    return indexer
+
+
+if __name__ == '__main__':
+    result = index_corpus(optimize=True)
+    print(f"Indexed {result.documents} documents ({result.empty} files without text).")
@@ -0,0 +1,109 @@
+# stats/heavy_hitters.py
+import heapq
+
+from config.settings import HEAVY_HITTERS_CAPACITY
+
+
+class HeavyHitters:
+    """
+    Space-Saving summary of the most frequent words in a stream, held in bounded memory.
+
+    At most `capacity` words are tracked, each with an estimated count and an error bound. A new
+    word arriving when the summary is full replaces the word with the smallest estimate and inherits
+    that estimate as its error. With N the total weight seen so far and k the capacity:
+
+    - every estimate over-counts: estimate - error <= true count <= estimate;
+    - every error is at most N / k;
+    - every word whose true count exceeds N / k is tracked.
+
+    So `top()` is exact for the head of a skewed (Zipf-like) distribution and only uncertain near
+    the N / k floor; entries with `guaranteed=True` are certainly in the true top-n.
+    """
+    def __init__(self, capacity: int = HEAVY_HITTERS_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        # word -> [estimate, error]
+        self._entries = {}
+        # (estimate, word) min-heap; entries whose estimate is out of date are skipped lazily
+        self._heap = []
+
+    # --------------------- UPDATE ---------------------
+    def update(self, word: str, count: int = 1) -> None:
+        """Add `count` occurrences of `word`."""
+        if count <= 0:
+            return
+        self.total += count
+        entry = self._entries.get(word)
+        if entry is not None:
+            entry[0] += count
+        elif len(self._entries) < self.capacity:
+            entry = self._entries[word] = [count, 0]
+        else:
+            floor, evicted = self._pop_min()
+            del self._entries[evicted]
+            entry = self._entries[word] = [floor + count, floor]
+        heapq.heappush(self._heap, (entry[0], word))
+        if len(self._heap) > 4 * self.capacity:
+            self._compact()
+
+    def update_counts(self, counts) -> None:
+        """Add a mapping of word -> count, e.g. one file's Counter."""
+        for word, count in counts.items():
+            self.update(word, count)
+
+    def _pop_min(self):
+        """Remove and return the current (estimate, word) with the smallest estimate."""
+        heap = self._heap
+        entries = self._entries
+        while True:
+            estimate, word = heapq.heappop(heap)
+            entry = entries.get(word)
+            if entry is not None and entry[0] == estimate:
+                return estimate, word
+
+    def _compact(self) -> None:
+        """Rebuild the heap from the live entries, dropping stale ones."""
+        self._heap = [(entry[0], word) for word, entry in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    # --------------------- QUERY ---------------------
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._entries
+
+    def floor(self) -> int:
+        """
+        Upper bound on the true count of any untracked word: the smallest tracked estimate
+        once the summary is full, else 0.
+        """
+        if len(self._entries) < self.capacity:
+            return 0
+        estimate, word = self._pop_min()
+        heapq.heappush(self._heap, (estimate, word))
+        return estimate
+
+    def estimate(self, word: str) -> tuple:
+        """
+        Return (estimate, error) for `word`; its true count lies in [estimate - error, estimate].
+        Untracked words get (floor, floor).
+        """
+        entry = self._entries.get(word)
+        if entry is None:
+            floor = self.floor()
+            return floor, floor
+        return entry[0], entry[1]
+
+    def top(self, n: int) -> list:
+        """
+        Return up to `n` tracked words by estimate as (word, estimate, error, guaranteed), where
+        `guaranteed` means the word's lower bound beats the estimate of every word ranked after it.
+        """
+        ranked = sorted(self._entries.items(), key=lambda item: (-item[1][0], item[0]))
+        # The n+1-th estimate (or the untracked floor) bounds everything outside the top-n
+        beyond = ranked[n][1][0] if len(ranked) > n else self.floor()
+        return [(word, estimate, error, estimate - error >= beyond)
+                for word, (estimate, error) in ranked[:n]]
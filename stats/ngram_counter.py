@@ -0,0 +1,295 @@
+# stats/ngram_counter.py
+import os
+import queue
+import heapq
+import shutil
+import tempfile
+import multiprocessing as mp
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from config.settings import (NGRAM_MEMORY_BYTES, NGRAM_WORKERS, NGRAM_BATCH_BYTES, NGRAM_MERGE_FANIN,
+                             NGRAM_SPILL_PATH, TEXT_FIELD)
+from utils import metrics
+from db.database import transaction, get_database_path, set_database_path
+from db.repositories.files_repo import iter_file_sizes, get_file_records
+from db.repositories.ngram_counts_repo import replace_ngram_counts, drop_count_index, create_count_index
+from file_reader.reader import FileReader
+from file_reader.json_stream import extract_fields
+from file_reader.scheduler import pack_members
+from stats.word_counter import default_tokenize
+
+# Rough per-entry cost of a Counter key: dict slot, str header and int object
+_ENTRY_OVERHEAD = 100
+# Buffer size for reading and writing runs
+_RUN_BUFFER = 1 << 20
+
+
+def iter_ngrams(tokens: list, n: int):
+    """Yield the `n`-grams of a token list as strings of `n` words joined by single spaces."""
+    if n == 1:
+        return iter(tokens)
+    return map(" ".join, zip(*(tokens[i:] for i in range(n))))
+
+
+class NgramCounter:
+    """
+    Count n-grams in memory and spill them to sorted run files once a memory budget is reached.
+
+    Counts for every n in `sizes` accumulate in Counters until roughly `max_bytes` are held; then
+    each Counter is written, sorted by n-gram, to its own run file in `spill_dir`
+    (`<prefix>-<seq>-<n>.run`, one "ngram<TAB>count" line per n-gram) and cleared. So memory stays
+    at the budget however large the input, and `runs` lists (n, path) of every run written.
+    N-grams never cross text boundaries. `tokenize` maps a text to a list of words, which must not
+    contain newlines.
+    """
+    def __init__(self, sizes=(2, 3), spill_dir: str = None, tokenize=default_tokenize,
+                 max_bytes: int = NGRAM_MEMORY_BYTES, prefix: str = None):
+        self.sizes = tuple(sizes)
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        self.tokenize = tokenize
+        self.max_bytes = max_bytes
+        self.prefix = prefix or f"ngrams-{os.getpid()}"
+        self.counts = {n: Counter() for n in self.sizes}
+        self.runs = []
+        self.texts = 0
+        self.tokens = 0
+        self.spilled_bytes = 0
+        self._bytes = 0
+
+    def add_text(self, text: str) -> None:
+        """Tokenize `text` and count its n-grams."""
+        self.add_tokens(self.tokenize(text), len(text))
+
+    def add_tokens(self, tokens: list, chars: int = None) -> None:
+        """
+        Count the n-grams of one token sequence. `chars` (the text length) refines the memory
+        estimate of new keys; without it tokens are assumed to be 8 characters long.
+        """
+        if not tokens:
+            return
+        self.texts += 1
+        self.tokens += len(tokens)
+        token_chars = (chars / len(tokens)) if chars else 8
+        for n, counts in self.counts.items():
+            before = len(counts)
+            counts.update(iter_ngrams(tokens, n))
+            self._bytes += (len(counts) - before) * (_ENTRY_OVERHEAD + int(n * token_chars))
+        if self._bytes >= self.max_bytes:
+            self.spill()
+
+    def spill(self) -> None:
+        """Write the held counts to sorted run files and clear them."""
+        if not self._bytes:
+            return
+        with metrics.stage("ngrams.spill") as span:
+            for n, counts in self.counts.items():
+                if not counts:
+                    continue
+                path = os.path.join(self.spill_dir, f"{self.prefix}-{len(self.runs):05d}-{n}.run")
+                with open(path, 'w', encoding='utf-8', newline='\n', buffering=_RUN_BUFFER) as f:
+                    f.writelines(f"{ngram}\t{count}\n" for ngram, count in sorted(counts.items()))
+                size = os.path.getsize(path)
+                self.spilled_bytes += size
+                span.add(items=len(counts), nbytes=size)
+                self.runs.append((n, path))
+                self.counts[n] = Counter()
+        self._bytes = 0
+
+    def close(self) -> None:
+        """Spill whatever is still held."""
+        self.spill()
+
+
+# --------------------- RUN MERGING ---------------------
+def _iter_run(path: str):
+    """Yield (ngram, count) from a run file."""
+    with open(path, encoding='utf-8', newline='\n', buffering=_RUN_BUFFER) as f:
+        for line in f:
+            ngram, count = line.rstrip("\n").rsplit("\t", 1)
+            yield ngram, int(count)
+
+
+def merge_runs(paths):
+    """
+    K-way merge sorted run files into (ngram, total count) pairs in ngram order. Only one line
+    per run is held in memory.
+    """
+    if len(paths) == 1:
+        yield from _iter_run(paths[0])
+        return
+    merged = heapq.merge(*(_iter_run(path) for path in paths), key=itemgetter(0))
+    previous, total = next(merged, (None, 0))
+    for ngram, count in merged:
+        if ngram == previous:
+            total += count
+        else:
+            yield previous, total
+            previous, total = ngram, count
+    if previous is not None:
+        yield previous, total
+
+
+def _merge_task(task: tuple) -> str:
+    """Merge runs `paths` into the run at `out_path` and delete them; returns `out_path`."""
+    paths, out_path = task
+    with metrics.stage("ngrams.merge", items=len(paths)):
+        with open(out_path, 'w', encoding='utf-8', newline='\n', buffering=_RUN_BUFFER) as f:
+            f.writelines(f"{ngram}\t{count}\n" for ngram, count in merge_runs(paths))
+    for path in paths:
+        os.remove(path)
+    return out_path
+
+
+def reduce_runs(paths: list, spill_dir: str, fanin: int = NGRAM_MERGE_FANIN, pool=None,
+                prefix: str = "merge") -> list:
+    """
+    Merge runs in groups of `fanin` until at most `fanin` remain, so the final merge never keeps
+    more than `fanin` files open. Groups of one level are merged in parallel when a `pool` is given;
+    merged runs are named `<prefix>-<level>-<group>.run`. Returns the remaining run paths.
+    """
+    if fanin < 2:
+        raise ValueError("fanin must be at least 2")
+    level = 0
+    while len(paths) > fanin:
+        tasks = [(paths[i:i + fanin], os.path.join(spill_dir, f"{prefix}-{level}-{i // fanin:05d}.run"))
+                 for i in range(0, len(paths), fanin)]
+        paths = list(pool.imap(_merge_task, tasks)) if pool is not None else [_merge_task(t) for t in tasks]
+        level += 1
+    return paths
+
+
+# --------------------- PARALLEL COUNTING ---------------------
+def _worker(tasks, results, sizes: tuple, tokenize, max_bytes: int, spill_dir: str, field_path: str,
+            encoding: str, errors: str, db_path: str, metrics_state: tuple) -> None:
+    """
+    Worker process: count the n-grams of file batches taken from `tasks` until it reads None,
+    spilling runs whenever its share of the memory budget is full. Puts
+    (runs, texts, tokens, spilled_bytes, error, metrics snapshot) on `results` when done.
+    """
+    # Spawned workers do not inherit set_database_path() or metrics.enable()
+    set_database_path(db_path)
+    metrics.configure(metrics_state)
+    reader = FileReader(encoding=encoding, errors=errors, dedupe=False)
+    counter = NgramCounter(sizes, spill_dir, tokenize, max_bytes)
+    fields = tuple(field_path.split('.'))
+    error = None
+    try:
+        while True:
+            file_ids = tasks.get()
+            if file_ids is None:
+                break
+            with metrics.stage("ngrams.count", items=len(file_ids)) as span:
+                for file_id, data in reader.stream_records(get_file_records(file_ids)):
+                    span.add(nbytes=len(data))
+                    for text in extract_fields(reader.decode(data), fields):
+                        counter.add_text(text)
+        counter.close()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        reader.close()
+        results.put((counter.runs, counter.texts, counter.tokens, counter.spilled_bytes, error, metrics.drain()))
+
+
+def count_ngrams(sizes=(2, 3), min_count: int = 1, workers: int = NGRAM_WORKERS, tokenize=default_tokenize,
+                 max_bytes: int = NGRAM_MEMORY_BYTES, batch_bytes: int = NGRAM_BATCH_BYTES,
+                 fanin: int = NGRAM_MERGE_FANIN, spill_path: str = NGRAM_SPILL_PATH, field_path: str = TEXT_FIELD,
+                 encoding: str = 'utf-8', errors: str = 'ignore') -> dict:
+    """
+    Count the n-grams (for every n in `sizes`) of every registered file into `ngram_counts`.
+
+    Files are planned into batches of about `batch_bytes` of one archive and counted by `workers`
+    processes, each with a `max_bytes / workers` share of the memory budget; a worker spills a
+    sorted run per n whenever its share fills up (see NgramCounter). Duplicates of another file's
+    content are skipped, as in word counting, and the processed flags are not used or changed.
+    Runs are then merged `fanin` at a time until few enough remain for a single k-way merge,
+    whose n-grams with a total below `min_count` are pruned and the rest stream into
+    `ngram_counts`, replacing the earlier counts of these sizes in one transaction.
+    Memory stays flat however large the corpus; disk needs room for about two copies of the runs
+    in `spill_path`. `tokenize` must be a module-level function so it can reach the workers.
+
+    Returns the number of texts and tokens counted, runs and bytes spilled, and rows written per n.
+    Raises RuntimeError if a worker fails; `ngram_counts` is then left as it was.
+    """
+    sizes = tuple(sorted(set(sizes)))
+    workers = workers or os.cpu_count() or 1
+    spill_dir = tempfile.mkdtemp(prefix="ngrams-", dir=spill_path)
+    summary = {"texts": 0, "tokens": 0, "runs": 0, "spilled_bytes": 0, "rows": {}}
+    try:
+        tasks = mp.Queue()
+        results = mp.Queue()
+        batches = 0
+        for _, group in groupby(iter_file_sizes(unique=True), key=lambda row: row[1]):
+            members = ((file_id, size) for file_id, _, size in group)
+            for _, ids in pack_members(members, batch_bytes, max_files=1 << 62, stream_bytes=batch_bytes):
+                tasks.put(ids)
+                batches += 1
+        workers = min(workers, batches) or 1
+        for _ in range(workers):
+            tasks.put(None)
+
+        procs = [
+            mp.Process(target=_worker, daemon=True,
+                       args=(tasks, results, sizes, tokenize, max_bytes // workers, spill_dir, field_path,
+                             encoding, errors, get_database_path(), metrics.worker_state()))
+            for _ in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+
+        runs = {n: [] for n in sizes}
+        failures = []
+        running = workers
+        while running:
+            try:
+                worker_runs, texts, tokens, spilled, error, worker_metrics = results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    failures.append("a worker exited without reporting")
+                    break
+                continue
+            running -= 1
+            metrics.merge(worker_metrics)
+            if error is not None:
+                failures.append(error)
+            for n, path in worker_runs:
+                runs[n].append(path)
+            summary["texts"] += texts
+            summary["tokens"] += tokens
+            summary["runs"] += len(worker_runs)
+            summary["spilled_bytes"] += spilled
+        for proc in procs:
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.terminate()
+        if failures:
+            raise RuntimeError(f"N-gram counting failed: {'; '.join(failures)}")
+
+        pool = mp.Pool(processes=min(workers, fanin)) if workers > 1 else None
+        try:
+            for n in sizes:
+                runs[n] = reduce_runs(runs[n], spill_dir, fanin, pool, prefix=f"merge-{n}")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        with transaction():
+            # One sort at the end beats keeping the count index ordered during the load
+            drop_count_index()
+            for n in sizes:
+                counts = ((ngram, count) for ngram, count in merge_runs(runs[n]) if count >= min_count)
+                summary["rows"][n] = replace_ngram_counts(n, counts)
+            create_count_index()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return summary
+
+
+if __name__ == '__main__':
+    result = count_ngrams()
+    rows = ", ".join(f"{count} {n}-grams" for n, count in result["rows"].items())
+    print(f"Counted {result['tokens']} tokens in {result['texts']} texts ({result['runs']} runs spilled); "
+          f"wrote {rows}.")
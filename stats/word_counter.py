@@ -0,0 +1,161 @@
+# stats/word_counter.py
+import re
+from collections import Counter
+from functools import partial
+
+from config.settings import WORD_COUNT_FLUSH_ROWS, WORD_COUNT_FLUSH_BYTES
+from db.database import transaction
+from db.repositories.files_repo import mark_files_processed, unmark_all_files
+from db.repositories.word_counts_repo import add_counts, clear_counts
+from file_reader.cleaner import TextCleaner
+from file_reader.pipeline import run_pipeline
+from search.indexer import DocumentIndexer, document_text
+
+_word_pattern = re.compile(r"\w+")
+# Rough per-entry cost of a Counter key: dict slot, str header and int object
+_ENTRY_OVERHEAD = 100
+
+
+def default_tokenize(text: str) -> list:
+    """Split `text` into lowercase word tokens (runs of letters, digits and underscores)."""
+    return _word_pattern.findall(text.lower())
+
+
+class WordCounter:
+    """
+    Count words in memory and flush them to the `word_counts` table in bulk.
+
+    Counts accumulate in a Counter until `max_words` distinct words or roughly `max_bytes`
+    of memory are held, then they are added to the table with one bulk upsert and cleared.
+    Partial counts from other processes can be folded in with `merge()`; passing their `file_id`
+    marks those files processed in the same transaction as the flush that stores their counts.
+
+    `tokenize` maps a text to an iterable of words; defaults to `default_tokenize`.
+    If `heavy_hitters` (a HeavyHitters) is given, it sees every merged count, so approximate
+    top words are available during ingestion without querying the table.
+    """
+    def __init__(self, tokenize=default_tokenize, max_words: int = WORD_COUNT_FLUSH_ROWS,
+                 max_bytes: int = WORD_COUNT_FLUSH_BYTES, heavy_hitters=None):
+        self.tokenize = tokenize
+        self.max_words = max_words
+        self.max_bytes = max_bytes
+        self.heavy_hitters = heavy_hitters
+        self.counts = Counter()
+        self._bytes = 0
+        self._file_ids = set()
+        self.total_tokens = 0
+        self.rows_flushed = 0
+
+    def add_text(self, text: str) -> None:
+        """Tokenize `text` and count its words."""
+        self.add_tokens(self.tokenize(text))
+
+    def add_tokens(self, tokens) -> None:
+        """Count an iterable of words."""
+        self.merge(Counter(tokens))
+
+    def merge(self, counts, file_id: int = None) -> None:
+        """
+        Add a mapping of word -> count (e.g. another process's partial counts).
+        If `file_id` is given, that file is marked processed when these counts are flushed;
+        counts for a file already held are ignored, so a file delivered twice is counted once.
+        """
+        if file_id is not None:
+            if file_id in self._file_ids:
+                return
+            self._file_ids.add(file_id)
+        held = self.counts
+        for word, n in counts.items():
+            if word in held:
+                held[word] += n
+            else:
+                held[word] = n
+                self._bytes += len(word) + _ENTRY_OVERHEAD
+            self.total_tokens += n
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.update_counts(counts)
+        if len(held) >= self.max_words or self._bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """Upsert the held counts into `word_counts`, mark their files processed, and clear them."""
+        if not self.counts and not self._file_ids:
+            return
+        with transaction():
+            self.rows_flushed += add_counts(self.counts)
+            if self._file_ids:
+                mark_files_processed(self._file_ids)
+        self.counts = Counter()
+        self._bytes = 0
+        self._file_ids = set()
+
+    def close(self) -> None:
+        """Flush any remaining counts."""
+        self.flush()
+
+
+def count_texts(file_id: int, texts: list, tokenize=default_tokenize, index: bool = False):
+    """
+    Pipeline hook: count the words of one file's texts inside a worker process.
+    With `index`, returns (counts, cleaned document for the full-text index) instead.
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text))
+    if index:
+        return counts, document_text(texts, TextCleaner())
+    return counts
+
+
+def count_corpus(workers: int = None, tokenize=default_tokenize, counter: WordCounter = None,
+                 indexer: DocumentIndexer = None) -> WordCounter:
+    """
+    Count the words of every unprocessed file into `word_counts`.
+
+    Files are extracted and tokenized in the extraction pipeline's worker processes, each returning
+    a per-file Counter. This process merges them into `counter` and flushes in bulk; every flush
+    stores the counts and marks their files processed in one transaction. Counted files stay
+    claimed until then: the pipeline renews their leases while the run lasts and drops any file
+    delivered twice, so a run counts each file once. A run that dies loses its unflushed counts,
+    and those files are counted again by the next run once their leases expire; a run that dies
+    mid-flush loses nothing, as the counts and marks commit together. Words of files later
+    deleted or changed are never subtracted; `recount_corpus` rebuilds the table. `tokenize` must
+    be a module-level function so it can reach the workers.
+
+    With an `indexer` (a DocumentIndexer), each file's cleaned texts are also added to the
+    full-text index as they are processed. Index flushes are separate from count flushes; a file
+    counted but not yet indexed when a run dies keeps `indexed = 0` and is picked up by
+    search.indexer.index_corpus.
+    """
+    counter = counter or WordCounter(tokenize=tokenize)
+    process = partial(count_texts, tokenize=tokenize, index=indexer is not None)
+    try:
+        for file_id, result in run_pipeline(workers=workers, process=process, mark=False):
+            if indexer is not None:
+                result, text = result
+                indexer.add(file_id, text)
+            counter.merge(result, file_id=file_id)
+    finally:
+        counter.close()
+        if indexer is not None:
+            indexer.close()
+    return counter
+
+
+def recount_corpus(workers: int = None, tokenize=default_tokenize, counter: WordCounter = None) -> WordCounter:
+    """
+    Rebuild `word_counts` from scratch: empty it and flag every file unprocessed in one
+    transaction, then count the whole corpus again (see count_corpus).
+
+    `word_counts` holds totals only, so words of files that were since deleted or changed
+    (registration reports them as `stale_files`) cannot be subtracted; this is how to drop them.
+    """
+    with transaction():
+        clear_counts()
+        unmark_all_files()
+    return count_corpus(workers=workers, tokenize=tokenize, counter=counter)
+
+
+if __name__ == '__main__':
+    result = count_corpus()
+    print(f"Counted {result.total_tokens} tokens, wrote {result.rows_flushed} word_counts rows.")
@@ -0,0 +1,22 @@
+import pytest
+
+from db.database import get_database_path, set_database_path
+from db.schema import init_all
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Point the shared connections at an empty database file for one test."""
+    previous = get_database_path()
+    path = str(tmp_path / "test.sqlite")
+    set_database_path(path)
+    yield path
+    set_database_path(previous)
+
+
+@pytest.fixture
+def database(db_path):
+    """An initialized empty database."""
+    init_all()
+    return db_path
+
@@ -0,0 +1,12 @@
+"""Builders shared by the tests."""
+import json
+import zipfile
+
+
+def write_zip(path, texts: dict) -> str:
+    """Write a zip archive with one {"text": ...} JSON member per (member_path, text) item."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, 'w') as z:
+        for member_path, text in texts.items():
+            z.writestr(member_path, json.dumps({"text": text}))
+    return str(path)
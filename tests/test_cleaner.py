@@ -0,0 +1,43 @@
+"""
+Golden-output tests: TextCleaner must match the original line-by-line implementation
+(tests.cleaner_reference.reference_clean) on generated documents.
+"""
+import random
+
+import pytest
+
+from tests.cleaner_reference import reference_clean, generate_text, PROSE, NOISE, BLANKS
+from file_reader.cleaner import TextCleaner
+
+
+def _documents(seed: int, cases: int = 2000):
+    rng = random.Random(seed)
+    return [generate_text(rng, rng.randint(0, 40), noise_rate=0.2, blank_rate=0.4) for _ in range(cases)]
+
+
+@pytest.fixture(scope="module")
+def cleaner():
+    return TextCleaner()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_clean_matches_reference(cleaner, seed):
+    for text in _documents(seed):
+        assert cleaner.clean(text) == reference_clean(text), repr(text)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_clean_iter_matches_reference(cleaner, seed):
+    for text in _documents(seed):
+        streamed = "\n".join(cleaner.clean_iter(text.splitlines())) + "\n"
+        assert streamed == reference_clean(text), repr(text)
+
+
+def test_clean_many_matches_clean(cleaner):
+    docs = _documents(3, cases=200)
+    assert cleaner.clean_many(docs, workers=2) == [cleaner.clean(text) for text in docs]
+
+
+@pytest.mark.parametrize("text", ["", "\n", "\r\n\r\n", *PROSE, *NOISE, *BLANKS])
+def test_single_lines_match_reference(cleaner, text):
+    assert cleaner.clean(text) == reference_clean(text)
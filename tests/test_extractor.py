@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from file_reader.extractor import TextExtractor
+from file_reader.json_stream import iter_json_records, get_field
+from utils import metrics
+
+
+@pytest.fixture
+def extractor():
+    extractor = TextExtractor(dedupe=False)
+    yield extractor
+    extractor.close()
+
+
+@pytest.fixture
+def parse_errors():
+    """Return a function reading the parse_json error count of metrics collected during the test."""
+    metrics.reset()
+    metrics.enable()
+    yield lambda: metrics.snapshot().get("extractor.parse_json", {}).get("errors", 0)
+    metrics.disable()
+    metrics.reset()
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('{"text": "one"}', ["one"]),
+    ('[{"text": "a"}, {"text": "b"}, {"other": 1}]', ["a", "b"]),
+    ('{"text": "a"}\n{"text": "b"}\n\n{"text": "c"}\n', ["a", "b", "c"]),
+    ('{"text": "a"}\r\n{"other": 2}\r\n{"text": "c"}', ["a", "c"]),
+    ('{"text": "a"}{"text": "b"}', ["a", "b"]),
+    ('', []),
+])
+def test_extract_texts(extractor, parse_errors, raw, expected):
+    assert extractor.extract_texts(raw) == expected
+    assert parse_errors() == 0
+
+
+def test_invalid_json_keeps_preceding_records(extractor, parse_errors):
+    assert extractor.extract_texts('{"text": "kept"}\n{"text": "lost"') == ["kept"]
+    assert extractor.extract_texts('not json') == []
+    assert parse_errors() == 2
+
+
+def test_matches_the_streaming_path(extractor):
+    raw = "\n".join(json.dumps({"text": f"line {i}"}) for i in range(50))
+    chunks = [raw[i:i + 7] for i in range(0, len(raw), 7)]
+    streamed = [get_field(record, ("text",)) for record in iter_json_records(chunks)]
+    assert extractor.extract_texts(raw) == streamed
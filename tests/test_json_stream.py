@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from file_reader.json_stream import iter_json_records, get_field, extract_fields
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 20]
+
+RECORDS = [
+    {"text": "plain", "meta": {"source": {"name": "web"}}},
+    {"text": "escapes \" \\ \n é 😀", "n": -12.5e3},
+    [1, 2, [3, {"deep": True}]],
+    "a string record",
+    12345678901234567890,
+    0.5,
+    None,
+    {},
+]
+
+
+def _chunks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+def test_array_split_across_chunks(size):
+    text = json.dumps(RECORDS, indent=1, ensure_ascii=False)
+    assert list(iter_json_records(_chunks(text, size))) == RECORDS
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+def test_json_lines(size):
+    text = "\n".join(json.dumps(record) for record in RECORDS) + "\n"
+    assert list(iter_json_records(_chunks(text, size))) == RECORDS
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+def test_concatenated_values(size):
+    # Numbers cut at a chunk edge must not be split into two values
+    text = '{"a": 1}{"b": 2} 123 4.5e1"s"[7]'
+    assert list(iter_json_records(_chunks(text, size))) == [{"a": 1}, {"b": 2}, 123, 45.0, "s", [7]]
+
+
+@pytest.mark.parametrize("text", ["", "   \n\t ", "[]", " [ ] "])
+def test_empty_input(text):
+    assert list(iter_json_records(_chunks(text, 2))) == []
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+@pytest.mark.parametrize("text, expected", [
+    ('[{"a": 1}, {"b": 2}, {"c":', [{"a": 1}, {"b": 2}]),
+    ('[{"a": 1}, {"b": 2}', [{"a": 1}, {"b": 2}]),
+    ('[{"a": 1} {"b": 2}]', [{"a": 1}]),
+    ('{"a": 1}\n{"b": ', [{"a": 1}]),
+    ('{"a": 1}\n{"b": "unterminated', [{"a": 1}]),
+])
+def test_truncated_input_yields_preceding_records(size, text, expected):
+    records = []
+    with pytest.raises(json.JSONDecodeError):
+        for record in iter_json_records(_chunks(text, size)):
+            records.append(record)
+    assert records == expected
+
+
+def test_single_object_and_scalar():
+    assert list(iter_json_records(['{"text": "x"}'])) == [{"text": "x"}]
+    assert list(iter_json_records(["4", "2"])) == [42]
+
+
+def test_get_field_dotted_paths():
+    record = RECORDS[0]
+    assert get_field(record, tuple("meta.source.name".split('.'))) == "web"
+    assert get_field(record, ("text",)) == "plain"
+    assert get_field(record, ()) is record
+    assert get_field(record, ("meta", "missing"), "default") == "default"
+    # A step through something that is not a dict is missing, not an error
+    assert get_field(record, ("text", "len")) is None
+    assert get_field([record], ("text",)) is None
+
+
+def test_extract_fields():
+    lines = '{"body": {"text": "a"}}\n{"body": {"text": 5}}\n{"body": {}}\n{"body": {"text": "b"}}\n'
+    assert extract_fields(lines, ("body", "text")) == ["a", "b"]
+    array = json.dumps([{"text": "x"}, {"text": "y"}])
+    assert extract_fields(array, ("text",)) == ["x", "y"]
+    assert extract_fields('{"text": "kept"}\n{"text": ', ("text",)) == ["kept"]
+    assert extract_fields("", ("text",)) == []
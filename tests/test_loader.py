@@ -0,0 +1,143 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from db.database import get_connection
+from db.repositories.archives_repo import get_archive, get_checkpoints
+from db.repositories.files_repo import mark_files_processed, get_archive_members
+from db.repositories.word_counts_repo import get_count
+from file_reader.loader import load_and_register_archives, enumerate_archive, probe_archive
+from stats.word_counter import count_corpus, recount_corpus
+from tests.helpers import write_zip
+
+
+def _files() -> dict:
+    """{(archive name, member_path): (id, processed, duplicate_of)}"""
+    rows = get_connection().execute(
+        "SELECT archive_path, member_path, id, processed, duplicate_of FROM files_view").fetchall()
+    return {(os.path.basename(a), m): (i, p, d) for a, m, i, p, d in rows}
+
+
+def _rewrite(path, texts: dict) -> None:
+    """Rewrite an archive so its change is detected even within the same mtime tick."""
+    write_zip(path, texts)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_modified_archive_resets_kept_members(database, tmp_path):
+    texts = tmp_path / "texts"
+    write_zip(texts / "a.zip", {"same.json": "aaaa", "grows.json": "bb", "gone.json": "c"})
+    load_and_register_archives(str(texts), workers=1)
+    before = _files()
+    mark_files_processed(file_id for file_id, _, _ in before.values())
+
+    _rewrite(texts / "a.zip", {"same.json": "zzzz", "grows.json": "bbbbbb", "new.json": "d"})
+    summary = load_and_register_archives(str(texts), workers=1)
+
+    after = _files()
+    assert summary["modified"] == 1 and summary["stale_files"] == 3
+    assert set(after) == {("a.zip", "same.json"), ("a.zip", "grows.json"), ("a.zip", "new.json")}
+    # Same path and size, but the archive changed: kept under its ID, unprocessed again
+    assert after[("a.zip", "same.json")] == (before[("a.zip", "same.json")][0], 0, None)
+    assert after[("a.zip", "grows.json")][0] != before[("a.zip", "grows.json")][0]
+    assert all(processed == 0 for _, processed, _ in after.values())
+
+
+def test_rescan_of_unchanged_archive_keeps_state(database, tmp_path):
+    texts = tmp_path / "texts"
+    write_zip(texts / "a.zip", {"x.json": "aaaa"})
+    load_and_register_archives(str(texts), workers=1)
+    mark_files_processed(file_id for file_id, _, _ in _files().values())
+
+    summary = load_and_register_archives(str(texts), workers=1, rescan=True)
+
+    assert summary["stale_files"] == 0
+    assert [processed for _, processed, _ in _files().values()] == [1]
+
+
+def test_removed_archive_relinks_duplicates(database, tmp_path):
+    texts = tmp_path / "texts"
+    write_zip(texts / "a.zip", {"x.json": "shared"})
+    write_zip(texts / "b.zip", {"y.json": "shared", "z.json": "shared"})
+    load_and_register_archives(str(texts), workers=1)
+    files = _files()
+    canonical = files[("a.zip", "x.json")][0]
+    copies = [files[("b.zip", "y.json")][0], files[("b.zip", "z.json")][0]]
+    with get_connection() as conn:
+        conn.executemany("UPDATE files SET duplicate_of = ? WHERE id = ?", [(canonical, i) for i in copies])
+
+    os.remove(texts / "a.zip")
+    summary = load_and_register_archives(str(texts), workers=1)
+
+    after = _files()
+    assert summary["removed"] == 1 and summary["stale_files"] == 1
+    assert after[("b.zip", "y.json")] == (copies[0], 0, None)
+    assert after[("b.zip", "z.json")][2] == copies[0]
+
+
+def test_recount_drops_words_of_changed_files(database, tmp_path):
+    texts = tmp_path / "texts"
+    write_zip(texts / "a.zip", {"x.json": "apple apple", "y.json": "pear"})
+    load_and_register_archives(str(texts), workers=1)
+    count_corpus(workers=1)
+    assert get_count("apple") == 2
+
+    _rewrite(texts / "a.zip", {"x.json": "melon melon", "y.json": "pear"})
+    load_and_register_archives(str(texts), workers=1)
+    recount_corpus(workers=1)
+
+    assert (get_count("apple"), get_count("melon"), get_count("pear")) == (0, 2, 1)
+
+
+def _write_tar(path, texts: dict, mode: str) -> None:
+    with tarfile.open(path, mode) as tar:
+        for name, text in texts.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_chunked_registration_matches_enumeration(database, tmp_path, workers):
+    texts = tmp_path / "texts"
+    members = {f"d{i % 3}/m{i}.json": "x" * i for i in range(11)}
+    write_zip(texts / "a.zip", members)
+    _write_tar(texts / "b.tar", members, 'w')
+    _write_tar(texts / "c.tar.gz", members, 'w:gz')
+    _write_tar(texts / "d.tar.xz", members, 'w:xz')
+    # Readable headers, then the stream breaks off: enumeration fails after some chunks
+    _write_tar(texts / "e.tar.gz", {f"m{i}.json": os.urandom(2000).hex() for i in range(20)}, 'w:gz')
+    (texts / "e.tar.gz").write_bytes((texts / "e.tar.gz").read_bytes()[:30_000])
+
+    summary = load_and_register_archives(str(texts), workers=workers, batch_size=3)
+
+    assert summary["new"] == 5 and summary["failed"] == 1
+    for name in ("a.zip", "b.tar", "c.tar.gz", "d.tar.xz"):
+        path = str(texts / name)
+        rows, checkpoints = enumerate_archive(path, probe_archive(path))
+        registered = get_archive_members(path)
+        assert {row[1]: (row[4], row[5]) for row in rows} == {m: v[1:] for m, v in registered.items()}
+        assert get_archive(path)[5] == len(members)
+        assert get_checkpoints(path) == (checkpoints if len(checkpoints) > 1 else [])
+    assert get_archive(str(texts / "e.tar.gz")) is None
+    assert get_archive_members(str(texts / "e.tar.gz")) == {}
+
+
+def test_chunked_reconcile_of_modified_archive(database, tmp_path):
+    texts = tmp_path / "texts"
+    write_zip(texts / "a.zip", {f"m{i}.json": "aaaa" for i in range(7)})
+    load_and_register_archives(str(texts), workers=1, batch_size=2)
+    mark_files_processed(file_id for file_id, _, _ in _files().values())
+
+    _rewrite(texts / "a.zip", {f"m{i}.json": "bbbb" for i in range(1, 9)})
+    summary = load_and_register_archives(str(texts), workers=1, batch_size=2)
+
+    after = _files()
+    # m1..m6 reset, m0 deleted
+    assert summary["stale_files"] == 7
+    assert sorted(member for _, member in after) == sorted(f"m{i}.json" for i in range(1, 9))
+    assert all(processed == 0 for _, processed, _ in after.values())
@@ -0,0 +1,67 @@
+import os
+import zipfile
+
+from db.database import get_connection, transaction
+from db.schema import init_all
+from file_reader.loader import load_and_register_archives
+from tests.helpers import write_zip
+
+# The flat `files` layout of databases created before the normalized catalog
+FLAT_FILES_DDL = """
+CREATE TABLE files (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    archive_path TEXT    NOT NULL,
+    member_path  TEXT    NOT NULL,
+    file_name    TEXT    NOT NULL,
+    extension    TEXT    NOT NULL,
+    file_size    INTEGER NOT NULL,
+    processed    BOOLEAN NOT NULL DEFAULT 0,
+    detected_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def _flat_database(archive: str, members: dict) -> None:
+    with transaction() as conn:
+        conn.execute(FLAT_FILES_DDL)
+        conn.executemany(
+            "INSERT INTO files (archive_path, member_path, file_name, extension, file_size, processed)"
+            " VALUES (?, ?, ?, 'json', ?, 1)",
+            [(archive, name, os.path.basename(name), size) for name, size in members.items()]
+        )
+
+
+def _member_sizes(archive: str) -> dict:
+    with zipfile.ZipFile(archive) as z:
+        return {info.filename: info.file_size for info in z.infolist()}
+
+
+def test_migration_keeps_file_ids_and_state(db_path, tmp_path):
+    archive = write_zip(tmp_path / "texts" / "a.zip", {"x/a.json": "alpha", "x/b.json": "beta"})
+    _flat_database(archive, _member_sizes(archive))
+
+    init_all()
+
+    rows = get_connection().execute(
+        "SELECT id, archive_path, member_path, processed FROM files_view ORDER BY id").fetchall()
+    assert rows == [(1, archive, "x/a.json", 1), (2, archive, "x/b.json", 1)]
+    assert get_connection().execute("SELECT size FROM archives WHERE path = ?", (archive,)).fetchone() == (-1,)
+
+
+def test_registration_after_migration_keeps_processed_flags(db_path, tmp_path):
+    archive = write_zip(tmp_path / "texts" / "a.zip", {"x/a.json": "alpha", "x/b.json": "beta"})
+    _flat_database(archive, _member_sizes(archive))
+    init_all()
+
+    summary = load_and_register_archives(str(tmp_path / "texts"), workers=1)
+
+    assert summary["modified"] == 1
+    rows = get_connection().execute("SELECT id, processed FROM files ORDER BY id").fetchall()
+    assert rows == [(1, 1), (2, 1)]
+    size, = get_connection().execute("SELECT size FROM archives WHERE path = ?", (archive,)).fetchone()
+    assert size == os.path.getsize(archive)
+
+
+def test_migration_is_a_no_op_on_a_normalized_database(database):
+    init_all()
+    assert "archive_id" in {row[1] for row in get_connection().execute("PRAGMA table_info(files)")}
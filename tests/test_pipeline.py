@@ -0,0 +1,58 @@
+import time
+import zipfile
+from collections import Counter
+
+from db.database import get_connection
+from db.repositories.files_repo import mark_files_processed
+from file_reader.loader import load_and_register_archives
+from file_reader.pipeline import run_pipeline
+from tests.helpers import write_zip
+
+
+def _register(tmp_path, archives: int = 2, members: int = 30) -> int:
+    for a in range(archives):
+        write_zip(tmp_path / "texts" / f"a{a}.zip", {f"f{i}.json": f"text {a} {i}" for i in range(members)})
+    load_and_register_archives(str(tmp_path / "texts"), workers=1)
+    return archives * members
+
+
+def _unprocessed() -> int:
+    count, = get_connection().execute("SELECT COUNT(*) FROM files WHERE processed = 0").fetchone()
+    return count
+
+
+def test_every_file_is_yielded_once_and_marked(database, tmp_path):
+    total = _register(tmp_path)
+    seen = Counter(file_id for file_id, _ in run_pipeline(workers=2, batch_size=8, queue_size=4))
+    assert len(seen) == total and max(seen.values()) == 1
+    assert _unprocessed() == 0
+
+
+def test_slow_consumer_keeps_its_claims(database, tmp_path):
+    total = _register(tmp_path)
+    seen = Counter()
+    held = []
+    # The consumer commits long after the lease would have run out without renewal
+    for file_id, _ in run_pipeline(workers=2, batch_size=8, queue_size=4, mark=False, lease_seconds=0.6):
+        seen[file_id] += 1
+        held.append(file_id)
+        time.sleep(0.03)
+    mark_files_processed(held)
+    assert len(seen) == total and max(seen.values()) == 1
+    assert _unprocessed() == 0
+
+
+def test_failed_file_is_reported_once_and_released(database, tmp_path, capsys):
+    total = _register(tmp_path, archives=1, members=5)
+    bad = tmp_path / "texts" / "bad.zip"
+    with zipfile.ZipFile(bad, 'w') as z:
+        z.writestr("broken.json.xz", b"not xz data")
+    load_and_register_archives(str(tmp_path / "texts"), workers=1)
+
+    seen = Counter(file_id for file_id, _ in run_pipeline(workers=2, batch_size=2, queue_size=4))
+
+    assert len(seen) == total
+    assert capsys.readouterr().out.count("Error extracting file") == 1
+    row = get_connection().execute(
+        "SELECT processed, lease_owner FROM files WHERE file_name = 'broken.json.xz'").fetchone()
+    assert row == (0, None)
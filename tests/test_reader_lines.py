@@ -0,0 +1,65 @@
+import lzma
+import random
+import zipfile
+
+import pytest
+
+from db.repositories.files_repo import iter_file_records
+from file_reader.loader import load_and_register_archives
+from file_reader.reader import FileReader
+
+CHUNK_SIZES = [1, 2, 3, 4, 5, 7, 16, 4096]
+
+# Every line boundary str.splitlines() knows, plus multibyte characters to cut mid-sequence
+PIECES = ["word", " ", "\u00e9", "\u6771\u4eac", "\U0001f600", "\n", "\r", "\r\n", "\n\r", "\x0b", "\x0c",
+          "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029"]
+
+
+def _texts() -> dict:
+    rng = random.Random(0)
+    texts = {f"random{i}.txt": "".join(rng.choices(PIECES, k=rng.randint(0, 200))) for i in range(20)}
+    texts.update({
+        "empty.txt": "",
+        "crlf.txt": "a\r\nb\r\n\r\n",
+        "trailing_cr.txt": "a\rb\r",
+        "no_newline.txt": "last line",
+        "separators.txt": "a\x1cb\x1dc\x1ed\u2028e\u2029f\x85g",
+    })
+    return texts
+
+
+@pytest.fixture
+def records(database, tmp_path):
+    texts = _texts()
+    path = tmp_path / "texts" / "lines.zip"
+    path.parent.mkdir()
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, text in texts.items():
+            z.writestr(name, text.encode('utf-8'))
+            z.writestr(name + ".xz", lzma.compress(text.encode('utf-8')))
+    load_and_register_archives(str(tmp_path / "texts"), workers=1)
+    by_name = {}
+    for record in iter_file_records():
+        name = record[2]
+        by_name[name] = (record, texts[name[:-3] if name.endswith(".xz") else name])
+    return by_name
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_lines_matches_splitlines(records, chunk_size):
+    reader = FileReader(dedupe=False)
+    try:
+        for name, (record, text) in records.items():
+            assert list(reader.iter_lines(record, chunk_size, mark=False)) == text.splitlines(), name
+    finally:
+        reader.close()
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_chunks_rebuilds_the_text(records, chunk_size):
+    reader = FileReader(dedupe=False)
+    try:
+        for name, (record, text) in records.items():
+            assert "".join(reader.iter_chunks(record, chunk_size, mark=False)) == text, name
+    finally:
+        reader.close()
@@ -0,0 +1,50 @@
+import gzip
+import random
+
+import pytest
+
+from file_reader.seek_index import SeekableArchive, _Decoder
+
+SPAN = 128 * 1024
+
+
+@pytest.fixture(scope="module")
+def gzip_file(tmp_path_factory):
+    rng = random.Random(0)
+    words = [bytes(rng.choices(b"abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 9))) for _ in range(5000)]
+    data = b" ".join(rng.choices(words, k=700_000))[:4 << 20]
+    path = tmp_path_factory.mktemp("seek") / "single.gz"
+    path.write_bytes(gzip.compress(data))
+    return str(path), data
+
+
+def test_random_reads_match_the_stream(gzip_file):
+    path, data = gzip_file
+    rng = random.Random(1)
+    archive = SeekableArchive(path, snapshot_span=SPAN)
+    try:
+        for _ in range(400):
+            offset = rng.randrange(len(data))
+            size = rng.randint(1, 64 * 1024)
+            assert archive.read_at(offset, size) == data[offset:offset + size]
+    finally:
+        archive.close()
+
+
+def test_rereading_adds_no_snapshots(gzip_file):
+    path, data = gzip_file
+    rng = random.Random(2)
+    archive = SeekableArchive(path, snapshot_span=SPAN)
+    try:
+        for _ in range(400):
+            archive.read_at(rng.randrange(len(data)), 4096)
+        offsets = archive._decoder._snapshot_offsets
+        assert offsets == sorted(set(offsets))
+        assert len(offsets) <= len(data) // SPAN + 1
+    finally:
+        archive.close()
+
+
+def test_decoder_is_abstract():
+    with pytest.raises(TypeError):
+        _Decoder(None, [], 1024)
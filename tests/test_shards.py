@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from file_reader.shards import ShardWriter, ShardReader, open_shards, _LEGACY_ENTRY
+
+
+def _write(directory, texts: dict, **kwargs) -> None:
+    writer = ShardWriter(str(directory), **kwargs)
+    for file_id, text in texts.items():
+        writer.add(file_id, text)
+    writer.close()
+
+
+def test_round_trip_across_shards(tmp_path):
+    texts = {1: "first", 2: "", 7: "unicode: café 東京 😀", 3: "x" * 100}
+    _write(tmp_path, texts, shard_size=16)
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("shard-")]) > 1
+
+    reader = ShardReader(str(tmp_path))
+    try:
+        for file_id, text in texts.items():
+            assert file_id in reader
+            assert reader.read_text(file_id) == text
+            with reader.get_bytes(file_id) as view:
+                assert bytes(view) == text.encode('utf-8')
+    finally:
+        reader.close()
+
+
+def test_missing_ids(tmp_path):
+    _write(tmp_path, {5: "five"})
+    reader = ShardReader(str(tmp_path))
+    try:
+        for file_id in (0, 4, 6, 10_000, -1):
+            assert file_id not in reader
+            assert reader.read_text(file_id) is None
+            assert reader.get_bytes(file_id) is None
+    finally:
+        reader.close()
+    assert open_shards(str(tmp_path / "nothing")) is None
+
+
+def test_reopen_appends_and_repoints(tmp_path):
+    _write(tmp_path, {1: "one", 2: "two"})
+    reader = ShardReader(str(tmp_path))
+    try:
+        _write(tmp_path, {2: "two again", 3: "three"})
+        assert reader.read_text(3) is None
+        reader.reload()
+        assert [reader.read_text(i) for i in (1, 2, 3)] == ["one", "two again", "three"]
+    finally:
+        reader.close()
+
+
+def test_cleaned_flag_must_match(tmp_path):
+    _write(tmp_path, {1: "one"}, cleaned=True)
+    assert open_shards(str(tmp_path)).cleaned
+    with pytest.raises(ValueError):
+        ShardWriter(str(tmp_path), cleaned=False)
+
+
+def test_legacy_index_is_read_and_limits_length(tmp_path):
+    (tmp_path / "shard-00000.bin").write_bytes(b"oldtext")
+    (tmp_path / "index.bin").write_bytes(b"\0" * _LEGACY_ENTRY.size + _LEGACY_ENTRY.pack(1, 7, 0))
+    (tmp_path / "meta.json").write_text(json.dumps({"cleaned": False}))
+
+    writer = ShardWriter(str(tmp_path))
+    try:
+        # 16-byte entries hold 32-bit lengths; simulate a 4 GiB text with a lower cap
+        writer._max_length = 3
+        with pytest.raises(ValueError):
+            writer.add(2, "toolong")
+        writer.add(3, "new")
+    finally:
+        writer.close()
+
+    reader = ShardReader(str(tmp_path))
+    try:
+        assert [reader.read_text(i) for i in (1, 2, 3)] == ["oldtext", None, "new"]
+    finally:
+        reader.close()
@@ -0,0 +1,141 @@
+# tokenizer/bpe_trainer.py
+import heapq
+from collections import defaultdict
+
+from config.settings import BPE_VOCAB_SIZE, BPE_MIN_FREQUENCY
+from db.database import transaction
+from db.repositories.tokens_repo import add_tokens, reset_tokens
+from db.repositories.word_counts_repo import iter_counts
+
+
+class BPETrainer:
+    """
+    Learn a byte-pair-encoding vocabulary from word frequencies.
+
+    Words start as sequences of characters; the most frequent adjacent pair is merged repeatedly
+    until the vocabulary reaches `vocab_size` or no pair occurs `min_frequency` times.
+    Merges never cross word boundaries.
+
+    Pair counts are kept incrementally: a max-heap (with lazily skipped stale entries) picks the
+    next merge, and an inverted index pair -> word indices means each merge only revisits the words
+    that contain the pair instead of rescanning the vocabulary.
+    """
+    def __init__(self, vocab_size: int = BPE_VOCAB_SIZE, min_frequency: int = BPE_MIN_FREQUENCY,
+                 special_tokens=()):
+        self.vocab_size = vocab_size
+        self.min_frequency = min_frequency
+        self.special_tokens = list(special_tokens)
+        self.pieces = []
+        self.merges = []
+
+    def train(self, word_counts) -> list:
+        """
+        Train on an iterable of (word, count) pairs.
+        Returns the vocabulary pieces in ID order: special tokens, the sorted alphabet, then merged
+        pieces in merge order. The merges themselves are kept in `self.merges`.
+        """
+        words = []
+        freqs = []
+        alphabet = set()
+        for word, count in word_counts:
+            if not word or count <= 0:
+                continue
+            symbols = list(word)
+            words.append(symbols)
+            freqs.append(count)
+            alphabet.update(symbols)
+
+        pieces = list(self.special_tokens)
+        known = set(pieces)
+        for symbol in sorted(alphabet - known):
+            pieces.append(symbol)
+            known.add(symbol)
+
+        pair_counts = defaultdict(int)
+        where = defaultdict(set)
+        for index, symbols in enumerate(words):
+            freq = freqs[index]
+            for pair in zip(symbols, symbols[1:]):
+                pair_counts[pair] += freq
+                where[pair].add(index)
+        heap = [(-count, pair) for pair, count in pair_counts.items()]
+        heapq.heapify(heap)
+
+        merges = []
+        while len(pieces) < self.vocab_size and heap:
+            neg_count, pair = heapq.heappop(heap)
+            count = pair_counts.get(pair, 0)
+            if count != -neg_count:
+                # Stale entry; the current count was pushed separately
+                continue
+            if count < self.min_frequency:
+                break
+            merged = pair[0] + pair[1]
+            merges.append(pair)
+            if merged not in known:
+                known.add(merged)
+                pieces.append(merged)
+            self._apply_merge(pair, merged, words, freqs, pair_counts, where, heap)
+
+        self.pieces = pieces
+        self.merges = merges
+        return pieces
+
+    @staticmethod
+    def _apply_merge(pair, merged, words, freqs, pair_counts, where, heap) -> None:
+        """
+        Merge `pair` in every word containing it. Only the neighbours of each merged occurrence change,
+        so counts, index and heap are updated for those pairs alone. Index entries for pairs that
+        disappear from a word are left in place; revisiting such a word later finds nothing to merge.
+        """
+        first, second = pair
+        deltas = defaultdict(int)
+        for index in where.pop(pair, ()):
+            symbols = words[index]
+            freq = freqs[index]
+            i = 0
+            while i < len(symbols) - 1:
+                if symbols[i] == first and symbols[i + 1] == second:
+                    if i > 0:
+                        prev = symbols[i - 1]
+                        deltas[(prev, first)] -= freq
+                        deltas[(prev, merged)] += freq
+                        where[(prev, merged)].add(index)
+                    if i + 2 < len(symbols):
+                        nxt = symbols[i + 2]
+                        deltas[(second, nxt)] -= freq
+                        deltas[(merged, nxt)] += freq
+                        where[(merged, nxt)].add(index)
+                    symbols[i:i + 2] = [merged]
+                i += 1
+
+        pair_counts.pop(pair, None)
+        for p, delta in deltas.items():
+            if not delta or p == pair:
+                continue
+            count = pair_counts[p] + delta
+            if count > 0:
+                pair_counts[p] = count
+                heapq.heappush(heap, (-count, p))
+            else:
+                del pair_counts[p]
+                where.pop(p, None)
+
+
+def train_from_word_counts(vocab_size: int = BPE_VOCAB_SIZE, min_frequency: int = BPE_MIN_FREQUENCY,
+                           min_count: int = 1, special_tokens=()) -> BPETrainer:
+    """
+    Train BPE on the `word_counts` table (words with count >= `min_count`) and replace the
+    `tokens` table with the result in one transaction. Piece IDs follow the vocabulary order.
+    """
+    trainer = BPETrainer(vocab_size, min_frequency, special_tokens)
+    pieces = trainer.train(iter_counts(min_count))
+    with transaction():
+        reset_tokens()
+        add_tokens((piece, token_id) for token_id, piece in enumerate(pieces))
+    return trainer
+
+
+if __name__ == '__main__':
+    trained = train_from_word_counts()
+    print(f"Trained {len(trained.pieces)} tokens with {len(trained.merges)} merges.")
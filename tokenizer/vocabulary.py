@@ -0,0 +1,119 @@
+# tokenizer/vocabulary.py
+from db.database import transaction
+from db.repositories.tokens_repo import all_tokens, add_tokens, token_stats
+
+
+class Vocabulary:
+    """
+    In-memory view of the `tokens` table for dict-speed lookups.
+
+    The table is read once with a single scan: a dict maps piece -> id, and a list indexed
+    by id maps id -> piece (None for unused ids). `add_tokens` writes new pieces through to the
+    table in one transaction. If other code changes the table, call `invalidate()` (reload on next
+    use), `reload()` (reload now) or `reload_if_changed()`.
+    """
+    def __init__(self):
+        self._ids = {}
+        self._pieces = []
+        self._signature = None
+        self._loaded = False
+
+    # --------------------- LOADING ---------------------
+    def reload(self) -> None:
+        """Read the whole tokens table into memory."""
+        ids = {}
+        max_id = -1
+        rows = all_tokens()
+        for piece, token_id in rows:
+            ids[piece] = token_id
+            if token_id > max_id:
+                max_id = token_id
+        pieces = [None] * (max_id + 1)
+        for piece, token_id in rows:
+            if token_id >= 0:
+                pieces[token_id] = piece
+        self._ids = ids
+        self._pieces = pieces
+        self._signature = (len(rows), max_id if rows else None)
+        self._loaded = True
+
+    def invalidate(self) -> None:
+        """Drop the cached table; it is reloaded on next use."""
+        self._loaded = False
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload if the table's (row count, max id) differs from the cached copy.
+        Returns True if a reload happened.
+        """
+        if self._loaded and token_stats() == self._signature:
+            return False
+        self.reload()
+        return True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.reload()
+
+    # --------------------- LOOKUP ---------------------
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._ids)
+
+    def __contains__(self, piece: str) -> bool:
+        self._ensure_loaded()
+        return piece in self._ids
+
+    def token_id(self, piece: str):
+        """Return the ID for `piece`, or None if it is not in the vocabulary."""
+        self._ensure_loaded()
+        return self._ids.get(piece)
+
+    def piece(self, token_id: int):
+        """Return the piece for `token_id`, or None if it is unused."""
+        self._ensure_loaded()
+        if 0 <= token_id < len(self._pieces):
+            return self._pieces[token_id]
+        return None
+
+    def encode(self, pieces, unknown=None) -> list:
+        """Map a sequence of pieces to IDs; missing pieces become `unknown`."""
+        self._ensure_loaded()
+        get = self._ids.get
+        return [get(piece, unknown) for piece in pieces]
+
+    def decode(self, token_ids) -> list:
+        """Map a sequence of IDs to pieces; unused or out-of-range IDs become None."""
+        self._ensure_loaded()
+        table = self._pieces
+        size = len(table)
+        return [table[i] if 0 <= i < size else None for i in token_ids]
+
+    # --------------------- UPDATE ---------------------
+    def add_tokens(self, pieces) -> list:
+        """
+        Add pieces that are not in the vocabulary yet, giving them consecutive IDs after the current maximum,
+        and write them to the tokens table in one transaction. Returns the IDs of all given pieces.
+        """
+        pieces = list(pieces)
+        try:
+            with transaction(immediate=True):
+                # Pick up rows other writers added since the last load before assigning IDs
+                self.reload_if_changed()
+                new_pairs = []
+                next_id = len(self._pieces)
+                for piece in pieces:
+                    if piece not in self._ids:
+                        self._ids[piece] = next_id
+                        new_pairs.append((piece, next_id))
+                        next_id += 1
+                if new_pairs:
+                    add_tokens(new_pairs)
+        except BaseException:
+            # The cache may hold IDs that never reached the table
+            self.invalidate()
+            raise
+        if new_pairs:
+            self._pieces.extend(piece for piece, _ in new_pairs)
+            self._signature = (len(self._ids), next_id - 1)
+        return [self._ids[piece] for piece in pieces]
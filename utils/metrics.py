@@ -0,0 +1,269 @@
+# utils/metrics.py
+import os
+import json
+import time
+import cProfile
+
+from config.settings import METRICS_ENABLED, METRICS_PROFILE_STAGES
+
+# Latency histogram: bucket i counts calls that took less than 2**i microseconds (the last one is open)
+_BUCKETS = 40
+
+_enabled = METRICS_ENABLED
+_profile_stages = frozenset(METRICS_PROFILE_STAGES)
+# stage name -> _Stats for this process
+_stats = {}
+# stage name -> cProfile.Profile, for stages in _profile_stages
+_profiles = {}
+# The stage currently being profiled; profiled stages nested inside it are not profiled separately
+_profiling = None
+
+
+class _Stats:
+    """Counters, bytes and a latency histogram for one stage."""
+    __slots__ = ('calls', 'items', 'bytes', 'errors', 'seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def observe(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), _BUCKETS - 1)] += 1
+
+
+def _stage_stats(name: str) -> _Stats:
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = _Stats()
+    return stats
+
+
+class _Span:
+    """
+    Times one `with` block of a stage. `add()` attaches the items and bytes it handled;
+    a block left through an exception counts as an error.
+    """
+    __slots__ = ('name', 'items', 'bytes', '_start', '_profile')
+
+    def __init__(self, name: str, items: int, nbytes: int):
+        self.name = name
+        self.items = items
+        self.bytes = nbytes
+        self._profile = None
+
+    def add(self, items: int = 0, nbytes: int = 0) -> None:
+        self.items += items
+        self.bytes += nbytes
+
+    def __enter__(self):
+        global _profiling
+        if self.name in _profile_stages and _profiling is None:
+            profile = _profiles.get(self.name)
+            if profile is None:
+                profile = _profiles[self.name] = cProfile.Profile()
+            _profiling = self.name
+            self._profile = profile
+            profile.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _profiling
+        elapsed = time.perf_counter() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+            _profiling = None
+        stats = _stage_stats(self.name)
+        stats.observe(elapsed)
+        stats.items += self.items
+        stats.bytes += self.bytes
+        if exc_type is not None:
+            stats.errors += 1
+        return False
+
+
+class _NullSpan:
+    """Stands in for _Span while metrics are disabled."""
+    __slots__ = ()
+
+    def add(self, items: int = 0, nbytes: int = 0) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+# --------------------- CONFIGURATION ---------------------
+def enable(profile_stages=None) -> None:
+    """
+    Start collecting metrics in this process. `profile_stages` (stage names) also run
+    under cProfile; see `dump_profiles`. Defaults to METRICS_PROFILE_STAGES.
+    """
+    global _enabled, _profile_stages
+    _enabled = True
+    if profile_stages is not None:
+        _profile_stages = frozenset(profile_stages)
+
+
+def disable() -> None:
+    """Stop collecting metrics; what was collected so far is kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def worker_state() -> tuple:
+    """Settings to hand to `configure` in a worker process, which may not inherit them (spawn)."""
+    return _enabled, tuple(_profile_stages)
+
+
+def configure(state: tuple) -> None:
+    """
+    Apply `worker_state()` from the parent process in a worker. Metrics copied from the parent
+    by fork are discarded, so the worker's `drain()` holds only its own work.
+    """
+    enabled, profile_stages = state
+    reset()
+    if enabled:
+        enable(profile_stages)
+    else:
+        disable()
+
+# --------------------- RECORDING ---------------------
+def stage(name: str, items: int = 0, nbytes: int = 0):
+    """
+    Return a context manager that times a block as one call of stage `name`:
+
+        with metrics.stage("reader.read_text") as span:
+            raw = ...
+            span.add(nbytes=len(raw))
+
+    While metrics are disabled this returns a shared no-op object, so an instrumented call
+    costs one function call and a flag check.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, items, nbytes)
+
+
+def count(name: str, items: int = 1, nbytes: int = 0) -> None:
+    """Add items and bytes to stage `name` without timing anything."""
+    if not _enabled:
+        return
+    stats = _stage_stats(name)
+    stats.items += items
+    stats.bytes += nbytes
+
+# --------------------- EXPORT ---------------------
+def _percentile(buckets: list, calls: int, q: float) -> float:
+    """Upper bound in seconds of the histogram bucket holding quantile `q`."""
+    if not calls:
+        return 0.0
+    rank = q * calls
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= rank:
+            return (1 << i) / 1e6
+    return (1 << (len(buckets) - 1)) / 1e6
+
+
+def snapshot() -> dict:
+    """
+    Return this process's metrics as {stage: {calls, items, bytes, errors, seconds, max_seconds,
+    p50, p95, p99, buckets}}. Percentiles are histogram bucket bounds (within a factor of 2).
+    """
+    result = {}
+    for name, stats in sorted(_stats.items()):
+        result[name] = {
+            "calls": stats.calls,
+            "items": stats.items,
+            "bytes": stats.bytes,
+            "errors": stats.errors,
+            "seconds": stats.seconds,
+            "max_seconds": stats.max_seconds,
+            "p50": _percentile(stats.buckets, stats.calls, 0.50),
+            "p95": _percentile(stats.buckets, stats.calls, 0.95),
+            "p99": _percentile(stats.buckets, stats.calls, 0.99),
+            "buckets": list(stats.buckets),
+        }
+    return result
+
+
+def merge(other: dict) -> None:
+    """Add a snapshot taken in another process (e.g. a worker) into this process's metrics."""
+    for name, data in (other or {}).items():
+        stats = _stage_stats(name)
+        stats.calls += data["calls"]
+        stats.items += data["items"]
+        stats.bytes += data["bytes"]
+        stats.errors += data["errors"]
+        stats.seconds += data["seconds"]
+        stats.max_seconds = max(stats.max_seconds, data["max_seconds"])
+        stats.buckets = [a + b for a, b in zip(stats.buckets, data["buckets"])]
+
+
+def reset() -> None:
+    """Forget all collected metrics and profiles."""
+    _stats.clear()
+    _profiles.clear()
+
+
+def drain():
+    """Return `snapshot()` and reset, or None if nothing was collected; workers send this to the parent."""
+    if not _stats:
+        return None
+    result = snapshot()
+    _stats.clear()
+    return result
+
+
+def to_json(path: str = None, run_id: str = None) -> str:
+    """Return the snapshot as JSON (with `run_id`), also writing it to `path` if given."""
+    text = json.dumps({"run_id": run_id, "stages": snapshot()}, indent=2)
+    if path is not None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return text
+
+
+def format_table(data: dict = None) -> str:
+    """Render a snapshot (default: the current one) as a plain-text table, slowest stages first."""
+    data = snapshot() if data is None else data
+    lines = [f"{'stage':<28}{'calls':>10}{'items':>12}{'MB':>10}{'seconds':>10}"
+             f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"]
+    for name, s in sorted(data.items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"{name:<28}{s['calls']:>10,}{s['items']:>12,}{s['bytes'] / 1e6:>10.1f}{s['seconds']:>10.2f}"
+                     f"{s['p50'] * 1e3:>10.2f}{s['p95'] * 1e3:>10.2f}{s['p99'] * 1e3:>10.2f}{s['errors']:>8,}")
+    return "\n".join(lines)
+
+
+def dump_profiles(directory: str) -> list:
+    """
+    Write one `<stage>.prof` file (pstats format) per profiled stage; returns the paths written.
+    Only this process's profiles are written; worker processes do not send theirs back.
+    """
+    paths = []
+    for name, profile in _profiles.items():
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.prof")
+        profile.dump_stats(path)
+        paths.append(path)
+    return paths